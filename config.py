@@ -3,8 +3,11 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-# Источник новостей: "currents" или "newsapi"
-NEWS_SOURCE = "newsapi"  # или "currents"
+# Источник новостей: "currents", "newsapi", список через запятую или "all" — опрос нескольких источников параллельно
+NEWS_SOURCE = os.getenv("NEWS_SOURCE", "newsapi").lower()  # или "currents"
+# Для нескольких источников: сколько ответов ждать и общий дедлайн (секунды)
+NEWS_FETCH_QUORUM = int(os.getenv("NEWS_FETCH_QUORUM", 0))  # 0 — все источники
+NEWS_FETCH_DEADLINE = float(os.getenv("NEWS_FETCH_DEADLINE", 30))
 
 # === Выбор ИИ-провайдера ===
 # Допустимые значения: "openai", "deepseek", "yandex"
@@ -23,17 +26,20 @@ TELEGRAM_CHANNEL_ID = os.getenv("TELEGRAM_CHANNEL_ID")
 
 MAX_TITLE_LENGTH = int(os.getenv('MAX_TITLE_LENGTH', 100))
 MAX_DESCRIPTION_LENGTH = int(os.getenv('MAX_DESCRIPTION_LENGTH', 500))
-# API Endpoints
-CURRENTS_BASE_URL = "https://api.currentsapi.services/v1/search"
-NEWSAPI_BASE_URL = "https://newsapi.org/v2/everything"
+# API Endpoints (переопределяются переменными окружения — например, для локальных заглушек в бенчмарках)
+CURRENTS_BASE_URL = os.getenv("CURRENTS_BASE_URL", "https://api.currentsapi.services/v1/search")
+NEWSAPI_BASE_URL = os.getenv("NEWSAPI_BASE_URL", "https://newsapi.org/v2/everything")
 OPENAI_MODEL = "gpt-3.5-turbo"
-TELEGRAM_API_URL = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # None — адрес по умолчанию из SDK
+TELEGRAM_API_ROOT = os.getenv("TELEGRAM_API_ROOT", "https://api.telegram.org")
+TELEGRAM_API_BASE = f"{TELEGRAM_API_ROOT.rstrip('/')}/bot{TELEGRAM_BOT_TOKEN}"
+TELEGRAM_API_URL = f"{TELEGRAM_API_BASE}/sendMessage"
 
 DEEPSEEK_MODEL = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
-DEEPSEEK_BASE_URL = "https://api.deepseek.com/v1"
+DEEPSEEK_BASE_URL = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com/v1")
 
 YANDEX_MODEL = os.getenv('YANDEX_MODEL', 'yandexgpt-pro')
-YANDEX_GPT_URL = 'https://llm.api.cloud.yandex.net/foundationModels/v1/completion'
+YANDEX_GPT_URL = os.getenv('YANDEX_GPT_URL', 'https://llm.api.cloud.yandex.net/foundationModels/v1/completion')
 
 # Настройки
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -43,7 +49,7 @@ TIMEOUT = 120
 # === Stability AI Configuration ===
 STABILITY_API_KEY = os.getenv("STABILITY_API_KEY")
 STABILITY_ENGINE = os.getenv("STABILITY_ENGINE", "sd3")
-STABILITY_BASE_URL = "https://api.stability.ai/v1"
+STABILITY_BASE_URL = os.getenv("STABILITY_BASE_URL", "https://api.stability.ai/v1")
 
 # Настройки генерации изображений
 IMAGE_WIDTH = int(os.getenv("IMAGE_WIDTH", 768))
@@ -51,3 +57,147 @@ IMAGE_HEIGHT = int(os.getenv("IMAGE_HEIGHT", 512))
 IMAGE_CFG_SCALE = float(os.getenv("IMAGE_CFG_SCALE", 7.0))
 IMAGE_STEPS = int(os.getenv("IMAGE_STEPS", 25))
 
+
+# === Конвейер обработки новостей ===
+# Режим: "sequential" — одна новость за запуск, "async" — конкурентный конвейер
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "sequential").lower()
+# Сколько новостей из выборки обрабатывать за один запуск в режиме "async"
+PIPELINE_MAX_NEWS = int(os.getenv("PIPELINE_MAX_NEWS", 5))
+# Лимиты параллелизма для каждой стадии конвейера
+PIPELINE_LLM_CONCURRENCY = int(os.getenv("PIPELINE_LLM_CONCURRENCY", 4))
+PIPELINE_IMAGE_CONCURRENCY = int(os.getenv("PIPELINE_IMAGE_CONCURRENCY", 2))
+PIPELINE_PUBLISH_CONCURRENCY = int(os.getenv("PIPELINE_PUBLISH_CONCURRENCY", 1))
+
+# === HTTP-клиент ===
+# Размер пула keep-alive соединений на один хост (по умолчанию)
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 10))
+# Индивидуальные лимиты для хостов, формат: "api.stability.ai=2,api.telegram.org=4"
+HTTP_POOL_LIMITS = os.getenv("HTTP_POOL_LIMITS", "")
+# HTTP/2 для клиентов на базе httpx (OpenAI SDK); требует пакет h2
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+
+# === Кэши ===
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+
+# Кэш ответов LLM (SQLite)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm_cache.sqlite3"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))  # секунды
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 5000))
+
+# Контентно-адресуемый кэш базовых изображений Stability.ai
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "true").lower() == "true"
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(CACHE_DIR, "images"))
+IMAGE_CACHE_MAX_MB = int(os.getenv("IMAGE_CACHE_MAX_MB", 500))
+
+# Индекс уже опубликованных новостей
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_INDEX_PATH = os.getenv("DEDUP_INDEX_PATH", os.path.join(CACHE_DIR, "published.sqlite3"))
+DEDUP_RETENTION_DAYS = int(os.getenv("DEDUP_RETENTION_DAYS", 14))
+
+# Соответствие хэша изображения и file_id Telegram: повторная отправка без загрузки файла
+TELEGRAM_FILE_ID_CACHE_ENABLED = os.getenv("TELEGRAM_FILE_ID_CACHE_ENABLED", "true").lower() == "true"
+TELEGRAM_FILE_ID_CACHE_PATH = os.getenv("TELEGRAM_FILE_ID_CACHE_PATH", os.path.join(CACHE_DIR, "telegram_file_ids.sqlite3"))
+TELEGRAM_FILE_ID_TTL_DAYS = int(os.getenv("TELEGRAM_FILE_ID_TTL_DAYS", 30))  # 0 — бессрочно
+
+# Журнал задач: результаты стадий сохраняются, после сбоя работа продолжается с незавершённой стадии
+JOB_STORE_ENABLED = os.getenv("JOB_STORE_ENABLED", "true").lower() == "true"
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(CACHE_DIR, "jobs.sqlite3"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 900))  # через сколько захваченная задача считается брошенной
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", 14))
+
+# Кластеризация почти одинаковых новостей (MinHash + LSH)
+NEWS_CLUSTERING_ENABLED = os.getenv("NEWS_CLUSTERING_ENABLED", "true").lower() == "true"
+NEWS_CLUSTER_THRESHOLD = float(os.getenv("NEWS_CLUSTER_THRESHOLD", 0.5))  # оценка сходства Жаккара
+NEWS_MINHASH_PERMUTATIONS = int(os.getenv("NEWS_MINHASH_PERMUTATIONS", 64))
+NEWS_LSH_BANDS = int(os.getenv("NEWS_LSH_BANDS", 16))
+
+# Пакетная генерация: сколько новостей отправлять в одном запросе к LLM (1 — без пакетов)
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", 1))
+
+# Режим структурированного ответа: response_format json_object (OpenAI, DeepSeek) и jsonObject (YandexGPT)
+LLM_JSON_MODE = os.getenv("LLM_JSON_MODE", "true").lower() == "true"
+
+# Бюджет токенов на описание новости в промпте (0 — без обрезки); оценка ~4 байта UTF-8 на токен
+PROMPT_DESCRIPTION_TOKENS = int(os.getenv("PROMPT_DESCRIPTION_TOKENS", 300))
+
+# Потоковая генерация текста: изображение стартует, как только готовы title и image_prompt
+LLM_STREAMING = os.getenv("LLM_STREAMING", "false").lower() == "true"
+
+# Хеджирование запросов к LLM: дублировать запрос запасному провайдеру, если основной медлит
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+LLM_HEDGE_PROVIDER = os.getenv("LLM_HEDGE_PROVIDER", "openai").lower()
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 0.9))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 5))  # до набора статистики — фиксированная задержка
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", 15))  # секунды
+# Таймаут соединения и чтения хеджированных запросов: проигравший, зависший до первого байта,
+# не держит поток дольше этого
+LLM_HEDGE_TIMEOUT = float(os.getenv("LLM_HEDGE_TIMEOUT", 20))
+# Потоки хеджирования: по два запроса на каждую одновременную LLM-стадию и столько же
+# под проигравших, которые ещё дочитывают ответ
+LLM_HEDGE_WORKERS = int(os.getenv("LLM_HEDGE_WORKERS", 4 * PIPELINE_LLM_CONCURRENCY))
+
+# === Ограничение частоты запросов и circuit breaker ===
+RATE_LIMIT_DEFAULT_RPS = float(os.getenv("RATE_LIMIT_DEFAULT_RPS", 5))  # запросов в секунду
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", 5))
+CURRENTS_RATE_LIMIT_RPS = float(os.getenv("CURRENTS_RATE_LIMIT_RPS", 1))
+NEWSAPI_RATE_LIMIT_RPS = float(os.getenv("NEWSAPI_RATE_LIMIT_RPS", 1))
+CIRCUIT_BREAKER_THRESHOLD = int(os.getenv("CIRCUIT_BREAKER_THRESHOLD", 5))  # сбоев подряд
+CIRCUIT_BREAKER_RESET = float(os.getenv("CIRCUIT_BREAKER_RESET", 60))  # секунды
+# Попытки платных запросов к LLM (DeepSeek, YandexGPT) и Stability.ai: 429, 5xx и ошибки соединения
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+STABILITY_MAX_RETRIES = int(os.getenv("STABILITY_MAX_RETRIES", 3))
+
+# Инкрементальная загрузка: запрашивать только новости свежее последней загруженной
+NEWS_INCREMENTAL = os.getenv("NEWS_INCREMENTAL", "false").lower() == "true"
+NEWS_PAGE_SIZE = int(os.getenv("NEWS_PAGE_SIZE", 100))
+NEWS_MAX_PAGES = int(os.getenv("NEWS_MAX_PAGES", 5))
+WATERMARK_PATH = os.getenv("WATERMARK_PATH", os.path.join(CACHE_DIR, "watermarks.sqlite3"))
+
+# === Режим демона (daemon.py) ===
+# Темы и интервалы в минутах, формат: "conflict Middle East=30;Artificial Intelligence=60"
+DAEMON_TOPICS = os.getenv("DAEMON_TOPICS", "conflict Middle East=30")
+DAEMON_JITTER = float(os.getenv("DAEMON_JITTER", 0.1))  # доля интервала, на которую сдвигается запуск
+DAEMON_MAX_PARALLEL_JOBS = int(os.getenv("DAEMON_MAX_PARALLEL_JOBS", 2))
+DAEMON_RUN_ON_START = os.getenv("DAEMON_RUN_ON_START", "true").lower() == "true"
+DAEMON_DRAIN_TIMEOUT = float(os.getenv("DAEMON_DRAIN_TIMEOUT", 300))  # секунды на завершение постов при остановке
+
+# === Наложение текста на изображение ===
+# Путь к TTF-шрифту с кириллицей; если не задан, ищутся распространённые системные шрифты
+OVERLAY_FONT_PATH = os.getenv("OVERLAY_FONT_PATH", "")
+OVERLAY_FONT_MAX_SIZE = int(os.getenv("OVERLAY_FONT_MAX_SIZE", 36))
+OVERLAY_FONT_MIN_SIZE = int(os.getenv("OVERLAY_FONT_MIN_SIZE", 18))
+OVERLAY_MAX_LINES = int(os.getenv("OVERLAY_MAX_LINES", 3))
+
+# Кодирование итогового изображения для Telegram (в памяти, без промежуточного PNG на диске)
+IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "JPEG").upper()  # JPEG или WEBP
+IMAGE_OUTPUT_QUALITY = int(os.getenv("IMAGE_OUTPUT_QUALITY", 85))
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", 1024 * 1024))  # Telegram принимает фото до 10 МБ
+# Сохранять ли итоговые изображения в generated_images/ (по умолчанию только в памяти)
+SAVE_GENERATED_IMAGES = os.getenv("SAVE_GENERATED_IMAGES", "false").lower() == "true"
+# Запрашивать у Stability.ai сырой PNG (Accept: image/png) вместо JSON с base64
+STABILITY_BINARY_RESPONSE = os.getenv("STABILITY_BINARY_RESPONSE", "true").lower() == "true"
+# Процессы для наложения текста и кодирования изображений (0 — в текущем процессе).
+# -1 — автоматически: пул до 4 процессов по числу ядер только в режимах async и демона;
+# одиночному запуску и одноядерной машине пул даёт лишь накладные расходы на старт процессов
+_CPU_COUNT = os.cpu_count() or 1
+IMAGE_POSTPROCESS_WORKERS = int(os.getenv("IMAGE_POSTPROCESS_WORKERS", -1))
+IMAGE_POSTPROCESS_AUTO_WORKERS = min(4, _CPU_COUNT) if _CPU_COUNT > 1 else 0
+
+# === Очередь отправки в Telegram ===
+# Лимиты Bot API: около 30 сообщений в секунду на бота и 20 в минуту в один канал/группу
+TELEGRAM_GLOBAL_RPS = float(os.getenv("TELEGRAM_GLOBAL_RPS", 30))
+TELEGRAM_CHAT_PER_MINUTE = float(os.getenv("TELEGRAM_CHAT_PER_MINUTE", 20))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", 3))
+TELEGRAM_OUTBOX_WORKERS = int(os.getenv("TELEGRAM_OUTBOX_WORKERS", 1))  # 1 — строгий порядок публикации
+# Объединять посты одного пакета с изображениями в альбом (sendMediaGroup)
+TELEGRAM_MEDIA_GROUP = os.getenv("TELEGRAM_MEDIA_GROUP", "false").lower() == "true"
+
+# === Метрики и трассировка ===
+# Файл с метриками в текстовом формате Prometheus (пусто — не писать), порт HTTP-эндпоинта /metrics (0 — выключен)
+METRICS_FILE = os.getenv("METRICS_FILE", "")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+# Спаны стадий с trace id новости пишутся строками JSON в TRACE_FILE
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join(CACHE_DIR, "traces.jsonl"))
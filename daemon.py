@@ -0,0 +1,143 @@
+"""
+Режим демона: постоянно работающий процесс, публикующий новости по расписанию
+
+В отличие от запуска main.py по cron, интерпретатор, конфигурация, клиенты API,
+пулы соединений и кэши создаются один раз и переиспользуются между циклами.
+"""
+
+import logging
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import schedule
+
+from config import (
+    DAEMON_TOPICS,
+    DAEMON_JITTER,
+    DAEMON_MAX_PARALLEL_JOBS,
+    DAEMON_RUN_ON_START,
+    DAEMON_DRAIN_TIMEOUT,
+)
+import main
+from modules import http_client, image_postprocess, metrics, telegram_outbox
+from modules.content_generator import ContentGenerator
+
+logger = logging.getLogger("daemon")
+
+
+def parse_topics(spec: str) -> list:
+    """Разбирает "тема=минуты;тема2=минуты" в список (тема, интервал в секундах)"""
+    topics = []
+    for part in spec.split(";"):
+        if not part.strip():
+            continue
+        keywords, _, minutes = part.rpartition("=")
+        try:
+            topics.append((keywords.strip(), int(float(minutes) * 60)))
+        except ValueError:
+            logger.error(f"Некорректная тема в DAEMON_TOPICS: {part}")
+    return topics
+
+
+class NewsDaemon:
+    def __init__(self, topics: list):
+        """
+        Args:
+            topics: список пар (ключевые слова, интервал в секундах)
+        """
+        self.topics = topics
+        self.scheduler = schedule.Scheduler()
+        self._executor = ThreadPoolExecutor(max_workers=DAEMON_MAX_PARALLEL_JOBS, thread_name_prefix="topic")
+        self._running = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        # «Тёплые» клиенты и пул пост-обработки: создаются один раз на всё время жизни процесса
+        image_postprocess.enable_pool()
+        self.content_generator = ContentGenerator()
+        self.image_generator = main._create_image_generator()
+
+    def _run_topic(self, keywords: str):
+        try:
+            published = main.run_cycle(keywords, content_generator=self.content_generator,
+                                       image_generator=self.image_generator)
+            logger.info(f"[{keywords}] Цикл завершён, опубликовано: {published}")
+        except Exception as e:
+            logger.error(f"[{keywords}] Ошибка цикла: {e}")
+        finally:
+            metrics.write_file()
+
+    def _submit(self, keywords: str):
+        """
+        Запускает цикл темы в пуле.
+        Пропущенные запуски (процесс был занят или спал) schedule схлопывает в один,
+        а пока предыдущий цикл темы не завершён, новый не стартует.
+        """
+        if self._stop.is_set():
+            return
+
+        with self._lock:
+            previous = self._running.get(keywords)
+            if previous and not previous.done():
+                logger.warning(f"[{keywords}] Предыдущий цикл ещё выполняется — запуск пропущен")
+                return
+            self._running[keywords] = self._executor.submit(self._run_topic, keywords)
+
+    def start(self):
+        for keywords, interval in self.topics:
+            # Джиттер: интервал выбирается случайно в [interval*(1-j), interval*(1+j)],
+            # чтобы темы с одинаковым расписанием не били по API одновременно
+            low = max(1, int(interval * (1 - DAEMON_JITTER)))
+            high = max(low, int(interval * (1 + DAEMON_JITTER)))
+            self.scheduler.every(low).to(high).seconds.do(self._submit, keywords)
+            logger.info(f"Тема '{keywords}': каждые {low}-{high} сек")
+
+            if DAEMON_RUN_ON_START:
+                self._submit(keywords)
+
+    def run_forever(self):
+        metrics.start_http_server()
+        self.start()
+        while not self._stop.is_set():
+            self.scheduler.run_pending()
+            self._stop.wait(1)
+        self._shutdown()
+
+    def stop(self, *_):
+        if not self._stop.is_set():
+            logger.info("Получен сигнал остановки — новые циклы не запускаются")
+            self._stop.set()
+
+    def _shutdown(self):
+        """Дожидается публикаций, которые уже в работе, и закрывает соединения"""
+        with self._lock:
+            in_flight = [future for future in self._running.values() if not future.done()]
+
+        if in_flight:
+            logger.info(f"Ожидание завершения {len(in_flight)} циклов (до {DAEMON_DRAIN_TIMEOUT:.0f} сек)...")
+            _, not_done = wait(in_flight, timeout=DAEMON_DRAIN_TIMEOUT)
+            if not_done:
+                logger.warning(f"Не дождались {len(not_done)} циклов — завершаем принудительно")
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        telegram_outbox.shutdown()
+        http_client.close_all()
+        image_postprocess.shutdown()
+        logger.info("Демон остановлен")
+
+
+def run():
+    topics = parse_topics(DAEMON_TOPICS)
+    if not topics:
+        logger.critical("Не задано ни одной темы в DAEMON_TOPICS")
+        return
+
+    daemon = NewsDaemon(topics)
+    signal.signal(signal.SIGINT, daemon.stop)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    daemon.run_forever()
+
+
+if __name__ == "__main__":
+    run()
@@ -2,13 +2,34 @@
 Главный модуль: управление процессом от A до Z
 """
 
+import asyncio
 import logging
 import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-from modules import news_fetcher, telegram_publisher
+from config import (
+    PIPELINE_MODE,
+    PIPELINE_MAX_NEWS,
+    PIPELINE_LLM_CONCURRENCY,
+    PIPELINE_IMAGE_CONCURRENCY,
+    PIPELINE_PUBLISH_CONCURRENCY,
+    DEDUP_ENABLED,
+    NEWS_CLUSTERING_ENABLED,
+    LLM_BATCH_SIZE,
+    LLM_STREAMING,
+    IMAGE_OUTPUT_FORMAT,
+    SAVE_GENERATED_IMAGES,
+    TELEGRAM_MEDIA_GROUP,
+    JOB_STORE_ENABLED,
+    NEWS_INCREMENTAL,
+)
+from modules import image_postprocess, job_store, metrics, news_clustering, news_fetcher, telegram_publisher
 from modules.content_generator import ContentGenerator
-from modules.image_generator import ImageGenerator
+from modules.dedup_index import get_default_index
+from modules.image_generator import ImageGenerator, IMAGE_FORMAT_EXTENSIONS
 
 # Настройка логирования
 logging.basicConfig(
@@ -16,85 +37,504 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
 )
 
-def main():
-    logger = logging.getLogger("main")
-    logger.info("Запуск процесса генерации новостного поста...")
+logger = logging.getLogger("main")
 
-    try:
-        # 1. Получаем новости
-        news_list = news_fetcher.fetch_latest_news("conflict Middle East", language="en")
+NEWS_KEYWORDS = "conflict Middle East"
+NEWS_LANGUAGE = "en"
+IMAGES_DIR = "generated_images"
 
-        if not news_list:
-            logger.warning("Новости не найдены.")
-            return
 
-        # Берем первую новость
-        selected_news = news_list[0]
-        logger.info(f"Выбрана новость: {selected_news['title']}")
+# === Контрольные точки журнала задач ===
+# Новости, захваченные из журнала, несут в ключе "job" сохранённое состояние (job_store.Job)
+def _saved_content(news: dict):
+    job = news.get("job")
+    if job and job.content:
+        logger.info(f"Текст взят из журнала задач: {job.title}")
+        return job.content
+    return None
+
+
+def _save_content(news: dict, content):
+    if content and news.get("job"):
+        job_store.get_default_store().save_text(news["job"].id, *content)
+
+
+def _saved_image(news: dict):
+    # Изображение без сохранённого текста не берём: на нём заголовок, который мог
+    # не попасть в пост (текст оборвался или процесс упал до его сохранения)
+    job = news.get("job")
+    if not job or not job.image_hash or not job.content:
+        return None
+    image_bytes = job_store.get_default_store().load_image(job)
+    if image_bytes:
+        logger.info("Изображение взято из журнала задач")
+    return image_bytes
+
+
+def _save_image(news: dict, image_bytes: bytes):
+    if image_bytes and news.get("job"):
+        job_store.get_default_store().save_image(news["job"].id, image_bytes)
+
+
+def _story_trace(news: dict):
+    """Трасса одной новости; id задачи из журнала связывает попытки после сбоев"""
+    job = news.get("job")
+    return metrics.trace(job.id if job else None)
+
+
+# === Стадии обработки одной новости ===
+@metrics.traced("text")
+def _generate_text(content_generator: ContentGenerator, news: dict):
+    """Стадия 1: генерация текста. Возвращает (title, description, image_prompt) или None"""
+    saved = _saved_content(news)
+    if saved:
+        return saved
 
-        # 2. Генерируем текстовый контент
-        content_generator = ContentGenerator()
-        title, description, image_prompt = content_generator.generate_post_content(selected_news)
+    title, description, image_prompt = content_generator.generate_post_content(news)
 
-        if not title or not description:
-            logger.error("Не удалось сгенерировать текстовый контент")
-            return
+    if not title or not description:
+        logger.error(f"Не удалось сгенерировать текстовый контент: {news.get('title')}")
+        return None
 
-        logger.info(f"Сгенерирован контент: {title}")
+    logger.info(f"Сгенерирован контент: {title}")
+    _save_content(news, (title, description, image_prompt))
+    return title, description, image_prompt
 
-        # 3. Генерируем изображение (если есть промпт)
+
+@metrics.traced("text")
+def _generate_text_stream(content_generator: ContentGenerator, news: dict, on_field):
+    """Стадия 1 в потоковом режиме"""
+    saved = _saved_content(news)
+    if saved:
+        return saved
+
+    title, description, image_prompt = content_generator.generate_post_content_stream(news, on_field=on_field)
+
+    if not title or not description:
+        logger.error(f"Не удалось сгенерировать текстовый контент: {news.get('title')}")
+        return None
+
+    logger.info(f"Сгенерирован контент: {title}")
+    _save_content(news, (title, description, image_prompt))
+    return title, description, image_prompt
+
+
+@metrics.traced("image")
+def _generate_image(image_generator: ImageGenerator, image_prompt: str, title: str, news: dict = None,
+                    cancelled: threading.Event = None):
+    """
+    Стадия 2: генерация изображения с заголовком. Возвращает закодированные байты или None
+
+    :param cancelled: установлен — пост уже не будет опубликован: не платим за генерацию
+                      и не сохраняем изображение в журнал задач
+    """
+    if news:
+        saved = _saved_image(news)
+        if saved:
+            return saved
+
+    if not image_prompt or not image_generator:
+        return None
+    if cancelled is not None and cancelled.is_set():
+        logger.info("Генерация изображения отменена: текст поста не получен")
+        return None
+
+    try:
         image_path = None
-        if image_prompt:
-            try:
-                image_generator = ImageGenerator()
-
-                # Создаем директорию для изображений если её нет
-                images_dir = "generated_images"
-                os.makedirs(images_dir, exist_ok=True)
-
-                # Генерируем уникальное имя файла
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                image_path = os.path.join(images_dir, f"news_image_{timestamp}.png")
-
-                # Генерируем изображение с наложенным заголовком
-                final_image = image_generator.generate_with_overlay(
-                    image_prompt=image_prompt,
-                    overlay_text=title[:50] + "..." if len(title) > 50 else title,
-                    output_path=image_path
-                )
-
-                if final_image:
-                    logger.info(f"Изображение сгенерировано: {image_path}")
-                else:
-                    logger.warning("Не удалось сгенерировать изображение")
-                    image_path = None
-
-            except Exception as e:
-                logger.error(f"Ошибка при генерации изображения: {e}")
-                image_path = None
-
-        # 4. Публикуем в Telegram
-        success = telegram_publisher.publish_to_telegram(
-            title=title,
-            body=description,
-            image_path=image_path
+        if SAVE_GENERATED_IMAGES:
+            # Создаем директорию для изображений если её нет
+            os.makedirs(IMAGES_DIR, exist_ok=True)
+
+            # Генерируем уникальное имя файла (несколько новостей могут обрабатываться одновременно)
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            extension = IMAGE_FORMAT_EXTENSIONS.get(IMAGE_OUTPUT_FORMAT, "jpg")
+            image_path = os.path.join(IMAGES_DIR, f"news_image_{timestamp}_{uuid.uuid4().hex[:8]}.{extension}")
+
+        # Генерируем изображение с наложенным заголовком
+        image_bytes = image_generator.generate_encoded(
+            image_prompt=image_prompt,
+            overlay_text=title,
+            output_path=image_path
         )
 
+        if image_bytes:
+            logger.info(f"Изображение сгенерировано: {len(image_bytes) // 1024} КБ")
+            if cancelled is not None and cancelled.is_set():
+                logger.info("Изображение не сохраняется: текст поста не получен")
+                return None
+            if news:
+                _save_image(news, image_bytes)
+            return image_bytes
+
+        logger.warning("Не удалось сгенерировать изображение")
+        return None
+
+    except Exception as e:
+        logger.error(f"Ошибка при генерации изображения: {e}")
+        return None
+
+
+@metrics.traced("publish")
+def _publish(title: str, description: str, image_bytes: bytes = None) -> bool:
+    """Стадия 3: публикация в Telegram"""
+    success = telegram_publisher.publish_to_telegram(
+        title=title,
+        body=description,
+        image_bytes=image_bytes
+    )
+
+    metrics.POSTS.inc(result="published" if success else "failed")
+    if success:
+        logger.info("✅ Пост успешно опубликован!")
+    else:
+        logger.error("❌ Не удалось опубликовать пост.")
+
+    return success
+
+
+@metrics.traced("publish_group", succeeded=any)
+def _publish_group(posts: list) -> list:
+    """Стадия 3 для пакета: посты (title, description, image_bytes) уходят альбомом"""
+    results = telegram_publisher.publish_group_to_telegram(posts)
+    for success in results:
+        metrics.POSTS.inc(result="published" if success else "failed")
+    logger.info(f"Альбом: опубликовано {sum(results)} из {len(posts)} постов")
+    return results
+
+
+def _create_image_generator():
+    """ImageGenerator требует STABILITY_API_KEY — без него публикуем только текст"""
+    try:
+        return ImageGenerator()
+    except Exception as e:
+        logger.error(f"Генератор изображений недоступен: {e}")
+        return None
+
+
+def process_news(news: dict, content_generator: ContentGenerator, image_generator: ImageGenerator) -> bool:
+    """Последовательно проводит одну новость через все стадии"""
+    logger.info(f"Выбрана новость: {news['title']}")
+
+    with _story_trace(news):
+        content = _generate_text(content_generator, news)
+        if not content:
+            return False
+
+        title, description, image_prompt = content
+        image_bytes = _generate_image(image_generator, image_prompt, title, news)
+        success = _publish(title, description, image_bytes)
         if success:
-            logger.info("✅ Пост успешно опубликован!")
-
-            # Удаляем временный файл изображения (опционально)
-            if image_path and os.path.exists(image_path):
-                try:
-                    os.remove(image_path)
-                    logger.info("Временное изображение удалено")
-                except Exception as e:
-                    logger.warning(f"Не удалось удалить изображение: {e}")
+            _mark_published(news)
+        return success
+
+
+def _select_news(news_list: list) -> list:
+    """
+    Готовит выборку до любых обращений к LLM:
+    склеивает перепечатки одного события в кластер, отбрасывает кластеры,
+    где хоть одна новость уже публиковалась, и берёт по одному представителю.
+    """
+    if NEWS_CLUSTERING_ENABLED:
+        clusters = news_clustering.cluster_news(news_list)
+    else:
+        clusters = [[news] for news in news_list]
+
+    selected = []
+    for cluster in clusters:
+        if DEDUP_ENABLED and any(get_default_index().is_known(news) for news in cluster):
+            continue
+        representative = news_clustering.pick_representative(cluster)
+        # Перепечатки запоминаем вместе с представителем, чтобы не опубликовать их позже
+        representative["duplicates"] = [news for news in cluster if news is not representative]
+        selected.append(representative)
+
+    if DEDUP_ENABLED:
+        selected = get_default_index().filter_new(selected)
+    return selected
+
+
+def _mark_published(news: dict):
+    news["posted"] = True
+    if news.get("job"):
+        job_store.get_default_store().mark_published(news["job"].id)
+    if DEDUP_ENABLED:
+        index = get_default_index()
+        index.mark(news)
+        for duplicate in news.get("duplicates", []):
+            index.mark(duplicate)
+
+
+# === Асинхронный конвейер ===
+class _StageLimits:
+    """Семафоры, ограничивающие число одновременных задач на каждой стадии"""
+
+    def __init__(self, llm: int, image: int, publish: int):
+        self.llm = asyncio.Semaphore(llm)
+        self.image = asyncio.Semaphore(image)
+        self.publish = asyncio.Semaphore(publish)
+
+
+async def _run_stage(semaphore: asyncio.Semaphore, func, *args):
+    """Выполняет блокирующую стадию в пуле потоков, не превышая лимит стадии"""
+    async with semaphore:
+        return await asyncio.to_thread(func, *args)
+
+
+async def _finish_news_async(news: dict, content, image_generator: ImageGenerator,
+                             limits: _StageLimits) -> bool:
+    """Стадии после генерации текста: изображение и публикация"""
+    if not content:
+        return False
+
+    title, description, image_prompt = content
+    image_bytes = await _run_stage(limits.image, _generate_image, image_generator, image_prompt, title, news)
+    success = await _run_stage(limits.publish, _publish, title, description, image_bytes)
+    if success:
+        _mark_published(news)
+    return success
+
+
+async def _process_news_async(news: dict, content_generator: ContentGenerator,
+                              image_generator: ImageGenerator, limits: _StageLimits) -> bool:
+    """Проводит одну новость через конвейер; стадии разных новостей перекрываются"""
+    try:
+        with _story_trace(news):
+            content = await _run_stage(limits.llm, _generate_text, content_generator, news)
+            return await _finish_news_async(news, content, image_generator, limits)
+
+    except Exception as e:
+        logger.error(f"Ошибка обработки новости '{news.get('title')}': {e}")
+        return False
+
+
+async def _process_news_streaming(news: dict, content_generator: ContentGenerator,
+                                  image_generator: ImageGenerator, limits: _StageLimits) -> bool:
+    """
+    Вариант с потоковой генерацией: изображение начинает генерироваться,
+    как только модель дописала title и image_prompt, параллельно с описанием.
+    """
+    with _story_trace(news):
+        return await _stream_news(news, content_generator, image_generator, limits)
+
+
+async def _stream_news(news: dict, content_generator: ContentGenerator,
+                       image_generator: ImageGenerator, limits: _StageLimits) -> bool:
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    fields = {}
+    # task.cancel() отменяет только await — поток с генерацией изображения проверяет этот флаг
+    cancelled = threading.Event()
+
+    def set_ready(value):
+        if not ready.done():
+            ready.set_result(value)
+
+    def on_field(name, value):
+        # Вызывается из потока LLM-стадии
+        fields[name] = value
+        if "title" in fields and "image_prompt" in fields:
+            loop.call_soon_threadsafe(set_ready, (fields["title"], fields["image_prompt"]))
+
+    async def image_stage():
+        title, image_prompt = await ready
+        return await _run_stage(limits.image, _generate_image, image_generator, image_prompt, title, news,
+                                cancelled)
+
+    image_task = asyncio.create_task(image_stage())
+    try:
+        content = await _run_stage(limits.llm, _generate_text_stream, content_generator, news, on_field)
+        if not content:
+            cancelled.set()
+            image_task.cancel()
+            return False
+
+        title, description, image_prompt = content
+        set_ready((title, image_prompt))
+        image_bytes = await image_task
+
+        success = await _run_stage(limits.publish, _publish, title, description, image_bytes)
+        if success:
+            _mark_published(news)
+        return success
+
+    except Exception as e:
+        cancelled.set()
+        image_task.cancel()
+        logger.error(f"Ошибка обработки новости '{news.get('title')}': {e}")
+        return False
+
+
+@metrics.traced("text_batch", succeeded=any)
+def _generate_text_batch(content_generator: ContentGenerator, news_batch: list) -> list:
+    """Стадия 1 в пакетном режиме: один запрос к LLM на несколько новостей"""
+    # Новости с текстом из журнала задач в запрос не включаем
+    pending = [news for news in news_batch if not (news.get("job") and news["job"].content)]
+    generated = iter(content_generator.generate_posts_batch(pending) if pending else ())
+
+    contents = []
+    for news in news_batch:
+        content = _saved_content(news)
+        if not content:
+            content = next(generated)
+            content = content if content[0] and content[1] else None
+            _save_content(news, content)
+        contents.append(content)
+    return contents
+
+
+async def _process_batch_async(news_batch: list, content_generator: ContentGenerator,
+                               image_generator: ImageGenerator, limits: _StageLimits) -> list:
+    """Генерирует текст пакетом, дальше каждая новость идёт по конвейеру отдельно"""
+    try:
+        contents = await _run_stage(limits.llm, _generate_text_batch, content_generator, news_batch)
+    except Exception as e:
+        logger.error(f"Ошибка пакетной генерации: {e}")
+        return [False] * len(news_batch)
+
+    if TELEGRAM_MEDIA_GROUP:
+        return await _finish_batch_as_album(news_batch, contents, image_generator, limits)
+
+    async def finish(news, content):
+        try:
+            with _story_trace(news):
+                return await _finish_news_async(news, content, image_generator, limits)
+        except Exception as e:
+            logger.error(f"Ошибка обработки новости '{news.get('title')}': {e}")
+            return False
+
+    return await asyncio.gather(*(finish(news, content) for news, content in zip(news_batch, contents)))
+
+
+async def _finish_batch_as_album(news_batch: list, contents: list, image_generator: ImageGenerator,
+                                 limits: _StageLimits) -> list:
+    """Изображения пакета генерируются параллельно, затем посты публикуются одним альбомом"""
+    ready = [index for index, content in enumerate(contents) if content]
+
+    async def image_stage(index):
+        with _story_trace(news_batch[index]):
+            return await _run_stage(limits.image, _generate_image, image_generator, contents[index][2],
+                                    contents[index][0], news_batch[index])
+
+    images = await asyncio.gather(*(image_stage(index) for index in ready))
+
+    posts = [(contents[index][0], contents[index][1], image) for index, image in zip(ready, images)]
+    published = await _run_stage(limits.publish, _publish_group, posts) if posts else []
+
+    results = [False] * len(news_batch)
+    for index, success in zip(ready, published):
+        if success:
+            _mark_published(news_batch[index])
+        results[index] = success
+    return results
+
+
+async def run_pipeline(news_list: list, content_generator: ContentGenerator = None,
+                       image_generator: ImageGenerator = None) -> int:
+    """
+    Обрабатывает список новостей конкурентно.
+    Каждая стадия (LLM, изображение, публикация) имеет собственный лимит параллелизма,
+    поэтому пока одна новость ждёт изображение, следующая уже генерирует текст.
+
+    :return: количество успешно опубликованных постов
+    """
+    limits = _StageLimits(PIPELINE_LLM_CONCURRENCY, PIPELINE_IMAGE_CONCURRENCY, PIPELINE_PUBLISH_CONCURRENCY)
+    # Изображения нескольких новостей готовятся одновременно — наложение текста уходит в пул процессов
+    image_postprocess.enable_pool()
+
+    # Пул потоков по умолчанию должен вмещать все стадии одновременно
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(
+        max_workers=PIPELINE_LLM_CONCURRENCY + PIPELINE_IMAGE_CONCURRENCY + PIPELINE_PUBLISH_CONCURRENCY
+    ))
+
+    content_generator = content_generator or ContentGenerator()
+    if image_generator is None:
+        image_generator = _create_image_generator()
+
+    if LLM_BATCH_SIZE > 1:
+        batches = [news_list[i:i + LLM_BATCH_SIZE] for i in range(0, len(news_list), LLM_BATCH_SIZE)]
+        batch_results = await asyncio.gather(*(
+            _process_batch_async(batch, content_generator, image_generator, limits)
+            for batch in batches
+        ))
+        results = [ok for batch in batch_results for ok in batch]
+    else:
+        process = _process_news_streaming if LLM_STREAMING else _process_news_async
+        results = await asyncio.gather(*(
+            process(news, content_generator, image_generator, limits)
+            for news in news_list
+        ))
+
+    published = sum(1 for ok in results if ok)
+    logger.info(f"Конвейер завершён: опубликовано {published} из {len(news_list)}")
+    return published
+
+
+def run_cycle(keywords: str = NEWS_KEYWORDS, language: str = NEWS_LANGUAGE,
+              content_generator: ContentGenerator = None, image_generator: ImageGenerator = None) -> int:
+    """
+    Один цикл: получение новостей по теме, отбор и публикация.
+    Генераторы можно передать заранее созданными (режим демона держит их «тёплыми»).
+
+    :return: количество опубликованных постов
+    """
+    if DEDUP_ENABLED:
+        # Демон живёт неделями: устаревшие записи индекса чистим каждый цикл, а не только при запуске
+        get_default_index().prune()
+
+    # 1. Получаем новости
+    with metrics.span("fetch"):
+        fetched = news_fetcher.fetch_latest_news(keywords, language=language)
+    with metrics.span("select"):
+        selected = _select_news(fetched)
+    news_list = selected
+    limit = PIPELINE_MAX_NEWS if PIPELINE_MODE == "async" else 1
+
+    if JOB_STORE_ENABLED:
+        # При инкрементальной загрузке в журнал попадает вся выборка: следующий запрос
+        # начнётся после неё, и не взятые сейчас новости должны дождаться своей очереди
+        queued = selected if NEWS_INCREMENTAL else selected[:limit]
+        store = job_store.get_default_store()
+        store.enqueue(queued)
+        news_fetcher.commit_watermarks(fetched, pending=selected[len(queued):])
+        # Сначала захватываются задачи, прерванные в прошлых запусках, затем свежие
+        news_list = store.claim(limit=limit)
+
+    if not news_list:
+        logger.warning("Новые новости не найдены.")
+        if not JOB_STORE_ENABLED:
+            news_fetcher.commit_watermarks(fetched)
+        return 0
+
+    content_generator = content_generator or ContentGenerator()
+    if image_generator is None:
+        image_generator = _create_image_generator()
+
+    try:
+        if PIPELINE_MODE == "async":
+            return asyncio.run(run_pipeline(news_list[:limit], content_generator, image_generator))
+
+        # Берем первую новость
+        return int(process_news(news_list[0], content_generator, image_generator))
+    finally:
+        if JOB_STORE_ENABLED:
+            # Неопубликованные задачи возвращаются в очередь с сохранёнными стадиями
+            for news in news_list:
+                store.release(news["job"].id)
         else:
-            logger.error("❌ Не удалось опубликовать пост.")
+            # Без журнала водяной знак не должен перешагнуть неопубликованные новости
+            news_fetcher.commit_watermarks(fetched, pending=[news for news in selected if not news.get("posted")])
 
+
+def main():
+    logger.info("Запуск процесса генерации новостного поста...")
+
+    try:
+        run_cycle()
     except Exception as e:
         logger.error(f"Критическая ошибка в main: {e}")
+    finally:
+        metrics.write_file()
 
 
 if __name__ == "__main__":
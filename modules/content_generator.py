@@ -1,12 +1,16 @@
 import logging
-import openai
 import requests
 import json
-from typing import Dict, Tuple
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 from config import (
     AI_PROVIDER,
     OPENAI_API_KEY,
     OPENAI_MODEL,
+    OPENAI_BASE_URL,
     DEEPSEEK_API_KEY,
     DEEPSEEK_MODEL,
     DEEPSEEK_BASE_URL,
@@ -16,31 +20,103 @@ from config import (
     YANDEX_GPT_URL,
     MAX_TITLE_LENGTH,
     MAX_DESCRIPTION_LENGTH,
+    LLM_CACHE_ENABLED,
+    LLM_BATCH_SIZE,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_PROVIDER,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_DEFAULT_DELAY,
+    LLM_HEDGE_TIMEOUT,
+    LLM_HEDGE_WORKERS,
+    LLM_MAX_RETRIES,
+    LLM_JSON_MODE,
 )
+from modules import http_client, json_repair, metrics, prompts
+from modules.json_stream import IncrementalJSONParser
+from modules.llm_cache import LLMCache, get_default_cache
+from modules.rate_limiter import get_limiter, send_with_retries
 
 logger = logging.getLogger(__name__)
 
+# Версия шаблона промпта: увеличивать при любом изменении промпта,
+# чтобы кэш не отдавал ответы, полученные по старому шаблону
+PROMPT_VERSION = 3
+
+# Лимит токенов ответа на одну новость в пакетном режиме
+BATCH_TOKENS_PER_ITEM = 600
+
+# Поля поста в ответе модели и лимит токенов на их дозапрос
+POST_FIELDS = ("title", "description", "image_prompt")
+MISSING_FIELDS_MAX_TOKENS = 400
+
+
+# Адрес OpenAI API, если OPENAI_BASE_URL не задан (нужен для лимита пула по хосту)
+OPENAI_DEFAULT_URL = "https://api.openai.com/v1"
+
+# Общий пул потоков для хеджированных запросов; размер — от лимита LLM-стадии конвейера
+_hedge_executor = ThreadPoolExecutor(max_workers=LLM_HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+
+
+def _record_usage(provider: str, prompt_tokens, completion_tokens):
+    """Учитывает токены из ответа провайдера (Yandex отдаёт их строками)"""
+    if prompt_tokens:
+        metrics.LLM_TOKENS.inc(int(prompt_tokens), provider=provider, kind="prompt")
+    if completion_tokens:
+        metrics.LLM_TOKENS.inc(int(completion_tokens), provider=provider, kind="completion")
+
+
+def _timed_stream(provider: str, chunks: Iterator[str]) -> Iterator[str]:
+    """Задержка потокового запроса — до последнего фрагмента ответа"""
+    started = time.perf_counter()
+    try:
+        yield from chunks
+    finally:
+        metrics.PROVIDER_SECONDS.observe(time.perf_counter() - started, provider=provider)
+
+
 class ContentGenerator:
-    def __init__(self):
-        self.ai_provider = AI_PROVIDER
+    def __init__(self, use_cache: bool = LLM_CACHE_ENABLED, ai_provider: str = None,
+                 hedge: bool = LLM_HEDGE_ENABLED):
+        self.ai_provider = ai_provider or AI_PROVIDER
+        self.model = None
+        self.cache = get_default_cache() if use_cache else None
+        self.json_mode = LLM_JSON_MODE
+        # Недавние задержки ответов — по ним считается момент хеджа. Для запросов,
+        # проигравших хедж, сюда попадает время до отмены: настоящая задержка не меньше
+        self._latencies = deque(maxlen=100)
 
         # Инициализация в зависимости от провайдера
         if self.ai_provider == 'openai':
-            self.client = openai.OpenAI(api_key=OPENAI_API_KEY)
+            # SDK импортируется только для провайдера openai: это самый тяжёлый импорт проекта
+            import openai
+
+            self.client = openai.OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL,
+                                        http_client=http_client.get_httpx_client(OPENAI_BASE_URL or OPENAI_DEFAULT_URL))
             self.model = OPENAI_MODEL
         elif self.ai_provider == 'deepseek':
             self.api_key = DEEPSEEK_API_KEY
             self.model = DEEPSEEK_MODEL
             self.base_url = DEEPSEEK_BASE_URL
+            self.limiter = get_limiter("DeepSeek", DEEPSEEK_API_KEY)
         elif self.ai_provider == 'yandex':
             self.api_key = YANDEX_GPT_API_KEY
             self.folder_id = YANDEX_FOLDER_ID
             self.model = YANDEX_MODEL
             self.yandex_url = YANDEX_GPT_URL
+            self.limiter = get_limiter("YandexGPT", YANDEX_GPT_API_KEY)
+
+        # Запасной провайдер для хеджированных запросов
+        self.hedge_generator = None
+        if hedge and LLM_HEDGE_PROVIDER and LLM_HEDGE_PROVIDER != self.ai_provider:
+            self.hedge_generator = ContentGenerator(use_cache=False, ai_provider=LLM_HEDGE_PROVIDER, hedge=False)
 
         logger.info(f"Инициализирован генератор контента с провайдером: {self.ai_provider}")
 
-    def _generate_with_openai(self, system_prompt: str, user_prompt: str) -> str:
+    def _openai_json_options(self) -> dict:
+        return {"response_format": {"type": "json_object"}} if self.json_mode else {}
+
+    def _generate_with_openai(self, system_prompt: str, user_prompt: str, max_tokens: int = 1000) -> str:
         """Генерация контента с помощью OpenAI"""
         try:
             response = self.client.chat.completions.create(
@@ -50,16 +126,19 @@ class ContentGenerator:
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=0.7,
-                max_tokens=1000
+                max_tokens=max_tokens,
+                **self._openai_json_options()
             )
 
+            if response.usage:
+                _record_usage("openai", response.usage.prompt_tokens, response.usage.completion_tokens)
             return response.choices[0].message.content
 
         except Exception as e:
             logger.error(f"Ошибка при обращении к OpenAI: {e}")
             return ""
 
-    def _generate_with_deepseek(self, system_prompt: str, user_prompt: str) -> str:
+    def _generate_with_deepseek(self, system_prompt: str, user_prompt: str, max_tokens: int = 1000) -> str:
         """Генерация контента с помощью DeepSeek через REST API"""
         try:
             headers = {
@@ -80,8 +159,10 @@ class ContentGenerator:
                     }
                 ],
                 "temperature": 0.7,
-                "max_tokens": 1000
+                "max_tokens": max_tokens
             }
+            if self.json_mode:
+                data["response_format"] = {"type": "json_object"}
 
             # Формируем полный URL для chat/completions
             url = f"{self.base_url.rstrip('/')}/chat/completions"
@@ -89,17 +170,20 @@ class ContentGenerator:
             logger.info(f"Отправка запроса к DeepSeek: {url}")
             logger.debug(f"Данные запроса: {json.dumps(data, ensure_ascii=False, indent=2)}")
 
-            response = requests.post(
-                url,
-                headers=headers,
-                json=data,
-                timeout=60
+            response = send_with_retries(
+                self.limiter, "deepseek",
+                lambda: http_client.post(url, headers=headers, json=data, timeout=60),
+                LLM_MAX_RETRIES
             )
+            if response is None:
+                return ""
 
             logger.info(f"Статус ответа DeepSeek: {response.status_code}")
 
             if response.status_code == 200:
                 result = response.json()
+                usage = result.get('usage') or {}
+                _record_usage("deepseek", usage.get('prompt_tokens'), usage.get('completion_tokens'))
                 return result['choices'][0]['message']['content']
             else:
                 logger.error(f"Ошибка DeepSeek API: {response.status_code}")
@@ -116,7 +200,7 @@ class ContentGenerator:
             logger.error(f"Неожиданная ошибка при обращении к DeepSeek: {e}")
             return ""
 
-    def _generate_with_yandex(self, system_prompt: str, user_prompt: str) -> str:
+    def _generate_with_yandex(self, system_prompt: str, user_prompt: str, max_tokens: int = 1000) -> str:
         """Генерация контента с помощью YandexGPT"""
         try:
             headers = {
@@ -131,7 +215,7 @@ class ContentGenerator:
                 "completionOptions": {
                     "stream": False,
                     "temperature": 0.7,
-                    "maxTokens": 1000
+                    "maxTokens": max_tokens
                 },
                 "messages": [
                     {
@@ -144,21 +228,26 @@ class ContentGenerator:
                     }
                 ]
             }
+            if self.json_mode:
+                data["jsonObject"] = True
 
             logger.info(f"Отправка запроса к YandexGPT: {self.yandex_url}")
             logger.debug(f"Данные запроса: {json.dumps(data, ensure_ascii=False, indent=2)}")
 
-            response = requests.post(
-                self.yandex_url,
-                headers=headers,
-                json=data,
-                timeout=60  # Добавляем таймаут
+            response = send_with_retries(
+                self.limiter, "yandex",
+                lambda: http_client.post(self.yandex_url, headers=headers, json=data, timeout=60),
+                LLM_MAX_RETRIES
             )
+            if response is None:
+                return ""
 
             logger.info(f"Статус ответа YandexGPT: {response.status_code}")
 
             if response.status_code == 200:
                 result = response.json()
+                usage = result['result'].get('usage') or {}
+                _record_usage("yandex", usage.get('inputTextTokens'), usage.get('completionTokens'))
                 return result['result']['alternatives'][0]['message']['text']
             else:
                 logger.error(f"Ошибка YandexGPT API: {response.status_code}")
@@ -175,87 +264,551 @@ class ContentGenerator:
             logger.error(f"Неожиданная ошибка при обращении к YandexGPT: {e}")
             return ""
 
+    def _stream_with_openai(self, system_prompt: str, user_prompt: str, max_tokens: int = 1000,
+                          timeout: float = 60) -> Iterator[str]:
+        """Потоковая генерация OpenAI: отдаёт фрагменты текста по мере поступления"""
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=0.7,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True},
+                timeout=timeout,
+                **self._openai_json_options()
+            )
+            for chunk in stream:
+                if chunk.usage:
+                    _record_usage("openai", chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+        except Exception as e:
+            logger.error(f"Ошибка потокового запроса к OpenAI: {e}")
+
+    def _stream_with_deepseek(self, system_prompt: str, user_prompt: str, max_tokens: int = 1000,
+                            timeout: float = 60) -> Iterator[str]:
+        """Потоковая генерация DeepSeek: читает server-sent events из chat/completions"""
+        try:
+            headers = {
+                'Authorization': f'Bearer {self.api_key}',
+                'Content-Type': 'application/json'
+            }
+
+            data = {
+                "model": self.model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                "temperature": 0.7,
+                "max_tokens": max_tokens,
+                "stream": True,
+                # Без этого в потоке нет usage, и токены потоковых запросов не учитываются
+                "stream_options": {"include_usage": True}
+            }
+            if self.json_mode:
+                data["response_format"] = {"type": "json_object"}
+
+            url = f"{self.base_url.rstrip('/')}/chat/completions"
+            logger.info(f"Отправка потокового запроса к DeepSeek: {url}")
+
+            response = send_with_retries(
+                self.limiter, "deepseek",
+                lambda: http_client.post(url, headers=headers, json=data, timeout=timeout, stream=True),
+                LLM_MAX_RETRIES
+            )
+            if response is None:
+                return
+
+            with response:
+                if response.status_code != 200:
+                    logger.error(f"Ошибка DeepSeek API: {response.status_code}")
+                    logger.error(f"Текст ошибки: {response.text}")
+                    return
+
+                # text/event-stream без charset requests декодирует как latin-1
+                response.encoding = 'utf-8'
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    payload = line[len("data:"):].strip()
+                    if payload == "[DONE]":
+                        break
+                    chunk = json.loads(payload)
+                    if chunk.get('usage'):
+                        # Итоговый расход токенов приходит в последнем фрагменте
+                        _record_usage("deepseek", chunk['usage'].get('prompt_tokens'),
+                                      chunk['usage'].get('completion_tokens'))
+                    if not chunk.get('choices'):
+                        continue
+                    delta = chunk['choices'][0].get('delta', {})
+                    if delta.get('content'):
+                        yield delta['content']
+
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Ошибка потокового запроса к DeepSeek: {e}")
+        except (KeyError, IndexError, json.JSONDecodeError) as e:
+            logger.error(f"Ошибка парсинга потокового ответа DeepSeek: {e}")
+
+    def _stream_with_yandex(self, system_prompt: str, user_prompt: str, max_tokens: int = 1000,
+                            timeout: float = 60) -> Iterator[str]:
+        """
+        Потоковая генерация YandexGPT.
+        Каждая строка ответа содержит весь текст на текущий момент — отдаём только прирост.
+        """
+        try:
+            headers = {
+                'Authorization': f'Api-Key {self.api_key}',
+                'Content-Type': 'application/json',
+                'x-folder-id': self.folder_id
+            }
+
+            data = {
+                "modelUri": f"gpt://{self.folder_id}/{self.model}",
+                "completionOptions": {
+                    "stream": True,
+                    "temperature": 0.7,
+                    "maxTokens": max_tokens
+                },
+                "messages": [
+                    {"role": "system", "text": system_prompt},
+                    {"role": "user", "text": user_prompt}
+                ]
+            }
+            if self.json_mode:
+                data["jsonObject"] = True
+
+            logger.info(f"Отправка потокового запроса к YandexGPT: {self.yandex_url}")
+
+            response = send_with_retries(
+                self.limiter, "yandex",
+                lambda: http_client.post(self.yandex_url, headers=headers, json=data, timeout=timeout, stream=True),
+                LLM_MAX_RETRIES
+            )
+            if response is None:
+                return
+
+            with response:
+                if response.status_code != 200:
+                    logger.error(f"Ошибка YandexGPT API: {response.status_code}")
+                    logger.error(f"Текст ошибки: {response.text}")
+                    return
+
+                response.encoding = 'utf-8'
+                received, usage = "", {}
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line:
+                        continue
+                    result = json.loads(line)['result']
+                    usage = result.get('usage') or usage
+                    text = result['alternatives'][0]['message']['text']
+                    if len(text) > len(received):
+                        yield text[len(received):]
+                        received = text
+                _record_usage("yandex", usage.get('inputTextTokens'), usage.get('completionTokens'))
+
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Ошибка потокового запроса к YandexGPT: {e}")
+        except (KeyError, IndexError, json.JSONDecodeError) as e:
+            logger.error(f"Ошибка парсинга потокового ответа YandexGPT: {e}")
+
+    def _complete(self, system_prompt: str, user_prompt: str, max_tokens: int = 1000) -> str:
+        """Отправляет промпт выбранному провайдеру и возвращает сырой текст ответа"""
+        logger.info(f"Генерация контента с помощью {self.ai_provider}")
+
+        # Выбираем метод генерации в зависимости от провайдера
+        generate = {
+            'openai': self._generate_with_openai,
+            'deepseek': self._generate_with_deepseek,
+            'yandex': self._generate_with_yandex,
+        }.get(self.ai_provider)
+        if generate:
+            with metrics.PROVIDER_SECONDS.time(provider=self.ai_provider):
+                return generate(system_prompt, user_prompt, max_tokens)
+
+        logger.error(f"Неподдерживаемый AI провайдер: {self.ai_provider}")
+        return ""
+
+    def _stream(self, system_prompt: str, user_prompt: str, max_tokens: int = 1000,
+                timeout: float = 60) -> Iterator[str]:
+        """
+        Потоковый аналог _complete: отдаёт текст ответа фрагментами
+
+        :param timeout: таймаут соединения и ожидания очередного фрагмента, секунды
+        """
+        logger.info(f"Потоковая генерация контента с помощью {self.ai_provider}")
+
+        stream = {
+            'openai': self._stream_with_openai,
+            'deepseek': self._stream_with_deepseek,
+            'yandex': self._stream_with_yandex,
+        }.get(self.ai_provider)
+        if stream:
+            return _timed_stream(self.ai_provider, stream(system_prompt, user_prompt, max_tokens, timeout))
+
+        logger.error(f"Неподдерживаемый AI провайдер: {self.ai_provider}")
+        return iter(())
+
+    def _cache_key(self, news_data: Dict, max_title_length: int, max_description_length: int) -> str:
+        # В ключ идёт описание после обрезки: модель видит только его
+        compiler = prompts.get_compiler(max_title_length, max_description_length)
+        description = prompts.trim_to_budget(news_data.get('description') or '', compiler.description_tokens)
+        return LLMCache.make_key(
+            self.ai_provider, self.model, PROMPT_VERSION,
+            news_data.get('title', ''), description,
+            max_title_length, max_description_length
+        )
+
+    def _request_post_json(self, system_prompt: str, user_prompt: str,
+                           cancel_event: threading.Event = None) -> Optional[Dict]:
+        """
+        Запрашивает ответ модели и разбирает JSON. Возвращает словарь или None.
+
+        :param cancel_event: если задан, ответ читается потоком, и при установке события
+                             соединение закрывается, не дожидаясь конца генерации. Событие
+                             проверяется между фрагментами, поэтому такой запрос идёт с коротким
+                             LLM_HEDGE_TIMEOUT: зависший до первого байта не держит поток хеджа
+        """
+        started = time.monotonic()
+        if cancel_event is None:
+            content = self._complete(system_prompt, user_prompt)
+        else:
+            chunks = []
+            stream = self._stream(system_prompt, user_prompt, timeout=LLM_HEDGE_TIMEOUT)
+            try:
+                for chunk in stream:
+                    if cancel_event.is_set():
+                        logger.info(f"Запрос к {self.ai_provider} отменён: ответ уже получен от другого провайдера")
+                        return None
+                    chunks.append(chunk)
+            finally:
+                if hasattr(stream, "close"):
+                    stream.close()
+            content = "".join(chunks)
+
+        if not content:
+            return None
+
+        logger.info("Контент успешно сгенерирован")
+
+        # Парсим JSON ответ (мелкие дефекты и оборванный хвост исправляются)
+        try:
+            result = json_repair.parse_json(content)
+        except json.JSONDecodeError as e:
+            logger.error(f"Ошибка парсинга JSON ответа: {e}")
+            logger.error(f"Полученный ответ: {content}")
+            return None
+
+        if not isinstance(result, dict):
+            logger.error(f"Ответ {self.ai_provider} не является JSON-объектом")
+            return None
+
+        self._latencies.append(time.monotonic() - started)
+        return result
+
+    def _complete_missing_fields(self, news_data: Dict, fields: Dict,
+                                 max_title_length: int, max_description_length: int) -> Dict:
+        """
+        Дозапрашивает только поля, которых нет в ответе (модель оборвалась или пропустила поле):
+        короткий запрос вместо полной перегенерации. Возвращает поля, дополненные ответом.
+        """
+        ready = {name: fields[name] for name in POST_FIELDS if isinstance(fields.get(name), str) and fields[name]}
+        missing = [name for name in POST_FIELDS if name not in ready]
+        if not missing or not ready:
+            return ready
+
+        logger.warning(f"В ответе {self.ai_provider} нет полей {', '.join(missing)} — дозапрашиваем только их")
+        metrics.RETRIES.inc(service=self.ai_provider, reason="missing_fields")
+        compiler = prompts.get_compiler(max_title_length, max_description_length)
+        content = self._complete(compiler.system_prompt("fields"),
+                                 compiler.missing_fields_prompt(news_data, ready, missing),
+                                 max_tokens=MISSING_FIELDS_MAX_TOKENS)
+        try:
+            extra = json_repair.parse_json(content) if content else {}
+        except json.JSONDecodeError as e:
+            logger.error(f"Ошибка парсинга дозапроса полей: {e}")
+            extra = {}
+
+        if isinstance(extra, dict):
+            ready.update({name: extra[name] for name in missing if isinstance(extra.get(name), str) and extra[name]})
+        return ready
+
+    def _hedge_delay(self) -> float:
+        """Задержка хеджа: заданный перцентиль недавних задержек основного провайдера"""
+        if len(self._latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_DELAY
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * LLM_HEDGE_PERCENTILE))
+        return ordered[index]
+
+    def _request_post_json_hedged(self, system_prompt: str, user_prompt: str) -> Tuple[Optional[Dict], str]:
+        """
+        Хеджированный запрос: если основной провайдер не ответил за перцентиль своей
+        обычной задержки (или ответил ошибкой), тот же промпт уходит запасному.
+        Берётся первый разобравшийся ответ, запрос-проигравший закрывается.
+
+        :return: (ответ или None, провайдер, который его дал)
+        """
+        cancel_primary = threading.Event()
+        cancel_secondary = threading.Event()
+        started = time.monotonic()
+        primary = _hedge_executor.submit(self._request_post_json, system_prompt, user_prompt, cancel_primary)
+
+        delay = self._hedge_delay()
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            result = primary.result()
+            if result:
+                return result, self.ai_provider
+            logger.warning(f"{self.ai_provider} не дал ответа, переключаемся на {self.hedge_generator.ai_provider}")
+        else:
+            logger.info(f"{self.ai_provider} не ответил за {delay:.1f} с — дублируем запрос "
+                        f"в {self.hedge_generator.ai_provider}")
+
+        secondary = _hedge_executor.submit(
+            self.hedge_generator._request_post_json, system_prompt, user_prompt, cancel_secondary
+        )
+        cancel_events = {primary: cancel_primary, secondary: cancel_secondary}
+
+        pending = {primary, secondary}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result:
+                    for other in pending:
+                        cancel_events[other].set()
+                    if primary in pending:
+                        # Отменённый основной запрос тоже даёт замер — нижнюю оценку задержки.
+                        # Без него в выборке остаются только быстрые ответы, перцентиль
+                        # сползает вниз, и хеджируется почти каждый запрос
+                        self._latencies.append(max(time.monotonic() - started, delay))
+                    provider = self.ai_provider if future is primary else self.hedge_generator.ai_provider
+                    logger.info(f"Хеджирование: использован ответ {provider}")
+                    return result, provider
+
+        return None, self.ai_provider
+
     def generate_post_content(self, news_data: Dict,
                               max_title_length: int = None,
-                              max_description_length: int = None) -> Tuple[str, str, str]:
+                              max_description_length: int = None,
+                              bypass_cache: bool = False) -> Tuple[str, str, str]:
         """
         Генерация контента поста на основе новости
+
+        :param bypass_cache: не читать ответ из кэша (свежий результат всё равно сохраняется)
         """
         try:
             max_title_length = max_title_length or MAX_TITLE_LENGTH
             max_description_length = max_description_length or MAX_DESCRIPTION_LENGTH
 
-            original_title = news_data.get('title', '')
-            original_description = news_data.get('description', '')
+            cache_key = None
+            if self.cache:
+                cache_key = self._cache_key(news_data, max_title_length, max_description_length)
+                if not bypass_cache:
+                    cached = self.cache.get(cache_key)
+                    if cached:
+                        logger.info(f"Контент взят из кэша: {cached[0]}")
+                        return cached
+
+            compiler = prompts.get_compiler(max_title_length, max_description_length)
+            system_prompt = compiler.system_prompt("single")
+            user_prompt = compiler.user_prompt(news_data)
+
+            if self.hedge_generator:
+                result, provider = self._request_post_json_hedged(system_prompt, user_prompt)
+                if provider != self.ai_provider:
+                    # Ключ кэша описывает основной провайдер и модель — ответ запасного под ним не храним
+                    cache_key = None
+            else:
+                result = self._request_post_json(system_prompt, user_prompt)
 
-            system_prompt = f"""Ты - опытный журналист российского информационного агентства. 
-Твоя задача - адаптировать зарубежные новости для русскоязычной аудитории.
+            if not result:
+                return "", "", ""
 
-Создай на основе предоставленной новости:
-1. Заголовок (максимум {max_title_length} символов) - яркий, информативный, в стиле российских СМИ
-2. Описание (максимум {max_description_length} символов) - краткое изложение сути новости
-3. Описание для генерации изображения (на английском языке, до 100 символов)
+            result = self._complete_missing_fields(news_data, result, max_title_length, max_description_length)
+            title = result.get('title', '')
+            description = result.get('description', '')
+            image_prompt = result.get('image_prompt', '')
 
-Стиль: официальный, но доступный, без сенсационности.
-Язык заголовка и описания: русский.
-Избегай прямого перевода, адаптируй под российские реалии.
+            logger.info(f"Сгенерированный заголовок: {title}")
 
-Верни ТОЛЬКО JSON в точном формате:
-{{
-  "title": "заголовок",
-  "description": "описание",
-  "body": "текст поста",
-  "image_prompt": "подсказка для изображения на английском"
-}}"""
+            if cache_key and title and description:
+                self.cache.put(cache_key, (title, description, image_prompt))
 
-            user_prompt = f"""Оригинальный заголовок: {original_title}
-Оригинальное описание: {original_description}"""
+            return title, description, image_prompt
 
-            logger.info(f"Генерация контента с помощью {self.ai_provider}")
+        except Exception as e:
+            logger.error(f"Ошибка генерации контента: {e}")
+            return "", "", ""
 
-            # Выбираем метод генерации в зависимости от провайдера
-            if self.ai_provider == 'openai':
-                content = self._generate_with_openai(system_prompt, user_prompt)
-            elif self.ai_provider == 'deepseek':
-                content = self._generate_with_deepseek(system_prompt, user_prompt)
-            elif self.ai_provider == 'yandex':
-                content = self._generate_with_yandex(system_prompt, user_prompt)
-            else:
-                logger.error(f"Неподдерживаемый AI провайдер: {self.ai_provider}")
-                return "", "", ""
+    def generate_post_content_stream(self, news_data: Dict,
+                                     on_field: Callable[[str, str], None] = None,
+                                     max_title_length: int = None,
+                                     max_description_length: int = None,
+                                     bypass_cache: bool = False) -> Tuple[str, str, str]:
+        """
+        Потоковая генерация контента поста.
+        Поля title и image_prompt запрашиваются первыми и передаются в on_field(имя, значение)
+        сразу по готовности — следующие стадии могут стартовать, пока пишется описание.
 
-            if not content:
+        :return: тот же кортеж (title, description, image_prompt), что и generate_post_content
+        """
+        try:
+            max_title_length = max_title_length or MAX_TITLE_LENGTH
+            max_description_length = max_description_length or MAX_DESCRIPTION_LENGTH
+            on_field = on_field or (lambda name, value: None)
+
+            cache_key = None
+            if self.cache:
+                cache_key = self._cache_key(news_data, max_title_length, max_description_length)
+                if not bypass_cache:
+                    cached = self.cache.get(cache_key)
+                    if cached:
+                        logger.info(f"Контент взят из кэша: {cached[0]}")
+                        for name, value in zip(("title", "description", "image_prompt"), cached):
+                            on_field(name, value)
+                        return cached
+
+            compiler = prompts.get_compiler(max_title_length, max_description_length)
+            system_prompt = compiler.system_prompt("stream")
+            user_prompt = compiler.user_prompt(news_data)
+
+            parser = IncrementalJSONParser()
+            chunks = []
+            for chunk in self._stream(system_prompt, user_prompt):
+                chunks.append(chunk)
+                for name, value in parser.feed(chunk):
+                    if name in ("title", "description", "image_prompt"):
+                        on_field(name, value)
+
+            fields = parser.fields
+            if fields and any(not fields.get(name) for name in POST_FIELDS):
+                # Оборванный поток: дописываем недостающее коротким запросом
+                fields = self._complete_missing_fields(news_data, fields, max_title_length, max_description_length)
+                for name in POST_FIELDS:
+                    if fields.get(name) and not parser.fields.get(name):
+                        on_field(name, fields[name])
+
+            if not fields.get('title') or not fields.get('description'):
+                content = "".join(chunks)
+                logger.error(f"Потоковый ответ не содержит обязательных полей: {content}")
                 return "", "", ""
 
-            logger.info("Контент успешно сгенерирован")
+            result = (fields['title'], fields['description'], fields.get('image_prompt', ''))
+            logger.info(f"Сгенерированный заголовок: {result[0]}")
 
-            # Парсим JSON ответ
-            try:
-                # Пытаемся найти JSON в ответе
-                start_idx = content.find('{')
-                end_idx = content.rfind('}') + 1
+            if cache_key:
+                self.cache.put(cache_key, result)
+            return result
 
-                if start_idx != -1 and end_idx != 0:
-                    json_content = content[start_idx:end_idx]
-                    result = json.loads(json_content)
-                else:
-                    result = json.loads(content)
+        except Exception as e:
+            logger.error(f"Ошибка потоковой генерации контента: {e}")
+            return "", "", ""
+
+    def generate_posts_batch(self, news_items: List[Dict],
+                             batch_size: int = None,
+                             max_title_length: int = None,
+                             max_description_length: int = None) -> List[Tuple[str, str, str]]:
+        """
+        Пакетная генерация: несколько новостей в одном запросе к модели.
+        Системный промпт отправляется один раз на пакет, ответ — JSON-объект с массивом items.
+        Элементам без части полей дозапрашиваются только эти поля,
+        новости, для которых элемент не разобрался вовсе, догенерируются по одной.
 
-                title = result.get('title', '')
-                description = result.get('description', '')
-                image_prompt = result.get('image_prompt', '')
+        :return: список кортежей (title, description, image_prompt) в порядке news_items
+        """
+        batch_size = batch_size or LLM_BATCH_SIZE
+        max_title_length = max_title_length or MAX_TITLE_LENGTH
+        max_description_length = max_description_length or MAX_DESCRIPTION_LENGTH
+
+        results = [None] * len(news_items)
+        pending = []
+        for idx, news_data in enumerate(news_items):
+            cached = None
+            if self.cache:
+                cached = self.cache.get(self._cache_key(news_data, max_title_length, max_description_length))
+            if cached:
+                results[idx] = cached
+            else:
+                pending.append(idx)
 
-                logger.info(f"Сгенерированный заголовок: {title}")
-                return title, description, image_prompt
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            if len(chunk) == 1:
+                continue  # одиночную новость выгоднее отправить обычным запросом ниже
 
-            except json.JSONDecodeError as e:
-                logger.error(f"Ошибка парсинга JSON ответа: {e}")
-                logger.error(f"Полученный ответ: {content}")
-                return "", "", ""
+            parsed = self._generate_batch_chunk(
+                [news_items[idx] for idx in chunk], max_title_length, max_description_length
+            )
+            for position, idx in enumerate(chunk):
+                item = parsed.get(position)
+                if item:
+                    results[idx] = item
+                    if self.cache:
+                        self.cache.put(
+                            self._cache_key(news_items[idx], max_title_length, max_description_length), item
+                        )
+
+        # Фолбэк: по одной только для тех, что не удалось получить пакетом
+        failed = [idx for idx in pending if results[idx] is None]
+        if failed:
+            logger.info(f"Пакетная генерация: {len(failed)} новостей догенерируются по одной")
+        for idx in failed:
+            results[idx] = self.generate_post_content(
+                news_items[idx], max_title_length, max_description_length, bypass_cache=True
+            )
 
-        except Exception as e:
-            logger.error(f"Ошибка генерации контента: {e}")
-            return "", "", ""
+        return results
+
+    def _generate_batch_chunk(self, news_items: List[Dict],
+                              max_title_length: int, max_description_length: int) -> Dict[int, Tuple[str, str, str]]:
+        """Один запрос на пакет. Возвращает {позиция в пакете: кортеж} только для валидных элементов"""
+        compiler = prompts.get_compiler(max_title_length, max_description_length)
+        system_prompt = compiler.system_prompt("batch")
+        user_prompt = compiler.batch_user_prompt(news_items)
+
+        logger.info(f"Пакетная генерация контента: {len(news_items)} новостей в одном запросе")
+        content = self._complete(system_prompt, user_prompt, max_tokens=BATCH_TOKENS_PER_ITEM * len(news_items))
+        if not content:
+            return {}
+
+        try:
+            items = json_repair.parse_json(content)
+        except json.JSONDecodeError as e:
+            logger.error(f"Ошибка парсинга JSON пакетного ответа: {e}")
+            return {}
+
+        # Без JSON-режима модели иногда отдают сам массив вместо {"items": [...]}
+        if isinstance(items, dict):
+            items = items.get('items')
+        if not isinstance(items, list):
+            logger.error("Пакетный ответ не содержит массива items")
+            return {}
+
+        parsed = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                position = int(item.get('id'))
+            except (TypeError, ValueError):
+                continue
+
+            if not 0 <= position < len(news_items) or position in parsed:
+                continue
+            fields = self._complete_missing_fields(news_items[position], item,
+                                                   max_title_length, max_description_length)
+            if fields.get('title') and fields.get('description'):
+                parsed[position] = (fields['title'], fields['description'], fields.get('image_prompt', ''))
+
+        logger.info(f"Пакетная генерация: разобрано {len(parsed)} из {len(news_items)}")
+        return parsed
 
     def test_api_connection(self) -> bool:
         """Тестирование подключения к выбранному AI API"""
@@ -293,7 +846,7 @@ class ContentGenerator:
 
                 url = f"{self.base_url.rstrip('/')}/chat/completions"
 
-                response = requests.post(
+                response = http_client.post(
                     url,
                     headers=headers,
                     json=data,
@@ -330,7 +883,7 @@ class ContentGenerator:
                     ]
                 }
 
-                response = requests.post(
+                response = http_client.post(
                     self.yandex_url,
                     headers=headers,
                     json=data,
@@ -0,0 +1,143 @@
+"""
+Модуль: Индекс уже опубликованных новостей
+
+Новость считается известной, если совпадает хэш канонического URL
+или отпечаток нормализованного заголовка. Индекс хранится в SQLite,
+а для проверок целиком держится в памяти (множества — O(1) на поиск).
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from config import DEDUP_INDEX_PATH, DEDUP_RETENTION_DAYS
+from modules.storage import open_sqlite
+
+logger = logging.getLogger(__name__)
+
+# Параметры, которые не меняют содержимое страницы
+_TRACKING_PARAMS = {"fbclid", "gclid", "yclid", "ref", "ref_src", "cmpid", "ito", "mc_cid", "mc_eid"}
+
+# " - Reuters", " | BBC News" в конце заголовка NewsAPI
+_SOURCE_SUFFIX_RE = re.compile(r"\s+[-|–—]\s+[^-|–—]{2,40}$")
+_NON_WORD_RE = re.compile(r"[^\w\s]+")
+
+
+def canonicalize_url(url: str) -> str:
+    """Приводит URL к каноническому виду: без www, фрагмента, трекинговых параметров и хвостового '/'"""
+    parts = urlsplit((url or "").strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+
+    query = [
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in _TRACKING_PARAMS
+    ]
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower() or "https", host, path, urlencode(sorted(query)), ""))
+
+
+def url_hash(url: str) -> str:
+    return hashlib.sha1(canonicalize_url(url).encode("utf-8")).hexdigest()
+
+
+def title_fingerprint(title: str) -> str:
+    """Отпечаток заголовка: без подписи источника, пунктуации и регистра"""
+    text = _SOURCE_SUFFIX_RE.sub("", (title or "").strip())
+    text = " ".join(_NON_WORD_RE.sub(" ", text.lower()).split())
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class PublishedIndex:
+    def __init__(self, path: str = DEDUP_INDEX_PATH, retention_days: int = DEDUP_RETENTION_DAYS):
+        """
+        Args:
+            path: путь к файлу SQLite
+            retention_days: сколько дней помнить новость (0 — бессрочно)
+        """
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._conn = open_sqlite(path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS published (
+                       url_hash TEXT PRIMARY KEY,
+                       title_fp TEXT NOT NULL,
+                       title TEXT,
+                       processed_at REAL NOT NULL
+                   )"""
+            )
+        self._urls, self._titles = set(), set()
+        self.prune()
+        self._load()
+        logger.info(f"Индекс опубликованных новостей: {len(self._urls)} записей")
+
+    def _load(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT url_hash, title_fp FROM published").fetchall()
+            self._urls = {row[0] for row in rows}
+            self._titles = {row[1] for row in rows}
+
+    def prune(self) -> int:
+        """
+        Забывает новости старше retention_days — и в базе, и в памяти.
+        Долгоживущий процесс (демон) вызывает это каждый цикл. Возвращает число удалённых записей.
+        """
+        if not self.retention_days:
+            return 0
+        cutoff = time.time() - self.retention_days * 86400
+        with self._lock, self._conn:
+            removed = self._conn.execute("DELETE FROM published WHERE processed_at < ?", (cutoff,)).rowcount
+        if removed:
+            logger.info(f"Из индекса опубликованных удалено устаревших записей: {removed}")
+            # Отпечаток заголовка может быть общим у нескольких записей — множества пересобираем
+            self._load()
+        return removed
+
+    def is_known(self, news: dict) -> bool:
+        return (url_hash(news.get("url")) in self._urls
+                or title_fingerprint(news.get("title")) in self._titles)
+
+    def filter_new(self, news_list: list) -> list:
+        """Возвращает только ещё не опубликованные новости (и без повторов внутри списка)"""
+        seen_urls, seen_titles = set(), set()
+        fresh = []
+        for news in news_list:
+            u, t = url_hash(news.get("url")), title_fingerprint(news.get("title"))
+            if u in self._urls or t in self._titles or u in seen_urls or t in seen_titles:
+                continue
+            seen_urls.add(u)
+            seen_titles.add(t)
+            fresh.append(news)
+
+        skipped = len(news_list) - len(fresh)
+        if skipped:
+            logger.info(f"Пропущено уже опубликованных/повторяющихся новостей: {skipped}")
+        return fresh
+
+    def mark(self, news: dict):
+        """Запоминает новость как опубликованную"""
+        u, t = url_hash(news.get("url")), title_fingerprint(news.get("title"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO published (url_hash, title_fp, title, processed_at) VALUES (?, ?, ?, ?)",
+                (u, t, news.get("title"), time.time())
+            )
+            self._urls.add(u)
+            self._titles.add(t)
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_default_index() -> PublishedIndex:
+    """Общий для процесса экземпляр индекса"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = PublishedIndex()
+    return _default_index
@@ -0,0 +1,125 @@
+"""
+Модуль: Общий HTTP-клиент с пулами keep-alive соединений
+
+Все модули обращаются к внешним API через get()/post() этого модуля,
+чтобы переиспользовать TCP+TLS соединения между запросами.
+Для каждого хоста создаётся отдельная сессия со своим лимитом пула.
+"""
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import HTTP_POOL_MAXSIZE, HTTP_POOL_LIMITS, HTTP2_ENABLED
+
+logger = logging.getLogger(__name__)
+
+_sessions = {}
+_httpx_client = None
+_lock = threading.Lock()
+
+
+def _parse_pool_limits(spec: str) -> dict:
+    """Разбирает строку вида "host=N,host2=M" в словарь {host: N}"""
+    limits = {}
+    for part in spec.split(","):
+        if "=" not in part:
+            continue
+        host, _, value = part.partition("=")
+        try:
+            limits[host.strip().lower()] = int(value)
+        except ValueError:
+            logger.warning(f"Некорректный лимит пула для {host}: {value}")
+    return limits
+
+
+_pool_limits = _parse_pool_limits(HTTP_POOL_LIMITS)
+
+
+def _host(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def get_session(url: str) -> requests.Session:
+    """Возвращает сессию для хоста из URL, создавая её при первом обращении"""
+    host = _host(url)
+    session = _sessions.get(host)
+    if session is not None:
+        return session
+
+    with _lock:
+        session = _sessions.get(host)
+        if session is None:
+            pool_size = _pool_limits.get(host, HTTP_POOL_MAXSIZE)
+            # pool_block=True: при исчерпании пула потоки ждут соединение, а не открывают новые
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[host] = session
+            logger.debug(f"Создана HTTP-сессия для {host} (пул: {pool_size})")
+    return session
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """Выполняет запрос через пул соединений хоста"""
+    return get_session(url).request(method, url, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def get_httpx_client(url: str = None):
+    """
+    Общий httpx-клиент для SDK, работающих поверх httpx (OpenAI).
+    HTTP/2 включается, только если установлен пакет h2 (httpx[http2]).
+
+    :param url: адрес API — размер пула берётся из HTTP_POOL_LIMITS для его хоста,
+                как и у сессий requests
+    """
+    global _httpx_client
+    if _httpx_client is not None:
+        return _httpx_client
+
+    with _lock:
+        if _httpx_client is None:
+            import httpx
+
+            http2 = HTTP2_ENABLED
+            if http2:
+                try:
+                    import h2  # noqa: F401
+                except ImportError:
+                    logger.warning("HTTP2_ENABLED=true, но пакет h2 не установлен — httpx работает "
+                                   "по HTTP/1.1 (pip install 'httpx[http2]')")
+                    http2 = False
+
+            pool_size = _pool_limits.get(_host(url), HTTP_POOL_MAXSIZE) if url else HTTP_POOL_MAXSIZE
+            _httpx_client = httpx.Client(
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=pool_size,
+                ),
+            )
+            logger.debug(f"Создан httpx-клиент (HTTP/2: {http2}, пул: {pool_size})")
+    return _httpx_client
+
+
+def close_all():
+    """Закрывает все сессии (при завершении процесса)"""
+    global _httpx_client
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+        if _httpx_client is not None:
+            _httpx_client.close()
+            _httpx_client = None
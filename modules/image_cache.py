@@ -0,0 +1,148 @@
+"""
+Модуль: Контентно-адресуемый дисковый кэш сгенерированных изображений
+
+Файл называется хэшем всех параметров генерации, поэтому одинаковый запрос
+к Stability.ai отдаётся с диска. При превышении лимита размера удаляются
+файлы, к которым дольше всего не обращались.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Iterable, Optional
+
+from config import IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_MB
+from modules import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ImageCache:
+    def __init__(self, directory: str = IMAGE_CACHE_DIR, max_bytes: int = IMAGE_CACHE_MAX_MB * 1024 * 1024):
+        """
+        Args:
+            directory: каталог хранилища
+            max_bytes: максимальный суммарный размер файлов (0 — без ограничения)
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(prompt: str, engine: str, width: int, height: int, cfg_scale: float, steps: int) -> str:
+        """Хэш всех входных данных, влияющих на результат генерации"""
+        params = {
+            "prompt": prompt,
+            "engine": engine,
+            "width": width,
+            "height": height,
+            "cfg_scale": cfg_scale,
+            "steps": steps,
+        }
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        # Раскладываем по подкаталогам, чтобы не держать тысячи файлов в одном каталоге
+        return os.path.join(self.directory, key[:2], f"{key}.png")
+
+    def get(self, key: str) -> Optional[str]:
+        """Возвращает путь к закэшированному файлу или None"""
+        path = self._path(key)
+        try:
+            # Обновляем время доступа — по нему работает вытеснение
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            metrics.CACHE_REQUESTS.inc(cache="image", result="miss")
+            return None
+
+        self.hits += 1
+        metrics.CACHE_REQUESTS.inc(cache="image", result="hit")
+        return path
+
+    def put_bytes(self, key: str, data: bytes) -> str:
+        """Атомарно сохраняет изображение и возвращает путь к нему"""
+        return self.put_stream(key, (data,))
+
+    def put_stream(self, key: str, chunks: Iterable[bytes]) -> str:
+        """
+        Пишет изображение по частям (например, прямо из HTTP-ответа) во временный файл
+        и атомарно переименовывает его — читатели никогда не видят недописанный файл.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._evict()
+        return path
+
+    def _evict(self):
+        """Удаляет самые давно использованные файлы, пока кэш не уложится в лимит"""
+        if not self.max_bytes:
+            return
+
+        with self._lock:
+            entries = []
+            total = 0
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if not name.endswith(".png"):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    logger.debug(f"Изображение вытеснено из кэша: {path}")
+                except FileNotFoundError:
+                    pass
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache() -> ImageCache:
+    """Общий для процесса экземпляр кэша"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ImageCache()
+            logger.info(f"Кэш изображений: {IMAGE_CACHE_DIR}")
+    return _default_cache
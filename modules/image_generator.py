@@ -1,13 +1,17 @@
 """
 Модуль: Генерация изображений через Stability.ai API
+
+PIL импортируется при первом использовании: текстовые посты и
+короткоживущие процессы не платят за загрузку библиотеки изображений.
 """
+from __future__ import annotations
 
 import requests
 import base64
-from PIL import Image, ImageDraw, ImageFont
 import io
 import os
 import logging
+from typing import TYPE_CHECKING, Optional
 from config import (
     STABILITY_API_KEY,
     STABILITY_ENGINE,
@@ -16,16 +20,29 @@ from config import (
     IMAGE_HEIGHT,
     IMAGE_CFG_SCALE,
     IMAGE_STEPS,
+    IMAGE_CACHE_ENABLED,
+    STABILITY_BINARY_RESPONSE,
+    STABILITY_MAX_RETRIES,
     TIMEOUT
 )
+from modules import http_client, image_postprocess, metrics
+from modules.image_cache import ImageCache, get_default_cache
+from modules.image_postprocess import draw_text_overlay, encode_image  # noqa: F401 (реэкспорт)
+from modules.rate_limiter import get_limiter, send_with_retries
+
+if TYPE_CHECKING:
+    from PIL import Image
 
 logger = logging.getLogger(__name__)
 
+# Размер блока при потоковом чтении бинарного ответа Stability.ai
+STREAM_CHUNK_SIZE = 64 * 1024
 
+IMAGE_FORMAT_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}
 
 
 class ImageGenerator:
-    def __init__(self):
+    def __init__(self, use_cache: bool = IMAGE_CACHE_ENABLED):
         """Инициализация генератора изображений"""
         if not STABILITY_API_KEY:
             raise ValueError("STABILITY_API_KEY не найден в переменных окружения")
@@ -37,6 +54,8 @@ class ImageGenerator:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        self.cache = get_default_cache() if use_cache else None
+        self.limiter = get_limiter("Stability", STABILITY_API_KEY)
         logger.info("Инициализирован генератор изображений Stability.ai")
 
     def generate_image(self, prompt: str, output_path: str = None) -> Image.Image:
@@ -50,6 +69,8 @@ class ImageGenerator:
         Returns:
             PIL.Image: Сгенерированное изображение
         """
+        from PIL import Image
+
         url = f"{self.base_url}/generation/{self.engine}/text-to-image"
 
         payload = {
@@ -66,27 +87,35 @@ class ImageGenerator:
             "steps": IMAGE_STEPS,
         }
 
+        cache_key = None
+        if self.cache:
+            cache_key = ImageCache.make_key(
+                prompt, self.engine, IMAGE_WIDTH, IMAGE_HEIGHT, IMAGE_CFG_SCALE, IMAGE_STEPS
+            )
+            cached_path = self.cache.get(cache_key)
+            if cached_path:
+                try:
+                    image = Image.open(cached_path)
+                    image.load()
+                    logger.info(f"Изображение взято из кэша: '{prompt}'")
+                    if output_path:
+                        image.save(output_path)
+                    return image
+                except Exception as e:
+                    logger.warning(f"Повреждённый файл в кэше изображений, генерируем заново: {e}")
+
         logger.info(f"Генерация изображения: '{prompt}'")
 
         try:
-            response = requests.post(
-                url,
-                headers=self.headers,
-                json=payload,
-                timeout=TIMEOUT
-            )
+            with metrics.PROVIDER_SECONDS.time(provider="stability"):
+                if STABILITY_BINARY_RESPONSE:
+                    image = self._request_binary_image(url, payload, cache_key)
+                else:
+                    image = self._request_base64_image(url, payload, cache_key)
 
-            if response.status_code != 200:
-                logger.error(f"Ошибка Stability.ai API: {response.status_code} - {response.text}")
+            if image is None:
                 return None
 
-            data = response.json()
-            image_data = data["artifacts"][0]["base64"]
-
-            # Декодируем base64 изображение
-            image_bytes = base64.b64decode(image_data)
-            image = Image.open(io.BytesIO(image_bytes))
-
             if output_path:
                 image.save(output_path)
                 logger.info(f"Изображение сохранено: {output_path}")
@@ -101,10 +130,79 @@ class ImageGenerator:
             logger.error(f"Ошибка генерации изображения: {e}")
             return None
 
+    def _request_base64_image(self, url: str, payload: dict, cache_key: str = None) -> Optional[Image.Image]:
+        """Ответ в JSON: изображение приходит строкой base64 в artifacts[0]"""
+        from PIL import Image
+
+        response = send_with_retries(
+            self.limiter, "stability",
+            lambda: http_client.post(url, headers=self.headers, json=payload, timeout=TIMEOUT),
+            STABILITY_MAX_RETRIES
+        )
+        if response is None:
+            return None
+
+        if response.status_code != 200:
+            logger.error(f"Ошибка Stability.ai API: {response.status_code} - {response.text}")
+            return None
+
+        data = response.json()
+        image_data = data["artifacts"][0]["base64"]
+
+        # Декодируем base64 изображение
+        image_bytes = base64.b64decode(image_data)
+        metrics.IMAGE_BYTES.observe(len(image_bytes), kind="stability")
+        image = Image.open(io.BytesIO(image_bytes))
+
+        if cache_key:
+            self.cache.put_bytes(cache_key, image_bytes)
+
+        return image
+
+    def _request_binary_image(self, url: str, payload: dict, cache_key: str = None) -> Optional[Image.Image]:
+        """
+        Ответ в виде PNG (Accept: image/png): тело потоком пишется прямо в файл кэша
+        или в буфер — без JSON, base64-строки и её декодированной копии в памяти.
+        """
+        from PIL import Image
+
+        headers = {**self.headers, "Accept": "image/png"}
+        response = send_with_retries(
+            self.limiter, "stability",
+            lambda: http_client.post(url, headers=headers, json=payload, timeout=TIMEOUT, stream=True),
+            STABILITY_MAX_RETRIES
+        )
+        if response is None:
+            return None
+
+        with response:
+            if response.status_code != 200:
+                logger.error(f"Ошибка Stability.ai API: {response.status_code} - {response.text}")
+                return None
+
+            chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+            if cache_key:
+                path = self.cache.put_stream(cache_key, chunks)
+                metrics.IMAGE_BYTES.observe(os.path.getsize(path), kind="stability")
+                image = Image.open(path)
+            else:
+                buffer = io.BytesIO()
+                for chunk in chunks:
+                    buffer.write(chunk)
+                metrics.IMAGE_BYTES.observe(buffer.tell(), kind="stability")
+                buffer.seek(0)
+                image = Image.open(buffer)
+
+        # Декодируем сразу, пока файл кэша гарантированно на месте
+        image.load()
+        return image
+
     def add_text_overlay(self, image: Image.Image, text: str,
                          position: str = "bottom_left") -> Image.Image:
         """
-        Добавляет текст поверх изображения
+        Добавляет текст поверх изображения.
+        Длинный текст переносится по словам, размер шрифта подбирается так,
+        чтобы уложиться в OVERLAY_MAX_LINES строк.
 
         Args:
             image: PIL изображение
@@ -117,50 +215,14 @@ class ImageGenerator:
         if not image:
             return None
 
-        img_with_text = image.copy()
-        draw = ImageDraw.Draw(img_with_text)
-
-        # Загружаем шрифт
-        try:
-            font = ImageFont.truetype("arial.ttf", 24)
-        except:
-            font = ImageFont.load_default()
-
-        # Вычисляем размеры текста
-        text_bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = text_bbox[2] - text_bbox[0]
-        text_height = text_bbox[3] - text_bbox[1]
-
-        # Определяем позицию
-        padding = 20
-        positions = {
-            "top_left": (padding, padding),
-            "top_right": (image.width - text_width - padding, padding),
-            "bottom_left": (padding, image.height - text_height - padding),
-            "bottom_right": (image.width - text_width - padding,
-                             image.height - text_height - padding),
-            "center": ((image.width - text_width) // 2,
-                       (image.height - text_height) // 2)
-        }
-
-        text_x, text_y = positions.get(position, positions["bottom_left"])
-
-        # Добавляем фон под текст
-        background_coords = [
-            (text_x - 10, text_y - 5),
-            (text_x + text_width + 10, text_y + text_height + 5)
-        ]
-        draw.rectangle(background_coords, fill=(0, 0, 0, 128))
-
-        # Добавляем текст
-        draw.text((text_x, text_y), text, font=font, fill=(255, 255, 255))
-
-        return img_with_text
+        return draw_text_overlay(image, text, position)
 
     def generate_with_overlay(self, image_prompt: str, overlay_text: str,
                               output_path: str = None) -> Image.Image:
         """
-        Генерирует изображение и добавляет текст одним вызовом
+        Генерирует изображение и добавляет текст одним вызовом.
+        Базовое изображение берётся из кэша, если оно уже генерировалось
+        с теми же параметрами — тогда повторяется только наложение текста.
 
         Args:
             image_prompt: Описание для генерации изображения
@@ -186,6 +248,32 @@ class ImageGenerator:
 
         return final_image
 
+    def generate_encoded(self, image_prompt: str, overlay_text: str,
+                         output_path: str = None) -> Optional[bytes]:
+        """
+        Генерирует изображение с текстом и сразу кодирует его для Telegram.
+        Изображение не покидает память; на диск пишется только при явном output_path.
+
+        Returns:
+            bytes: закодированное изображение (IMAGE_OUTPUT_FORMAT) или None
+        """
+        base_image = self.generate_image(image_prompt)
+        if not base_image:
+            logger.error("Не удалось сгенерировать базовое изображение")
+            return None
+
+        # Наложение текста и кодирование — в пуле процессов, не под GIL конвейера
+        with metrics.span("overlay"):
+            data = image_postprocess.postprocess(base_image, overlay_text)
+        metrics.IMAGE_BYTES.observe(len(data), kind="encoded")
+
+        if output_path:
+            with open(output_path, "wb") as f:
+                f.write(data)
+            logger.info(f"Финальное изображение сохранено: {output_path}")
+
+        return data
+
     def test_connection(self) -> bool:
         """Тестирует подключение к Stability.ai API"""
         try:
@@ -200,7 +288,7 @@ class ImageGenerator:
                 "steps": 10,
             }
 
-            response = requests.post(
+            response = http_client.post(
                 url,
                 headers=self.headers,
                 json=payload,
@@ -223,7 +311,7 @@ class ImageGenerator:
         url = f"{self.base_url}/v1/engines/list"
 
         try:
-            response = requests.get(url, headers=self.headers, timeout=30)
+            response = http_client.get(url, headers=self.headers, timeout=30)
 
             if response.status_code == 200:
                 engines = response.json()
@@ -0,0 +1,270 @@
+"""
+Модуль: Пост-обработка изображений — наложение текста и кодирование
+
+Отрисовка текста, масштабирование и кодирование в JPEG/WEBP — чистая работа
+процессора под GIL. Чтобы несколько изображений не выстраивались в очередь
+друг за другом и не тормозили потоки ввода-вывода, задачи уходят в пул процессов.
+Пиксели передаются через разделяемую память (multiprocessing.shared_memory),
+а не сериализуются pickle; обратно возвращаются только закодированные байты.
+"""
+from __future__ import annotations
+
+import atexit
+import io
+import logging
+import threading
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Tuple
+
+from config import (
+    IMAGE_OUTPUT_FORMAT,
+    IMAGE_OUTPUT_QUALITY,
+    IMAGE_MAX_BYTES,
+    IMAGE_POSTPROCESS_AUTO_WORKERS,
+    IMAGE_POSTPROCESS_WORKERS,
+)
+from modules.text_layout import get_font, layout_text
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Режим пикселей в разделяемой памяти: PIL отображает RGBA на внешний буфер без копирования
+SHARED_MODE = "RGBA"
+
+
+def draw_text_overlay(image: Image.Image, text: str, position: str = "bottom_left",
+                      copy: bool = True) -> Image.Image:
+    """
+    Рисует текст на подложке. Длинный текст переносится по словам, размер шрифта
+    подбирается так, чтобы уложиться в OVERLAY_MAX_LINES строк.
+
+    Args:
+        image: PIL изображение
+        text: текст для добавления
+        position: позиция текста
+        copy: рисовать на копии (False — прямо на переданном изображении)
+    """
+    from PIL import ImageDraw
+
+    img_with_text = image.copy() if copy else image
+    draw = ImageDraw.Draw(img_with_text)
+
+    # Раскладка: перенос по словам и подбор размера шрифта под ширину изображения
+    padding = 20
+    layout = layout_text(text, image.width - 2 * padding - 20)
+    font = get_font(layout.size)
+    text_width = layout.width
+    text_height = layout.height
+
+    # Определяем позицию
+    positions = {
+        "top_left": (padding, padding),
+        "top_right": (image.width - text_width - padding, padding),
+        "bottom_left": (padding, image.height - text_height - padding),
+        "bottom_right": (image.width - text_width - padding,
+                         image.height - text_height - padding),
+        "center": ((image.width - text_width) // 2,
+                   (image.height - text_height) // 2)
+    }
+
+    text_x, text_y = positions.get(position, positions["bottom_left"])
+
+    # Добавляем фон под текст
+    background_coords = [
+        (text_x - 10, text_y - 5),
+        (text_x + text_width + 10, text_y + text_height + 5)
+    ]
+    draw.rectangle(background_coords, fill=(0, 0, 0, 128))
+
+    # Добавляем текст построчно
+    for index, line in enumerate(layout.lines):
+        draw.text((text_x, text_y + index * layout.line_height), line, font=font, fill=(255, 255, 255))
+
+    return img_with_text
+
+
+def encode_image(image: Image.Image, fmt: str = IMAGE_OUTPUT_FORMAT, quality: int = IMAGE_OUTPUT_QUALITY,
+                 max_bytes: int = IMAGE_MAX_BYTES) -> bytes:
+    """
+    Кодирует изображение в память, укладываясь в max_bytes:
+    сначала снижается качество (до 50), затем уменьшается разрешение.
+    """
+    if fmt in ("JPEG", "WEBP") and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    qualities = list(range(quality, 49, -10)) or [quality]
+    while True:
+        for q in qualities:
+            buffer = io.BytesIO()
+            image.save(buffer, format=fmt, quality=q, optimize=True)
+            if buffer.tell() <= max_bytes or fmt == "PNG":
+                logger.info(f"Изображение закодировано: {fmt}, {image.width}x{image.height}, "
+                            f"качество {q}, {buffer.tell() // 1024} КБ")
+                return buffer.getvalue()
+
+        if image.width < 320:
+            return buffer.getvalue()
+        image = image.resize((int(image.width * 0.8), int(image.height * 0.8)))
+
+
+def render(image: Image.Image, text: str, position: str = "bottom_left") -> bytes:
+    """Наложение текста и кодирование в текущем процессе"""
+    return encode_image(draw_text_overlay(image, text, position, copy=False))
+
+
+# === Пул процессов ===
+
+_pool = None
+_pool_lock = threading.Lock()
+# Автоматическая настройка (-1) включает пул только в долгоживущих режимах
+_pool_enabled = False
+
+
+def enable_pool():
+    """
+    Разрешает пул при IMAGE_POSTPROCESS_WORKERS=-1. Вызывают async-конвейер и демон:
+    одиночному последовательному запуску старт процессов spawn обходится дороже одного наложения.
+    """
+    global _pool_enabled
+    _pool_enabled = True
+
+
+def _workers() -> int:
+    if IMAGE_POSTPROCESS_WORKERS >= 0:
+        return IMAGE_POSTPROCESS_WORKERS
+    return IMAGE_POSTPROCESS_AUTO_WORKERS if _pool_enabled else 0
+
+
+def _worker_init():
+    """Прогрев воркера: PIL и шрифты загружаются один раз на процесс, а не на задачу"""
+    from PIL import Image  # noqa: F401
+    get_font(12)
+
+
+def _render_shared(name: str, mode: str, size: Tuple[int, int], text: str, position: str) -> bytes:
+    """Задача воркера: читает пиксели из разделяемой памяти, рисует текст и кодирует"""
+    from multiprocessing import shared_memory
+    from PIL import Image
+
+    # Блоком владеет родительский процесс: воркер только подключается и закрывает его
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        shared = Image.frombuffer(SHARED_MODE, size, shm.buf, "raw", SHARED_MODE, 0, 1)
+        # Копия в исходном режиме — на ней и рисуем; отображение буфера сразу отпускаем
+        image = shared.convert(mode) if mode != SHARED_MODE else shared.copy()
+        del shared
+        return render(image, text, position)
+    finally:
+        shm.close()
+
+
+def get_pool():
+    """Общий пул процессов или None, если пост-обработка выполняется в текущем процессе"""
+    global _pool
+    workers = _workers()
+    if workers <= 0:
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            # spawn: конвейер многопоточный, а fork из процесса с потоками небезопасен
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_worker_init,
+            )
+            logger.info(f"Пул пост-обработки изображений: {workers} процессов")
+    return _pool
+
+
+def _share_pixels(image: Image.Image):
+    """Копирует пиксели изображения в новый блок разделяемой памяти"""
+    from multiprocessing import shared_memory
+    from PIL import Image
+
+    shm = shared_memory.SharedMemory(create=True, size=image.width * image.height * len(SHARED_MODE))
+    try:
+        # Пишем прямо в разделяемый блок — без промежуточного tobytes()
+        target = Image.frombuffer(SHARED_MODE, image.size, shm.buf, "raw", SHARED_MODE, 0, 1)
+        target.readonly = 0
+        target.paste(image if image.mode in ("RGB", SHARED_MODE) else image.convert(SHARED_MODE))
+        del target
+    except Exception:
+        shm.close()
+        shm.unlink()
+        raise
+    return shm
+
+
+def _release(shm):
+    shm.close()
+    shm.unlink()
+
+
+def submit(image: Image.Image, text: str, position: str = "bottom_left") -> Future:
+    """
+    Ставит наложение текста и кодирование в очередь пула.
+    Future возвращает закодированные байты (IMAGE_OUTPUT_FORMAT).
+    """
+    pool = get_pool()
+    if pool is None:
+        future = Future()
+        try:
+            future.set_result(render(image.copy(), text, position))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    mode = image.mode if image.mode in ("RGB", SHARED_MODE) else "RGB"
+    shm = _share_pixels(image)
+    try:
+        future = pool.submit(_render_shared, shm.name, mode, image.size, text, position)
+    except Exception:
+        _release(shm)
+        raise
+    # Блок освобождается, когда воркер закончил с ним работать
+    future.add_done_callback(lambda _: _release(shm))
+    return future
+
+
+def _discard_broken_pool():
+    """Убирает пул с упавшим воркером — следующий вызов создаст новый"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _result(future: Future, image: Image.Image, text: str, position: str) -> bytes:
+    from concurrent.futures.process import BrokenProcessPool
+
+    try:
+        return future.result()
+    except BrokenProcessPool as e:
+        # Воркер упал — не теряем пост, обрабатываем локально
+        logger.warning(f"Пул пост-обработки недоступен, обработка в текущем процессе: {e}")
+        _discard_broken_pool()
+        return render(image.copy(), text, position)
+
+
+def postprocess(image: Image.Image, text: str, position: str = "bottom_left") -> bytes:
+    """Наложение текста и кодирование одного изображения (в пуле, если он включён)"""
+    return _result(submit(image, text, position), image, text, position)
+
+
+def shutdown():
+    """Останавливает пул процессов (дожидается поставленных задач)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+atexit.register(shutdown)
@@ -0,0 +1,247 @@
+"""
+Модуль: Журнал задач публикации с контрольными точками по стадиям
+
+Каждая отобранная новость становится задачей в SQLite (WAL). После каждой
+стадии сохраняется её результат: сгенерированный текст, затем готовое изображение
+(в самой задаче, а не в вытесняемом кэше изображений — пока задача не опубликована,
+байты никуда не денутся). Если публикация не удалась
+или процесс упал, следующий запуск захватывает задачу и продолжает с первой
+незавершённой стадии — LLM и Stability.ai повторно не оплачиваются.
+
+Захват атомарный (SELECT и UPDATE в одной транзакции BEGIN IMMEDIATE), поэтому
+несколько процессов могут разбирать общий журнал, не получая одну задачу дважды.
+Попытка засчитывается при захвате: задача, на которой процесс падает, не будет
+повторяться бесконечно.
+"""
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import List, NamedTuple, Optional
+
+from config import (
+    JOB_STORE_PATH,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETENTION_DAYS,
+)
+from modules.dedup_index import url_hash
+from modules.storage import open_sqlite
+
+logger = logging.getLogger(__name__)
+
+# Состояния задачи
+NEW = "new"
+TEXT_READY = "text_ready"
+IMAGE_READY = "image_ready"
+PUBLISHED = "published"
+FAILED = "failed"
+
+
+class Job(NamedTuple):
+    id: str
+    state: str
+    attempts: int
+    title: Optional[str] = None
+    description: Optional[str] = None
+    image_prompt: Optional[str] = None
+    image_hash: Optional[str] = None
+
+    @property
+    def content(self):
+        """(title, description, image_prompt), если текстовая стадия уже пройдена"""
+        if self.title and self.description:
+            return self.title, self.description, self.image_prompt
+        return None
+
+
+def job_id(news: dict) -> str:
+    """Идентификатор задачи совпадает с ключом индекса опубликованных"""
+    return url_hash(news.get("url") or news.get("title"))
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobStore:
+    def __init__(self, path: str = JOB_STORE_PATH, lease_seconds: int = JOB_LEASE_SECONDS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS, retention_days: int = JOB_RETENTION_DAYS):
+        """
+        Args:
+            path: путь к файлу SQLite
+            lease_seconds: через сколько секунд захват без результата считается брошенным
+            max_attempts: после стольких неудач задача помечается failed
+            retention_days: сколько дней хранить завершённые задачи (0 — бессрочно)
+        """
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = open_sqlite(path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                       id TEXT PRIMARY KEY,
+                       news TEXT NOT NULL,
+                       state TEXT NOT NULL,
+                       title TEXT,
+                       description TEXT,
+                       image_prompt TEXT,
+                       image_hash TEXT,
+                       image BLOB,
+                       attempts INTEGER NOT NULL DEFAULT 0,
+                       claimed_by TEXT,
+                       claimed_at REAL,
+                       created_at REAL NOT NULL,
+                       updated_at REAL NOT NULL
+                   )"""
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "image" not in columns:
+                # Журнал из прошлых версий: изображения лежали в общем кэше
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN image BLOB")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, created_at)")
+            if retention_days:
+                cutoff = time.time() - retention_days * 86400
+                removed = self._conn.execute(
+                    "DELETE FROM jobs WHERE state IN (?, ?) AND updated_at < ?", (PUBLISHED, FAILED, cutoff)
+                ).rowcount
+                if removed:
+                    logger.info(f"Из журнала задач удалено завершённых записей: {removed}")
+
+    def enqueue(self, news_list: list) -> int:
+        """Добавляет новости как задачи; уже известные задачи не трогаются. Возвращает число новых"""
+        now = time.time()
+        rows = [(job_id(news), json.dumps(news, ensure_ascii=False), NEW, now, now) for news in news_list]
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO jobs (id, news, state, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            added = self._conn.total_changes - before
+        if added:
+            logger.info(f"В журнал задач добавлено: {added}")
+        return added
+
+    def claim(self, worker_id: str = None, limit: int = 1) -> List[dict]:
+        """
+        Атомарно захватывает до limit незавершённых задач — сначала самые старые,
+        т.е. прерванные в прошлых запусках. Задача, захваченная другим процессом,
+        доступна только после истечения lease_seconds. Каждый захват — попытка:
+        задача, исчерпавшая max_attempts (например, роняющая процесс), помечается failed.
+
+        :return: новости; у каждой в ключе "job" — сохранённое состояние (Job)
+        """
+        worker_id = worker_id or default_worker_id()
+        now = time.time()
+        available = "state NOT IN (?, ?) AND (claimed_at IS NULL OR claimed_at < ?)"
+        available_args = (PUBLISHED, FAILED, now - self.lease_seconds)
+        with self._lock, self._conn:
+            # Блокировка на запись сразу: другой процесс не выберет те же задачи между SELECT и UPDATE
+            self._conn.execute("BEGIN IMMEDIATE")
+            exhausted = self._conn.execute(
+                f"UPDATE jobs SET state = ?, image = NULL, claimed_by = NULL, claimed_at = NULL, updated_at = ? "
+                f"WHERE {available} AND attempts >= ?",
+                (FAILED, now, *available_args, self.max_attempts)
+            ).rowcount
+            if exhausted:
+                logger.warning(f"Задач, исчерпавших попытки: {exhausted} — помечены failed")
+
+            rows = self._conn.execute(
+                f"""SELECT id, news, state, attempts, title, description, image_prompt, image_hash
+                    FROM jobs WHERE {available} ORDER BY created_at LIMIT ?""",
+                (*available_args, limit)
+            ).fetchall()
+            self._conn.executemany(
+                """UPDATE jobs SET claimed_by = ?, claimed_at = ?, attempts = attempts + 1, updated_at = ?
+                   WHERE id = ?""",
+                [(worker_id, now, now, row[0]) for row in rows]
+            )
+
+        claimed = []
+        for row in rows:
+            news = json.loads(row[1])
+            news["job"] = Job(row[0], row[2], row[3] + 1, *row[4:8])
+            if news["job"].state != NEW:
+                logger.info(f"Возобновляется задача '{news.get('title')}' со стадии после '{news['job'].state}'")
+            claimed.append(news)
+        return claimed
+
+    def save_text(self, job: str, title: str, description: str, image_prompt: str):
+        """
+        Сохраняет текст. Состояние только движется вперёд: в потоковом режиме
+        изображение может быть сохранено раньше текста — тогда задача остаётся image_ready.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                """UPDATE jobs SET title = ?, description = ?, image_prompt = ?, updated_at = ?,
+                       state = CASE WHEN state = ? THEN ? ELSE state END
+                   WHERE id = ? AND state NOT IN (?, ?)""",
+                (title, description, image_prompt, time.time(), NEW, TEXT_READY, job, PUBLISHED, FAILED)
+            )
+
+    def save_image(self, job: str, data: bytes) -> str:
+        """Сохраняет готовое изображение в задаче. Возвращает хэш содержимого"""
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """UPDATE jobs SET state = ?, image_hash = ?, image = ?, updated_at = ?
+                   WHERE id = ? AND state NOT IN (?, ?)""",
+                (IMAGE_READY, digest, sqlite3.Binary(data), time.time(), job, PUBLISHED, FAILED)
+            )
+        return digest
+
+    def load_image(self, job: Job) -> Optional[bytes]:
+        """Сохранённое изображение задачи; None, если его нет"""
+        if not job.image_hash:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT image FROM jobs WHERE id = ?", (job.id,)).fetchone()
+        return bytes(row[0]) if row and row[0] is not None else None
+
+    def mark_published(self, job: str):
+        """Помечает задачу опубликованной; изображение больше не нужно и удаляется"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, image = NULL, claimed_by = NULL, updated_at = ? WHERE id = ?",
+                (PUBLISHED, time.time(), job)
+            )
+
+    def release(self, job: str):
+        """
+        Снимает захват с неопубликованной задачи и возвращает её в очередь (результаты
+        пройденных стадий сохраняются). Попытка уже засчитана в claim(); если она была
+        последней, задача помечается failed. Опубликованные задачи не меняются.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                """UPDATE jobs SET claimed_by = NULL, claimed_at = NULL,
+                       image = CASE WHEN attempts >= ? THEN NULL ELSE image END,
+                       state = CASE WHEN attempts >= ? THEN ? ELSE state END,
+                       updated_at = ?
+                   WHERE id = ? AND state != ?""",
+                (self.max_attempts, self.max_attempts, FAILED, time.time(), job, PUBLISHED)
+            )
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return dict(rows)
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_default_store() -> JobStore:
+    """Общий для процесса экземпляр журнала"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = JobStore()
+    return _default_store
@@ -0,0 +1,146 @@
+"""
+Модуль: Терпимый разбор JSON из ответа LLM
+
+Модели иногда портят JSON мелочами: оборачивают его в текст или ```json,
+оставляют висящую запятую, вставляют сырой перевод строки внутрь строки
+или обрываются на лимите токенов. Вместо того чтобы выбрасывать весь ответ,
+парсер чинит такие дефекты, а оборванный ответ обрезает до последнего целого
+поля — недостающие поля потом можно дозапросить отдельно.
+"""
+import json
+import re
+
+_CODE_FENCE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL | re.IGNORECASE)
+_CLOSERS = {"{": "}", "[": "]"}
+_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+_NEXT_CHAR = re.compile(r"\s*(.?)", re.DOTALL)
+# Сколько раз отступать к предыдущей запятой, если хвост оборванного ответа не разбирается
+_MAX_TRUNCATION_STEPS = 8
+
+
+def _extract(content: str) -> str:
+    """
+    Вырезает JSON из текста: блок ```json или всё от первой скобки.
+    Где кончается значение, решают json.JSONDecoder.raw_decode и _repair —
+    текст после него (пояснения модели, второй объект) отбрасывается.
+    """
+    fence = _CODE_FENCE.search(content)
+    if fence:
+        content = fence.group(1)
+
+    starts = [index for index in (content.find("{"), content.find("[")) if index != -1]
+    if not starts:
+        return content.strip()
+    return content[min(starts):].rstrip()
+
+
+def _closes_string(text: str, index: int, stack: list) -> bool:
+    """
+    Закрывает ли кавычка text[index] строку. Да, если за ней идёт разделитель,
+    иначе это неэкранированная кавычка внутри текста: "Он сказал "да"".
+    Запятая внутри объекта считается разделителем, только если за ней начинается ключ
+    (или объект закрывается — висящая запятая).
+    """
+    following = _NEXT_CHAR.match(text, index + 1)
+    char = following.group(1)
+    if char == "," and stack and stack[-1] == "{":
+        after_comma = _NEXT_CHAR.match(text, following.end()).group(1)
+        return not after_comma or after_comma in '"}'
+    return not char or char in ",:}]"
+
+
+def _repair(text: str):
+    """
+    Один проход по тексту: экранирует управляющие символы и кавычки внутри строк,
+    убирает запятые перед закрывающими скобками и закрывает то, что не закрыто.
+
+    Разбор останавливается на конце первого значения верхнего уровня.
+
+    :return: список вариантов для разбора — исправленный текст, а если ответ оборван
+             (не закрыты скобки или строка), ещё и обрезки по запятым от последней
+             к первой; если ответ оборван посреди строки, недописанное значение
+             отбрасывается — обрезки идут первыми
+    """
+    out = []
+    stack = []
+    in_string = False
+    escape = False
+    commas = []  # (длина out до запятой, стек скобок на этот момент)
+
+    for index, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+                out.append(char)
+            elif char == "\\":
+                escape = True
+                out.append(char)
+            elif char == '"':
+                if _closes_string(text, index, stack):
+                    in_string = False
+                    out.append(char)
+                else:
+                    out.append('\\"')
+            else:
+                out.append(_ESCAPES.get(char, char) if char < " " else char)
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(char)
+        elif char in "}]":
+            # Висящая запятая: {"a": 1,} → {"a": 1}
+            while out and out[-1] in " \n\r\t":
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if stack:
+                stack.pop()
+            if not stack:
+                # Первое значение верхнего уровня закончилось — остальное не JSON
+                out.append(char)
+                return ["".join(out)]
+        elif char == ",":
+            commas.append((len(out), tuple(stack)))
+        out.append(char)
+
+    if not stack and not in_string:
+        # Ответ не оборван: обрезка по запятым только потеряла бы целые поля
+        return ["".join(out).rstrip().rstrip(",")]
+
+    truncated = [
+        "".join(out[:position]) + "".join(_CLOSERS[opener] for opener in reversed(openers))
+        for position, openers in reversed(commas[-_MAX_TRUNCATION_STEPS:])
+    ]
+
+    if in_string:
+        # Ответ оборван внутри строки: значение недописано, предпочитаем обрезку до целых полей
+        if escape:
+            out.pop()
+        out.append('"')
+        repaired = "".join(out) + "".join(_CLOSERS[opener] for opener in reversed(stack))
+        return truncated + [repaired]
+
+    repaired = "".join(out).rstrip().rstrip(",") + "".join(_CLOSERS[opener] for opener in reversed(stack))
+    return [repaired] + truncated
+
+
+def parse_json(content: str):
+    """
+    Разбирает JSON из ответа модели, по возможности исправляя мелкие дефекты.
+
+    :raises json.JSONDecodeError: если ничего разобрать не удалось
+    """
+    text = _extract(content or "")
+    try:
+        return json.JSONDecoder().raw_decode(text)[0]
+    except json.JSONDecodeError as error:
+        first_error = error
+
+    for candidate in _repair(text):
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    raise first_error
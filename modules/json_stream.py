@@ -0,0 +1,80 @@
+"""
+Модуль: Инкрементальный разбор JSON-объекта из потока ответа LLM
+
+Парсер получает текст кусками по мере генерации и сообщает о каждом
+строковом поле верхнего уровня, как только его значение полностью пришло —
+не дожидаясь закрывающей скобки всего объекта.
+"""
+import json
+
+
+class IncrementalJSONParser:
+    def __init__(self):
+        self.fields = {}
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._buffer = []
+        self._key = None          # ключ, для которого ждём значение
+        self._expect_value = False  # после ':' на верхнем уровне
+        self._pending_key = None  # последняя строка верхнего уровня, которая может оказаться ключом
+
+    def feed(self, chunk: str) -> list:
+        """
+        Принимает очередной кусок текста.
+
+        :return: список пар (ключ, значение) для строковых полей, завершившихся в этом куске
+        """
+        completed = []
+        for char in chunk:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    self._buffer.append(char)
+                elif char == "\\":
+                    self._escape = True
+                    self._buffer.append(char)
+                elif char == '"':
+                    self._in_string = False
+                    self._finish_string(completed)
+                else:
+                    self._buffer.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._buffer = []
+            elif char in "{[":
+                self._depth += 1
+                if self._depth > 1:
+                    # Значение верхнего поля — вложенная структура, её не отслеживаем
+                    self._expect_value = False
+            elif char in "}]":
+                self._depth = max(0, self._depth - 1)
+            elif self._depth == 1:
+                if char == ":":
+                    self._key = self._pending_key
+                    self._expect_value = True
+                elif char == ",":
+                    self._expect_value = False
+                    self._key = None
+
+        return completed
+
+    def _finish_string(self, completed: list):
+        if self._depth != 1:
+            return
+
+        raw = "".join(self._buffer)
+        try:
+            value = json.loads(f'"{raw}"')
+        except json.JSONDecodeError:
+            value = raw
+
+        if self._expect_value and self._key is not None:
+            self.fields[self._key] = value
+            completed.append((self._key, value))
+            self._expect_value = False
+            self._key = None
+        else:
+            self._pending_key = value
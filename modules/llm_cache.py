@@ -0,0 +1,129 @@
+"""
+Модуль: Дисковый кэш ответов LLM
+
+Хранит уже разобранный результат (title, description, image_prompt),
+чтобы повторный запуск по той же новости не оплачивал генерацию заново.
+Ключ учитывает провайдера, модель, версию шаблона промпта и нормализованный текст новости.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Optional, Tuple
+
+from config import LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_MAX_ENTRIES
+from modules import metrics
+from modules.storage import open_sqlite
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(text: str) -> str:
+    """Нижний регистр и схлопнутые пробелы — чтобы мелкие отличия не ломали ключ"""
+    return " ".join((text or "").lower().split())
+
+
+class LLMCache:
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: int = LLM_CACHE_TTL,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        """
+        Args:
+            path: путь к файлу SQLite
+            ttl: время жизни записи в секундах (0 — без ограничения)
+            max_entries: максимальное число записей, сверх него вытесняются давно не читавшиеся
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = open_sqlite(path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS llm_cache (
+                       key TEXT PRIMARY KEY,
+                       value TEXT NOT NULL,
+                       created_at REAL NOT NULL,
+                       accessed_at REAL NOT NULL
+                   )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt_version: int, title: str, description: str,
+                 max_title_length: int, max_description_length: int) -> str:
+        """Строит ключ кэша из всего, что влияет на ответ модели"""
+        # model бывает None (провайдер без явной модели) — все части приводим к строке
+        parts = [
+            provider, model, prompt_version,
+            _normalize(title), _normalize(description),
+            max_title_length, max_description_length,
+        ]
+        return hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[str, str, str]]:
+        """Возвращает закэшированный кортеж или None"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row and self.ttl and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                row = None
+
+            if not row:
+                self.misses += 1
+                metrics.CACHE_REQUESTS.inc(cache="llm", result="miss")
+                return None
+
+            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            metrics.CACHE_REQUESTS.inc(cache="llm", result="hit")
+
+        title, description, image_prompt = json.loads(row[0])
+        return title, description, image_prompt
+
+    def put(self, key: str, value: Tuple[str, str, str]):
+        """Сохраняет результат и вытесняет лишние записи (LRU)"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(list(value), ensure_ascii=False), now, now)
+            )
+            if self.max_entries:
+                self._conn.execute(
+                    """DELETE FROM llm_cache WHERE key IN (
+                           SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                       )""",
+                    (self.max_entries,)
+                )
+
+    def stats(self) -> dict:
+        """Счётчики попаданий/промахов и текущий размер кэша"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": size,
+        }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache() -> LLMCache:
+    """Общий для процесса экземпляр кэша"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache()
+            logger.info(f"Кэш LLM: {LLM_CACHE_PATH}")
+    return _default_cache
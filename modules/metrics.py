@@ -0,0 +1,292 @@
+"""
+Модуль: Метрики и трассировка конвейера
+
+Гистограммы задержек стадий и провайдеров, счётчики повторов, токенов LLM,
+попаданий в кэши и размеров изображений. Метрики отдаются в текстовом формате
+Prometheus — файлом (METRICS_FILE) и/или HTTP-эндпоинтом (METRICS_PORT).
+
+Трассировка: каждая новость получает trace id, а стадии внутри неё — спаны.
+Идентификаторы передаются через contextvars, поэтому переживают asyncio.to_thread.
+При TRACING_ENABLED завершённые спаны пишутся строками JSON в TRACE_FILE.
+"""
+import functools
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from config import METRICS_FILE, METRICS_PORT, TRACING_ENABLED, TRACE_FILE
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTES_BUCKETS = (16 * 1024, 64 * 1024, 128 * 1024, 256 * 1024, 512 * 1024,
+                 1024 * 1024, 2 * 1024 * 1024, 5 * 1024 * 1024, 10 * 1024 * 1024)
+
+_registry = []
+
+
+def _label_key(names: Tuple[str, ...], labels: dict) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in names)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = []
+    for name, value in zip(names, values):
+        escaped = value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{escaped}"')
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labels, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labels, labels), 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        # ключ меток -> [счётчики по корзинам (последняя — +Inf), сумма, количество]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labels, labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            else:
+                state[0][-1] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(_label_key(self.labels, labels))
+        return state[2] if state else 0
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    bucket_labels = _format_labels(self.labels, key, 'le="%s"' % le)
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+# === Метрики проекта ===
+STAGE_SECONDS = Histogram("newsbot_stage_duration_seconds",
+                          "Длительность стадий конвейера", ("stage", "status"))
+PROVIDER_SECONDS = Histogram("newsbot_provider_request_duration_seconds",
+                             "Длительность запросов к внешним API", ("provider",))
+RETRIES = Counter("newsbot_retries_total", "Повторные запросы к внешним API", ("service", "reason"))
+LLM_TOKENS = Counter("newsbot_llm_tokens_total", "Токены LLM по данным ответов провайдера", ("provider", "kind"))
+IMAGE_BYTES = Histogram("newsbot_image_bytes", "Размер изображений", ("kind",), buckets=BYTES_BUCKETS)
+CACHE_REQUESTS = Counter("newsbot_cache_requests_total", "Обращения к кэшам", ("cache", "result"))
+POSTS = Counter("newsbot_posts_total", "Результаты публикации постов", ("result",))
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def write_file(path: str = METRICS_FILE):
+    """Атомарно записывает метрики в файл (например, для node_exporter textfile collector)"""
+    if not path:
+        return
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(render())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+_server = None
+
+
+def start_http_server(port: int = METRICS_PORT, host: str = "0.0.0.0"):
+    """Эндпоинт /metrics в фоновом потоке (0 — не запускать)"""
+    global _server
+    if not port or _server is not None:
+        return _server
+
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    _server = ThreadingHTTPServer((host, port), Handler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return _server
+
+
+# === Трассировка ===
+_trace_id: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
+_span_id: ContextVar[Optional[str]] = ContextVar("span_id", default=None)
+_trace_lock = threading.Lock()
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+@contextmanager
+def trace(trace_id: str = None):
+    """Задаёт trace id для всех спанов внутри блока (одна новость — одна трасса)"""
+    trace_id = trace_id or uuid.uuid4().hex[:16]
+    token = _trace_id.set(trace_id)
+    try:
+        yield trace_id
+    finally:
+        _trace_id.reset(token)
+
+
+def _export_span(record: dict):
+    with _trace_lock:
+        directory = os.path.dirname(TRACE_FILE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+class _Span:
+    """Открытый спан; стадия, которая сама ловит свои ошибки, помечает неудачу через fail()"""
+
+    def __init__(self):
+        self.status = "ok"
+
+    def fail(self):
+        self.status = "error"
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Спан стадии: длительность попадает в STAGE_SECONDS, а при TRACING_ENABLED
+    спан с trace id и родителем записывается в TRACE_FILE.
+    Статус "error" — при исключении или после вызова fail() у отданного объекта.
+    """
+    span_id = uuid.uuid4().hex[:16]
+    parent_id = _span_id.get()
+    token = _span_id.set(span_id)
+    started_wall = time.time()
+    started = time.perf_counter()
+    current = _Span()
+    try:
+        yield current
+    except BaseException:
+        current.fail()
+        raise
+    finally:
+        status = current.status
+        duration = time.perf_counter() - started
+        _span_id.reset(token)
+        STAGE_SECONDS.observe(duration, stage=name, status=status)
+        if TRACING_ENABLED:
+            try:
+                _export_span({
+                    "trace_id": _trace_id.get(), "span_id": span_id, "parent_id": parent_id,
+                    "name": name, "start": started_wall, "duration": duration,
+                    "status": status, "attributes": attributes,
+                })
+            except OSError as e:
+                logger.warning(f"Не удалось записать спан: {e}")
+
+
+def traced(name: str, succeeded=bool):
+    """
+    Декоратор: вызов функции — спан с именем name.
+    Стадии конвейера ловят свои ошибки и возвращают None/False, поэтому статус
+    берётся и из результата: succeeded(result) ложно → "error".
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name) as current:
+                result = func(*args, **kwargs)
+                if not succeeded(result):
+                    current.fail()
+                return result
+        return wrapper
+    return decorator
@@ -0,0 +1,109 @@
+"""
+Модуль: Кластеризация почти одинаковых новостей (MinHash + LSH)
+
+Агентства публикуют одну и ту же новость с немного разными заголовками.
+Для каждой новости строится MinHash-подпись по символьным шинглам,
+подписи режутся на полосы (LSH banding), и сравниваются только новости,
+совпавшие хотя бы в одной полосе — без перебора всех пар.
+"""
+import logging
+import random
+import re
+import zlib
+from collections import defaultdict
+
+from config import (
+    NEWS_CLUSTER_THRESHOLD,
+    NEWS_MINHASH_PERMUTATIONS,
+    NEWS_LSH_BANDS,
+)
+
+logger = logging.getLogger(__name__)
+
+_MAX_HASH = (1 << 32) - 1
+_NON_WORD_RE = re.compile(r"[^\w\s]+")
+
+SHINGLE_SIZE = 5
+
+
+def _shingles(news: dict, k: int = SHINGLE_SIZE) -> set:
+    """Множество хэшей символьных k-грамм заголовка и описания"""
+    text = f"{news.get('title') or ''} {news.get('description') or ''}"
+    text = " ".join(_NON_WORD_RE.sub(" ", text.lower()).split())
+    if len(text) <= k:
+        return {zlib.crc32(text.encode("utf-8"))}
+    return {zlib.crc32(text[i:i + k].encode("utf-8")) for i in range(len(text) - k + 1)}
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = NEWS_MINHASH_PERMUTATIONS, seed: int = 1):
+        # Фиксированное зерно — подписи воспроизводимы между запусками
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        # Перестановки — XOR со случайной 32-битной маской: считается в C через map(),
+        # что на порядок быстрее универсального хэширования (a*x + b) mod p на чистом Python
+        self._masks = [rng.randrange(0, _MAX_HASH + 1) for _ in range(num_perm)]
+
+    def signature(self, shingles: set) -> tuple:
+        return tuple(min(map(mask.__xor__, shingles)) for mask in self._masks)
+
+
+def _similarity(sig_a: tuple, sig_b: tuple) -> float:
+    """Оценка сходства Жаккара по доле совпавших позиций подписи"""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+def cluster_news(news_list: list, threshold: float = NEWS_CLUSTER_THRESHOLD,
+                 num_perm: int = NEWS_MINHASH_PERMUTATIONS, bands: int = NEWS_LSH_BANDS) -> list:
+    """
+    Группирует почти одинаковые новости.
+
+    :return: список кластеров (списков новостей) в порядке первого появления
+    """
+    if not news_list:
+        return []
+
+    rows = max(1, num_perm // bands)
+    hasher = MinHasher(num_perm=rows * bands)
+    signatures = [hasher.signature(_shingles(news)) for news in news_list]
+
+    # Union-find по индексам новостей
+    parent = list(range(len(news_list)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for idx, sig in enumerate(signatures):
+            buckets[sig[band * rows:(band + 1) * rows]].append(idx)
+
+        for candidates in buckets.values():
+            if len(candidates) < 2:
+                continue
+            first = candidates[0]
+            for other in candidates[1:]:
+                root_a, root_b = find(first), find(other)
+                if root_a == root_b:
+                    continue
+                if _similarity(signatures[first], signatures[other]) >= threshold:
+                    # Корнем остаётся более ранний индекс — сохраняем порядок выдачи
+                    parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    clusters = defaultdict(list)
+    for idx, news in enumerate(news_list):
+        clusters[find(idx)].append(news)
+
+    result = [clusters[root] for root in sorted(clusters)]
+    if len(result) < len(news_list):
+        logger.info(f"Кластеризация: {len(news_list)} новостей → {len(result)} уникальных событий")
+    return result
+
+
+def pick_representative(cluster: list) -> dict:
+    """Представитель кластера — новость с самым подробным описанием (при равенстве — более ранняя в выдаче)"""
+    _, news = max(enumerate(cluster), key=lambda item: (len(item[1].get("description") or ""), -item[0]))
+    return news
@@ -12,11 +12,31 @@ from config import (
     NEWSAPI_API_KEY,
     NEWSAPI_BASE_URL,
     TIMEOUT,
+    CURRENTS_RATE_LIMIT_RPS,
+    NEWSAPI_RATE_LIMIT_RPS,
+    NEWS_FETCH_QUORUM,
+    NEWS_FETCH_DEADLINE,
+    NEWS_INCREMENTAL,
+    NEWS_PAGE_SIZE,
+    NEWS_MAX_PAGES,
 )
-from time import sleep
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from functools import partial
+from typing import Iterator
+from time import sleep, monotonic
+from modules import http_client, metrics
+from modules.dedup_index import canonicalize_url
+from modules.rate_limiter import RateLimiter, CircuitOpenError, backoff_delay, get_limiter
+from modules.watermarks import get_default_store as get_watermark_store, topic_key
 
 logger = logging.getLogger(__name__)
 
+WATERMARK_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+class PageFetchError(Exception):
+    """Страница постраничной выборки не получена — выборка неполная"""
+
 # === Вспомогательная функция: унифицированный формат новости ===
 def _format_news_item(title, description, url, published, source_name, author=None):
     """Унифицирует формат новости независимо от источника"""
@@ -30,59 +50,131 @@ def _format_news_item(title, description, url, published, source_name, author=No
     }
 
 
-# === Функция: Currents API (остаётся без изменений, но немного улучшена) ===
-def fetch_latest_news_from_currents(keywords: str, language: str = "en", max_retries: int = 3) -> list:
-    start_date = (datetime.utcnow() - timedelta(days=1)).strftime("%Y-%m-%d")
-    logger.info(f"[Currents] Запрашиваем новости с {start_date} по ключевым словам: {keywords}")
+def _published_sort_key(news: dict) -> datetime:
+    """Источники отдают дату в разных форматах — приводим к datetime для сортировки"""
+    value = (news.get("published") or "").strip()
+    for fmt in ("%Y-%m-%dT%H:%M:%SZ", "%Y-%m-%d %H:%M:%S %z", "%Y-%m-%dT%H:%M:%S%z"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+            return parsed.replace(tzinfo=None) - (parsed.utcoffset() or timedelta(0))
+        except ValueError:
+            continue
+    return datetime.min
 
-    params = {
-        "keywords": keywords,
-        "apiKey": CURRENTS_API_KEY,
-        "language": language,
-        "start_date": start_date,
-    }
 
+# === Общий запрос с ограничением частоты, повторами и circuit breaker ===
+def _get_json(label: str, url: str, params: dict, limiter: RateLimiter, max_retries: int):
+    """
+    GET-запрос к новостному API. Возвращает разобранный JSON или None.
+    На 429 ждёт столько, сколько просит сервер (Retry-After), иначе —
+    экспоненциальная пауза с джиттером. Пока выключатель источника разомкнут,
+    запрос не отправляется вовсе.
+    """
+    reason = None
     for attempt in range(1, max_retries + 1):
+        if reason:
+            metrics.RETRIES.inc(service=label.lower(), reason=reason)
         try:
-            response = requests.get(CURRENTS_BASE_URL, params=params, timeout=TIMEOUT)
+            limiter.acquire()
+        except CircuitOpenError as e:
+            logger.error(f"[{label}] {e}")
+            return None
+
+        try:
+            logger.info(f"[{label}] Запрос (попытка {attempt})")
+            with metrics.PROVIDER_SECONDS.time(provider=label.lower()):
+                response = http_client.get(url, params=params, timeout=TIMEOUT)
+            retry_after = limiter.update_from_response(response)
+
             if response.status_code == 200:
-                data = response.json()
-                news = data.get("news", [])
-                formatted_news = [
-                    _format_news_item(
-                        title=n["title"],
-                        description=n.get("description", ""),
-                        url=n["url"],
-                        published=n["published"],
-                        source_name=n["source"],
-                        author=n.get("author"),
-                    )
-                    for n in news
-                ]
-                logger.info(f"[Currents] Успешно получено {len(formatted_news)} новостей.")
-                return formatted_news
+                limiter.record_success()
+                return response.json()
             elif response.status_code == 429:
-                logger.warning(f"[Currents] Слишком много запросов. Пауза {5 * attempt} сек...")
-                sleep(5 * attempt)
+                # Источник жив, просто просит подождать: пробный запрос выключателя завершён
+                limiter.record_success()
+                reason = "rate_limit"
+                if retry_after is None:
+                    delay = backoff_delay(attempt, base=5)
+                    limiter.bucket.pause(delay)
+                    logger.warning(f"[{label}] Лимит запросов превышен. Пауза {delay:.1f} сек...")
+                # Паузу выдержит limiter.acquire() перед следующей попыткой
             elif response.status_code == 401:
-                logger.critical("[Currents] Ошибка авторизации — проверь API-ключ!")
-                return []
+                limiter.record_success()
+                logger.critical(f"[{label}] Ошибка авторизации — проверь API-ключ!")
+                return None
             else:
-                logger.error(f"[Currents] Ошибка {response.status_code}: {response.text}")
+                limiter.record_failure()
+                reason = f"http_{response.status_code}"
+                logger.error(f"[{label}] Ошибка {response.status_code}: {response.text}")
                 if attempt < max_retries:
-                    sleep(5)
+                    sleep(backoff_delay(attempt))
 
         except requests.exceptions.Timeout:
-            logger.warning(f"[Currents] Таймаут (попытка {attempt}). Повтор...")
+            limiter.record_failure()
+            reason = "timeout"
+            logger.warning(f"[{label}] Таймаут (попытка {attempt}). Повтор...")
             if attempt < max_retries:
-                sleep(5)
+                sleep(backoff_delay(attempt))
         except requests.exceptions.RequestException as e:
-            logger.error(f"[Currents] Сетевая ошибка: {e}")
+            limiter.record_failure()
+            reason = "network"
+            logger.error(f"[{label}] Сетевая ошибка: {e}")
             if attempt < max_retries:
-                sleep(5)
+                sleep(backoff_delay(attempt))
+        except Exception:
+            # Любой другой сбой тоже завершает пробный запрос выключателя
+            limiter.record_failure()
+            raise
 
-    logger.critical("[Currents] Не удалось получить данные после всех попыток.")
-    return []
+    logger.critical(f"[{label}] Не удалось получить данные после всех попыток.")
+    return None
+
+
+def _format_currents_item(n: dict) -> dict:
+    return _format_news_item(
+        title=n["title"],
+        description=n.get("description", ""),
+        url=n["url"],
+        published=n["published"],
+        source_name=n["source"],
+        author=n.get("author"),
+    )
+
+
+def _format_newsapi_article(item: dict):
+    """None — если у статьи нет заголовка (NewsAPI помечает удалённые статьи как [Removed])"""
+    if not item["title"] or item["title"] == "[Removed]":
+        return None
+    return _format_news_item(
+        title=item["title"],
+        description=item["description"],
+        url=item["url"],
+        published=item["publishedAt"],
+        source_name=item["source"]["name"],
+        author=item.get("author"),
+    )
+
+
+# === Функция: Currents API (остаётся без изменений, но немного улучшена) ===
+def fetch_latest_news_from_currents(keywords: str, language: str = "en", max_retries: int = 3) -> list:
+    start_date = (datetime.utcnow() - timedelta(days=1)).strftime("%Y-%m-%d")
+    logger.info(f"[Currents] Запрашиваем новости с {start_date} по ключевым словам: {keywords}")
+
+    params = {
+        "keywords": keywords,
+        "apiKey": CURRENTS_API_KEY,
+        "language": language,
+        "start_date": start_date,
+    }
+
+    limiter = get_limiter("Currents", CURRENTS_API_KEY, rate=CURRENTS_RATE_LIMIT_RPS)
+    data = _get_json("Currents", CURRENTS_BASE_URL, params, limiter, max_retries)
+    if data is None:
+        return []
+
+    formatted_news = [_format_currents_item(n) for n in data.get("news", [])]
+    logger.info(f"[Currents] Успешно получено {len(formatted_news)} новостей.")
+    return formatted_news
 
 
 # === Функция: NewsAPI.org ===
@@ -105,54 +197,243 @@ def fetch_latest_news_from_newsapi(keywords: str, language: str = "en", max_retr
         "apiKey": NEWSAPI_API_KEY,
     }
 
-    for attempt in range(1, max_retries + 1):
-        try:
-            logger.info(f"[NewsAPI] Запрос (попытка {attempt})")
-            response = requests.get(NEWSAPI_BASE_URL, params=params, timeout=TIMEOUT)
+    limiter = get_limiter("NewsAPI", NEWSAPI_API_KEY, rate=NEWSAPI_RATE_LIMIT_RPS)
+    data = _get_json("NewsAPI", NEWSAPI_BASE_URL, params, limiter, max_retries)
+    if data is None:
+        return []
 
-            if response.status_code == 200:
-                data = response.json()
-                articles = data.get("articles", [])
-                formatted_news = []
-                for item in articles:
-                    # Пропускаем, если нет заголовка или ссылки
-                    if not item["title"] or item["title"] == "[Removed]":
-                        continue
-                    formatted_news.append(
-                        _format_news_item(
-                            title=item["title"],
-                            description=item["description"],
-                            url=item["url"],
-                            published=item["publishedAt"],
-                            source_name=item["source"]["name"],
-                            author=item.get("author"),
-                        )
-                    )
-                logger.info(f"[NewsAPI] Успешно получено {len(formatted_news)} новостей.")
-                return formatted_news
+    formatted_news = [
+        news for news in map(_format_newsapi_article, data.get("articles", [])) if news
+    ]
+    logger.info(f"[NewsAPI] Успешно получено {len(formatted_news)} новостей.")
+    return formatted_news
 
-            elif response.status_code == 429:
-                logger.warning(f"[NewsAPI] Лимит запросов превышен. Ждём...")
-                sleep(10 * attempt)
-            elif response.status_code == 401:
-                logger.critical("[NewsAPI] Ошибка авторизации — проверь API-ключ!")
-                return []
-            else:
-                logger.error(f"[NewsAPI] Ошибка {response.status_code}: {response.text}")
-                if attempt < max_retries:
-                    sleep(5)
 
-        except requests.exceptions.Timeout:
-            logger.warning(f"[NewsAPI] Таймаут (попытка {attempt}). Повтор...")
-            if attempt < max_retries:
-                sleep(5)
-        except requests.exceptions.RequestException as e:
-            logger.error(f"[NewsAPI] Сетевая ошибка: {e}")
-            if attempt < max_retries:
-                sleep(5)
+# === Инкрементальная загрузка: постраничные генераторы ===
+def iter_news_from_currents(keywords: str, language: str = "en", since: datetime = None,
+                            max_retries: int = 3, page_size: int = NEWS_PAGE_SIZE,
+                            max_pages: int = NEWS_MAX_PAGES) -> Iterator[dict]:
+    """
+    Лениво перебирает страницы Currents API от свежих к старым.
+    Следующая страница запрашивается, только когда потребитель дочитал текущую;
+    перебор прекращается на первой новости не свежее since.
+    Новости с неразборчивой датой пропускаются.
+
+    :raises PageFetchError: страница не получена после всех попыток
+                            или достигнут предел max_pages, а новости не кончились
+    """
+    since = since or datetime.utcnow() - timedelta(days=1)
+    limiter = get_limiter("Currents", CURRENTS_API_KEY, rate=CURRENTS_RATE_LIMIT_RPS)
+
+    for page in range(1, max_pages + 1):
+        params = {
+            "keywords": keywords,
+            "apiKey": CURRENTS_API_KEY,
+            "language": language,
+            "start_date": since.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "page_number": page,
+            "page_size": page_size,
+        }
+        data = _get_json("Currents", CURRENTS_BASE_URL, params, limiter, max_retries)
+        if data is None:
+            raise PageFetchError(f"[Currents] Страница {page} не получена")
+        items = data.get("news", [])
+
+        for n in items:
+            news = _format_currents_item(n)
+            published = _published_sort_key(news)
+            if published == datetime.min:
+                logger.debug(f"[Currents] Пропущена новость без даты: {news.get('title')}")
+                continue
+            if published <= since:
+                return
+            yield news
+
+        if len(items) < page_size:
+            return
+
+    raise PageFetchError(f"[Currents] Достигнут предел в {max_pages} страниц, более старые новости не получены")
+
+
+def iter_news_from_newsapi(keywords: str, language: str = "en", since: datetime = None,
+                           max_retries: int = 3, page_size: int = NEWS_PAGE_SIZE,
+                           max_pages: int = NEWS_MAX_PAGES) -> Iterator[dict]:
+    """
+    Лениво перебирает страницы NewsAPI (sortBy=publishedAt, от свежих к старым).
+    Перебор прекращается на первой новости не свежее since.
+    Новости с неразборчивой датой пропускаются.
+
+    :raises PageFetchError: страница не получена после всех попыток
+                            или достигнут предел max_pages, а новости не кончились
+    """
+    since = since or datetime.utcnow() - timedelta(days=1)
+    limiter = get_limiter("NewsAPI", NEWSAPI_API_KEY, rate=NEWSAPI_RATE_LIMIT_RPS)
+
+    for page in range(1, max_pages + 1):
+        params = {
+            "q": keywords,
+            "language": language,
+            "from": since.strftime("%Y-%m-%dT%H:%M:%S"),
+            "sortBy": "publishedAt",
+            "pageSize": page_size,
+            "page": page,
+            "apiKey": NEWSAPI_API_KEY,
+        }
+        data = _get_json("NewsAPI", NEWSAPI_BASE_URL, params, limiter, max_retries)
+        if data is None:
+            raise PageFetchError(f"[NewsAPI] Страница {page} не получена")
+        articles = data.get("articles", [])
+
+        for item in articles:
+            news = _format_newsapi_article(item)
+            if not news:
+                continue
+            published = _published_sort_key(news)
+            if published == datetime.min:
+                logger.debug(f"[NewsAPI] Пропущена новость без даты: {news.get('title')}")
+                continue
+            if published <= since:
+                return
+            yield news
+
+        if len(articles) < page_size or page * page_size >= data.get("totalResults", 0):
+            return
+
+    raise PageFetchError(f"[NewsAPI] Достигнут предел в {max_pages} страниц, более старые новости не получены")
+
+
+INCREMENTAL_SOURCES = {
+    "currents": iter_news_from_currents,
+    "newsapi": iter_news_from_newsapi,
+}
+
+
+def fetch_new_news(source: str, keywords: str, language: str = "en", max_retries: int = 3) -> list:
+    """
+    Загружает только новости, опубликованные после водяного знака темы.
+
+    Водяной знак здесь не сдвигается: после полной (без ошибок) выборки новости
+    помечаются ключом "watermark_topic", а сдвигает знак вызывающий код через
+    commit_watermarks — когда новости взяты в работу. Неполная выборка (ошибка страницы
+    или упор в NEWS_MAX_PAGES) не помечается, чтобы знак не перешагнул пропущенные страницы.
+    """
+    topic = topic_key(source, keywords, language)
+    watermark = get_watermark_store().get(topic)
+    since = datetime.strptime(watermark, WATERMARK_FORMAT) if watermark else None
 
-    logger.critical("[NewsAPI] Не удалось получить данные после всех попыток.")
-    return []
+    news_list = []
+    complete = True
+    try:
+        for news in INCREMENTAL_SOURCES[source](keywords, language, since=since, max_retries=max_retries):
+            news_list.append(news)
+    except PageFetchError as e:
+        complete = False
+        logger.warning(f"{e} — выборка неполная, водяной знак не сдвигается")
+
+    logger.info(f"[{source}] Новых новостей с {watermark or 'начала окна'}: {len(news_list)}")
+    if complete:
+        for news in news_list:
+            news["watermark_topic"] = topic
+    return news_list
+
+
+def commit_watermarks(fetched: list, pending: list = ()):
+    """
+    Сдвигает водяные знаки тем по выборке, которая взята в работу.
+    Знак доходит до самой свежей новости темы, но остаётся раньше любой новости
+    из pending (не взятой в работу), чтобы она попала в следующую выборку.
+    """
+    newest, limit = {}, {}
+    for news in fetched:
+        topic = news.get("watermark_topic")
+        published = _published_sort_key(news)
+        if topic and published != datetime.min:
+            newest[topic] = max(newest.get(topic, published), published)
+    for news in pending:
+        topic = news.get("watermark_topic")
+        published = _published_sort_key(news)
+        if topic and published != datetime.min:
+            limit[topic] = min(limit.get(topic, published), published - timedelta(seconds=1))
+
+    store = get_watermark_store()
+    for topic, published in newest.items():
+        published = min(published, limit.get(topic, published))
+        current = store.get(topic)
+        if current and datetime.strptime(current, WATERMARK_FORMAT) >= published:
+            continue
+        store.set(topic, published.strftime(WATERMARK_FORMAT))
+
+
+def _source_fetcher(name: str):
+    """Функция загрузки для источника с учётом режима NEWS_INCREMENTAL"""
+    if NEWS_INCREMENTAL:
+        return partial(fetch_new_news, name)
+    return NEWS_SOURCES[name]
+
+
+# === Реестр источников: новые источники достаточно добавить сюда ===
+NEWS_SOURCES = {
+    "currents": fetch_latest_news_from_currents,
+    "newsapi": fetch_latest_news_from_newsapi,
+}
+
+
+def _merge_news(news_list: list) -> list:
+    """Убирает повторы по каноническому URL и сортирует от свежих к старым"""
+    merged = {}
+    for news in news_list:
+        merged.setdefault(canonicalize_url(news["url"]), news)
+    return sorted(merged.values(), key=_published_sort_key, reverse=True)
+
+
+def fetch_latest_news_multi(keywords: str, language: str = "en", max_retries: int = 3,
+                            sources: list = None, quorum: int = NEWS_FETCH_QUORUM,
+                            deadline: float = NEWS_FETCH_DEADLINE) -> list:
+    """
+    Опрашивает несколько источников параллельно и объединяет результаты.
+    Возвращает ответ, как только quorum источников вернули новости или истёк deadline —
+    медленный источник не задерживает остальные. Источник, ответивший ошибкой
+    или пустым списком, в кворум не засчитывается: ждём оставшиеся.
+    """
+    sources = sources or list(NEWS_SOURCES)
+    quorum = min(quorum or len(sources), len(sources))
+
+    executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="news-fetch")
+    futures = {
+        executor.submit(_source_fetcher(name), keywords, language, max_retries): name
+        for name in sources
+    }
+
+    collected = []
+    answered = 0
+    pending = set(futures)
+    deadline_at = monotonic() + deadline
+    try:
+        while pending and answered < quorum:
+            remaining = deadline_at - monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    news = future.result()
+                except Exception as e:
+                    logger.error(f"[{futures[future]}] Ошибка получения новостей: {e}")
+                    continue
+                if news:
+                    answered += 1
+                    collected.extend(news)
+    finally:
+        # Не ждём отстающие источники: их результат будет отброшен
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if pending:
+        late = ", ".join(futures[future] for future in pending)
+        logger.warning(f"Не дождались источников: {late}")
+
+    merged = _merge_news(collected)
+    logger.info(f"Объединено {len(merged)} новостей из {answered} источников")
+    return merged
 
 
 # === Основная функция: выбирает источник ===
@@ -161,14 +442,17 @@ def fetch_latest_news(keywords: str, language: str = "en", max_retries: int = 3)
     Универсальная функция: получает новости с выбранного источника (из config.py)
     Возвращает список в унифицированном формате.
     """
-    if NEWS_SOURCE == "currents":
-        return fetch_latest_news_from_currents(keywords, language, max_retries)
-    elif NEWS_SOURCE == "newsapi":
-        return fetch_latest_news_from_newsapi(keywords, language, max_retries)
-    else:
-        logger.critical(f"Неизвестный источник новостей: {NEWS_SOURCE}")
+    if NEWS_SOURCE in NEWS_SOURCES:
+        return _source_fetcher(NEWS_SOURCE)(keywords, language, max_retries)
+
+    names = list(NEWS_SOURCES) if NEWS_SOURCE == "all" else [n.strip() for n in NEWS_SOURCE.split(",")]
+    unknown = [name for name in names if name not in NEWS_SOURCES]
+    if unknown:
+        logger.critical(f"Неизвестный источник новостей: {', '.join(unknown)}")
         return []
 
+    return fetch_latest_news_multi(keywords, language, max_retries, sources=names)
+
 
 # === Самотестирование ===
 if __name__ == "__main__":
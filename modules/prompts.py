@@ -0,0 +1,150 @@
+"""
+Модуль: Компилятор промптов
+
+Системные промпты собираются один раз на конфигурацию (лимиты длины, режим)
+и дальше отдаются готовыми строками. Неизменные инструкции идут первыми и
+совпадают байт в байт во всех запросах — провайдеры с кэшированием префикса
+(DeepSeek context caching, OpenAI prompt caching) не пересчитывают их заново.
+Всё, что зависит от конфигурации, стоит в конце системного промпта, а текст
+новости — в пользовательском сообщении, обрезанный до бюджета токенов.
+"""
+import json
+import re
+from functools import lru_cache
+from typing import Dict, List
+
+from config import MAX_TITLE_LENGTH, MAX_DESCRIPTION_LENGTH, PROMPT_DESCRIPTION_TOKENS
+
+# Роль, требования и стиль — общий префикс всех режимов
+_INSTRUCTIONS = """Ты - опытный журналист российского информационного агентства.
+Твоя задача - адаптировать зарубежные новости для русскоязычной аудитории.
+
+Создай на основе предоставленной новости:
+1. Заголовок - яркий, информативный, в стиле российских СМИ
+2. Описание - краткое изложение сути новости
+3. Описание для генерации изображения (на английском языке, до 100 символов)
+
+Стиль: официальный, но доступный, без сенсационности.
+Язык заголовка и описания: русский.
+Избегай прямого перевода, адаптируй под российские реалии."""
+
+# Формат ответа по режимам генерации
+_FORMATS = {
+    "single": """Верни ТОЛЬКО JSON в точном формате:
+{
+  "title": "заголовок",
+  "description": "описание",
+  "image_prompt": "подсказка для изображения на английском"
+}""",
+    # В потоковом режиме title и image_prompt идут первыми: по ним стартует генерация изображения
+    "stream": """Верни ТОЛЬКО JSON в точном формате, соблюдая порядок полей:
+{
+  "title": "заголовок",
+  "image_prompt": "подсказка для изображения на английском",
+  "description": "описание"
+}""",
+    # Массив завёрнут в объект: JSON-режим провайдеров допускает только объект верхнего уровня
+    "batch": """Тебе передаётся несколько новостей, у каждой есть номер "id".
+Обработай каждую новость независимо.
+
+Верни ТОЛЬКО JSON-объект с массивом "items", по одному элементу на каждую новость, в точном формате:
+{
+  "items": [
+    {
+      "id": номер новости,
+      "title": "заголовок",
+      "description": "описание",
+      "image_prompt": "подсказка для изображения на английском"
+    }
+  ]
+}""",
+    # Дозапрос полей, которых не оказалось в ответе
+    "fields": """Часть полей поста уже готова, они переданы после новости.
+Верни ТОЛЬКО JSON-объект с перечисленными в запросе недостающими полями:
+"title" - заголовок, "description" - описание, "image_prompt" - подсказка для изображения на английском.""",
+}
+
+_LIMITS = ("Ограничения длины: заголовок — не более {max_title_length} символов, "
+           "описание — не более {max_description_length} символов.")
+
+# Хвост, которым NewsAPI обрезает content/description: "… [+1234 chars]"
+_TRUNCATION_MARKER = re.compile(r"\s*\[\+\d+ chars\]\s*$")
+_WHITESPACE = re.compile(r"\s+")
+_SENTENCE_END = re.compile(r"[.!?…](?=\s|$)")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Быстрая оценка числа токенов без токенизатора: ~4 байта UTF-8 на токен.
+    Для английского это ~4 символа, для кириллицы (2 байта на букву) ~2 символа —
+    близко к BPE-словарям OpenAI/DeepSeek/YandexGPT.
+    """
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def trim_to_budget(text: str, max_tokens: int) -> str:
+    """
+    Нормализует пробелы и обрезает текст до бюджета токенов —
+    по концу предложения, если он есть во второй половине, иначе по слову.
+    """
+    text = _WHITESPACE.sub(" ", _TRUNCATION_MARKER.sub("", text or "")).strip()
+    if max_tokens <= 0 or estimate_tokens(text) <= max_tokens:
+        return text
+
+    # 3 байта оставляем под многоточие
+    cut = text.encode("utf-8")[:max_tokens * 4 - 3].decode("utf-8", errors="ignore")
+    sentence_ends = [match.end() for match in _SENTENCE_END.finditer(cut)]
+    if sentence_ends and sentence_ends[-1] > len(cut) // 2:
+        return cut[:sentence_ends[-1]]
+
+    space = cut.rfind(" ")
+    if space > 0:
+        cut = cut[:space]
+    return cut.rstrip(" ,;:-") + "…"
+
+
+class PromptCompiler:
+    """Готовые системные промпты и сборка пользовательских сообщений для одной конфигурации"""
+
+    def __init__(self, max_title_length: int, max_description_length: int, description_tokens: int):
+        self.description_tokens = description_tokens
+        limits = _LIMITS.format(max_title_length=max_title_length,
+                                max_description_length=max_description_length)
+        self._system: Dict[str, str] = {
+            mode: f"{_INSTRUCTIONS}\n\n{response_format}\n\n{limits}"
+            for mode, response_format in _FORMATS.items()
+        }
+
+    def system_prompt(self, mode: str = "single") -> str:
+        return self._system[mode]
+
+    def user_prompt(self, news_data: Dict) -> str:
+        title = _WHITESPACE.sub(" ", news_data.get('title') or '').strip()
+        description = trim_to_budget(news_data.get('description') or '', self.description_tokens)
+        return f"""Оригинальный заголовок: {title}
+Оригинальное описание: {description}"""
+
+    def missing_fields_prompt(self, news_data: Dict, ready: Dict[str, str], missing: List[str]) -> str:
+        """Пользовательское сообщение для дозапроса: новость, готовые поля и список недостающих"""
+        ready_fields = json.dumps(ready, ensure_ascii=False)
+        return f"""{self.user_prompt(news_data)}
+
+Готовые поля: {ready_fields}
+Недостающие поля: {", ".join(missing)}"""
+
+    def batch_user_prompt(self, news_items: List[Dict]) -> str:
+        return "\n\n".join(
+            f"id: {position}\n{self.user_prompt(news_data)}"
+            for position, news_data in enumerate(news_items)
+        )
+
+
+@lru_cache(maxsize=16)
+def get_compiler(max_title_length: int = None, max_description_length: int = None,
+                 description_tokens: int = None) -> PromptCompiler:
+    """Компилятор для конфигурации; собирается один раз и переиспользуется"""
+    return PromptCompiler(
+        max_title_length or MAX_TITLE_LENGTH,
+        max_description_length or MAX_DESCRIPTION_LENGTH,
+        PROMPT_DESCRIPTION_TOKENS if description_tokens is None else description_tokens,
+    )
@@ -0,0 +1,296 @@
+"""
+Модуль: Адаптивное ограничение частоты запросов и автоматический выключатель (circuit breaker)
+
+Один экземпляр RateLimiter на API-ключ, общий для всех потоков процесса.
+Корзина токенов подстраивается под заголовки ответа (Retry-After, X-RateLimit-*),
+а выключатель после серии сбоев на время перестаёт пропускать запросы к источнику.
+
+Новостные API ходят через get_limiter в news_fetcher, DeepSeek, YandexGPT и Stability.ai —
+через send_with_retries. OpenAI SDK сам повторяет запросы с учётом Retry-After.
+Очередь Telegram держит собственные корзины (лимиты на бота и на чат), но паузы
+и разбор Retry-After берёт отсюда.
+"""
+import hashlib
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+import requests
+
+from config import (
+    RATE_LIMIT_DEFAULT_RPS,
+    RATE_LIMIT_BURST,
+    CIRCUIT_BREAKER_THRESHOLD,
+    CIRCUIT_BREAKER_RESET,
+)
+from modules import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Источник считается недоступным — запрос не отправляется"""
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """Retry-After бывает числом секунд или HTTP-датой"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Экспоненциальная задержка с полным джиттером (attempt начинается с 1)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        """
+        Args:
+            rate: пополнение, токенов в секунду
+            capacity: максимальный запас (допустимая пачка запросов)
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Блокирует поток, пока не появится токен (и не истечёт пауза от сервера)"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Не выдавать токены ближайшие seconds секунд"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0
+
+    def adjust_rate(self, rate: float):
+        """Подстраивает скорость под квоту сервера, не превышая настроенный максимум"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(0.01, min(self.max_rate, rate))
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = CIRCUIT_BREAKER_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_BREAKER_RESET):
+        """
+        Args:
+            failure_threshold: число сбоев подряд, после которого выключатель размыкается
+            reset_timeout: через сколько секунд пропустить пробный запрос;
+                           столько же ждём исхода пробного запроса, потом пропускаем следующий
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.OPEN:
+                if now - self._opened_at < self.reset_timeout:
+                    return False
+                # Пропускаем один пробный запрос
+                self.state = self.HALF_OPEN
+                self._trial_started = now
+                return True
+            if self.state == self.HALF_OPEN:
+                # Пробный запрос уже в полёте. Если его исход так и не записан
+                # (поток упал, исключение не дошло до record_*), пропускаем новый пробный
+                if now - self._trial_started < self.reset_timeout:
+                    return False
+                self._trial_started = now
+                return True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class RateLimiter:
+    def __init__(self, name: str, rate: float = RATE_LIMIT_DEFAULT_RPS, burst: int = RATE_LIMIT_BURST,
+                 failure_threshold: int = CIRCUIT_BREAKER_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_BREAKER_RESET):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+    def acquire(self):
+        """
+        Ждёт разрешения на запрос.
+
+        :raises CircuitOpenError: если источник сейчас считается недоступным
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.name}: источник временно отключён после серии ошибок")
+        self.bucket.acquire()
+
+    def update_from_response(self, response) -> Optional[float]:
+        """
+        Учитывает заголовки ответа: Retry-After и X-RateLimit-Remaining/Reset.
+
+        :return: пауза из Retry-After (секунды), если сервер её указал
+        """
+        headers = response.headers
+        retry_after = parse_retry_after(headers.get("Retry-After"))
+        if retry_after is not None and response.status_code in (429, 503):
+            logger.warning(f"[{self.name}] Сервер просит подождать {retry_after:.0f} сек")
+            self.bucket.pause(retry_after)
+            return retry_after
+
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return None
+        try:
+            remaining = int(remaining)
+            reset = float(reset)
+        except ValueError:
+            return None
+
+        # Reset бывает как unix-временем, так и числом секунд до сброса
+        seconds = reset - time.time() if reset > 1e9 else reset
+        if seconds <= 0:
+            return None
+        if remaining <= 0:
+            self.bucket.pause(seconds)
+        else:
+            # Равномерно распределяем оставшуюся квоту до сброса окна
+            self.bucket.adjust_rate(remaining / seconds)
+        return None
+
+    def record_success(self):
+        self.breaker.record_success()
+
+    def record_failure(self):
+        self.breaker.record_failure()
+        if self.breaker.state == CircuitBreaker.OPEN:
+            logger.error(f"[{self.name}] Выключатель разомкнут на {self.breaker.reset_timeout:.0f} сек")
+
+
+def send_with_retries(limiter: RateLimiter, service: str, send: Callable[[], requests.Response],
+                      max_retries: int = 3) -> Optional[requests.Response]:
+    """
+    Отправляет платный POST-запрос (LLM, генерация изображений) через ограничитель.
+
+    Повторяются только запросы, которые сервер точно не выполнил: 429 (пауза по
+    Retry-After), 5xx и ошибки соединения — экспоненциальная пауза с джиттером.
+    Таймаут чтения не повторяется: запрос мог быть выполнен и оплачен.
+
+    :param send: отправляет запрос и возвращает ответ (может быть stream=True)
+    :return: ответ (в том числе с ошибкой, которую повтор не исправит) или None,
+             если источник отключён выключателем или попытки исчерпаны
+    :raises requests.exceptions.RequestException: сбой, после которого повтор небезопасен
+    """
+    for attempt in range(1, max_retries + 1):
+        try:
+            limiter.acquire()
+        except CircuitOpenError as e:
+            logger.error(str(e))
+            return None
+
+        try:
+            response = send()
+        except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+            limiter.record_failure()
+            reason, delay = "network", backoff_delay(attempt)
+            logger.warning(f"[{limiter.name}] Ошибка соединения (попытка {attempt}): {e}")
+        except Exception:
+            # Пробный запрос выключателя должен получить исход при любом сбое
+            limiter.record_failure()
+            raise
+        else:
+            retry_after = limiter.update_from_response(response)
+            if response.status_code == 429:
+                # Сервер жив и просит подождать — паузу выдержит limiter.acquire()
+                limiter.record_success()
+                reason, delay = "rate_limit", 0
+                if retry_after is None:
+                    limiter.bucket.pause(backoff_delay(attempt, base=5))
+            elif response.status_code >= 500:
+                limiter.record_failure()
+                reason, delay = f"http_{response.status_code}", backoff_delay(attempt)
+            else:
+                limiter.record_success()
+                return response
+
+            if attempt == max_retries:
+                return response
+            response.close()
+            logger.warning(f"[{limiter.name}] Ответ {response.status_code} (попытка {attempt}), повтор")
+
+        if attempt < max_retries:
+            metrics.RETRIES.inc(service=service, reason=reason)
+            time.sleep(delay)
+
+    logger.error(f"[{limiter.name}] Не удалось выполнить запрос после {max_retries} попыток")
+    return None
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str, api_key: str = None, **kwargs) -> RateLimiter:
+    """
+    Общий для процесса ограничитель.
+    Лимиты у API обычно привязаны к ключу, поэтому ключ входит в идентификатор
+    (в виде хэша — чтобы не светить его в логах).
+    """
+    key = name
+    if api_key:
+        key = f"{name}:{hashlib.sha1(api_key.encode('utf-8')).hexdigest()[:8]}"
+
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(name, **kwargs)
+            _limiters[key] = limiter
+    return limiter
@@ -0,0 +1,23 @@
+"""
+Модуль: Общие помощники для локальных SQLite-хранилищ (кэши, индексы, очереди)
+"""
+import os
+import sqlite3
+
+
+def open_sqlite(path: str) -> sqlite3.Connection:
+    """
+    Открывает базу SQLite, создавая каталог при необходимости.
+
+    Соединение разрешено использовать из нескольких потоков —
+    вызывающий код сам сериализует доступ через threading.Lock.
+    WAL позволяет читать, пока другой процесс пишет.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
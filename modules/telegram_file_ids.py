@@ -0,0 +1,99 @@
+"""
+Модуль: Кэш file_id Telegram для уже загруженных изображений
+
+После первой загрузки Telegram возвращает file_id, по которому тот же файл
+можно отправить повторно без multipart-загрузки — в другой канал или при
+перепубликации. Ключ — SHA-256 содержимого изображения. Если Telegram
+отверг file_id, запись удаляется и изображение загружается заново.
+"""
+import hashlib
+import logging
+import threading
+import time
+from typing import Optional
+
+from config import TELEGRAM_FILE_ID_CACHE_PATH, TELEGRAM_FILE_ID_TTL_DAYS
+from modules import metrics
+from modules.storage import open_sqlite
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class FileIdCache:
+    def __init__(self, path: str = TELEGRAM_FILE_ID_CACHE_PATH, ttl_days: int = TELEGRAM_FILE_ID_TTL_DAYS):
+        """
+        Args:
+            path: путь к файлу SQLite
+            ttl_days: сколько дней доверять file_id (0 — бессрочно)
+        """
+        self.ttl = ttl_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = open_sqlite(path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS file_ids (
+                       content_hash TEXT PRIMARY KEY,
+                       file_id TEXT NOT NULL,
+                       created_at REAL NOT NULL
+                   )"""
+            )
+            if self.ttl:
+                removed = self._conn.execute(
+                    "DELETE FROM file_ids WHERE created_at < ?", (time.time() - self.ttl,)
+                ).rowcount
+                if removed:
+                    logger.info(f"Из кэша file_id удалено устаревших записей: {removed}")
+
+    def get(self, digest: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_id, created_at FROM file_ids WHERE content_hash = ?", (digest,)
+            ).fetchone()
+
+        if row is None or (self.ttl and time.time() - row[1] > self.ttl):
+            self.misses += 1
+            metrics.CACHE_REQUESTS.inc(cache="telegram_file_id", result="miss")
+            return None
+        self.hits += 1
+        metrics.CACHE_REQUESTS.inc(cache="telegram_file_id", result="hit")
+        return row[0]
+
+    def put(self, digest: str, file_id: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_ids (content_hash, file_id, created_at) VALUES (?, ?, ?)",
+                (digest, file_id, time.time())
+            )
+
+    def invalidate(self, digest: str):
+        """Удаляет file_id, который Telegram больше не принимает"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM file_ids WHERE content_hash = ?", (digest,))
+        logger.info(f"file_id для изображения {digest[:12]} признан недействительным")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache() -> FileIdCache:
+    """Общий для процесса экземпляр кэша"""
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = FileIdCache()
+    return _default_cache
@@ -0,0 +1,365 @@
+"""
+Модуль: Очередь отправки сообщений в Telegram
+
+Все публикации проходят через одну очередь, которая соблюдает лимиты Bot API:
+общий на бота (сообщений в секунду) и отдельный на каждый чат (сообщений в минуту).
+Ответ 429 не считается ошибкой: отправка повторяется через parameters.retry_after.
+Несколько постов с изображениями можно отправить одним альбомом (sendMediaGroup).
+Уже загруженные изображения отправляются по file_id, без повторной загрузки.
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, NamedTuple, Optional
+
+import requests
+
+from config import (
+    TELEGRAM_API_BASE,
+    TELEGRAM_GLOBAL_RPS,
+    TELEGRAM_CHAT_PER_MINUTE,
+    TELEGRAM_MAX_RETRIES,
+    TELEGRAM_OUTBOX_WORKERS,
+    TELEGRAM_FILE_ID_CACHE_ENABLED,
+    IMAGE_OUTPUT_FORMAT,
+    TIMEOUT,
+)
+from modules import http_client, metrics
+from modules.rate_limiter import TokenBucket, backoff_delay, parse_retry_after
+from modules.telegram_file_ids import content_hash, get_default_cache
+
+logger = logging.getLogger(__name__)
+
+# Telegram принимает в альбоме от 2 до 10 элементов
+MEDIA_GROUP_MAX = 10
+
+
+class OutgoingPost(NamedTuple):
+    chat_id: str
+    text: str
+    image_bytes: Optional[bytes] = None
+    image_url: Optional[str] = None
+    image_path: Optional[str] = None
+
+    @property
+    def has_image(self) -> bool:
+        return bool(self.image_bytes or self.image_url or self.image_path)
+
+
+class TelegramError(Exception):
+    """Telegram отклонил запрос, повтор не поможет"""
+
+    def __init__(self, message: str, status_code: int = None, description: str = ""):
+        super().__init__(message)
+        self.status_code = status_code
+        self.description = description or ""
+
+    @property
+    def bad_file(self) -> bool:
+        """400 из-за самого файла (отозванный или чужой file_id), а не подписи или разметки"""
+        return self.status_code == 400 and "file" in self.description.lower()
+
+
+def photo_filename() -> str:
+    """Telegram определяет тип загружаемого файла по расширению имени"""
+    extension = {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}.get(IMAGE_OUTPUT_FORMAT, "jpg")
+    return f"photo.{extension}"
+
+
+def _read_image(post: OutgoingPost) -> Optional[bytes]:
+    """Байты загружаемого изображения (файл читается один раз — на случай повторов)"""
+    if post.image_bytes:
+        return post.image_bytes
+    if post.image_path:
+        with open(post.image_path, "rb") as f:
+            return f.read()
+    return None
+
+
+def _photo_file_id(message: dict) -> Optional[str]:
+    """file_id самого большого варианта фото из отправленного сообщения"""
+    sizes = (message or {}).get("photo") or []
+    return sizes[-1].get("file_id") if sizes else None
+
+
+class TelegramOutbox:
+    def __init__(self, api_base: str = TELEGRAM_API_BASE, global_rps: float = TELEGRAM_GLOBAL_RPS,
+                 chat_per_minute: float = TELEGRAM_CHAT_PER_MINUTE, max_retries: int = TELEGRAM_MAX_RETRIES,
+                 workers: int = TELEGRAM_OUTBOX_WORKERS, use_file_ids: bool = TELEGRAM_FILE_ID_CACHE_ENABLED):
+        """
+        Args:
+            api_base: https://api.telegram.org/bot<token>
+            global_rps: лимит сообщений в секунду на бота
+            chat_per_minute: лимит сообщений в минуту в один чат
+            max_retries: повторы после 429, 5xx и ошибок соединения
+            workers: потоки отправки (1 — сообщения уходят строго в порядке постановки)
+            use_file_ids: отправлять уже загруженные изображения по file_id
+        """
+        self.api_base = api_base
+        self.max_retries = max_retries
+        self.chat_per_minute = chat_per_minute
+        self._global_bucket = TokenBucket(global_rps, max(1, int(global_rps)))
+        self._chat_buckets = {}
+        self._buckets_lock = threading.Lock()
+        self.file_ids = get_default_cache() if use_file_ids else None
+
+        self._queue = queue.Queue()
+        self._threads = []
+        for index in range(max(1, workers)):
+            thread = threading.Thread(target=self._worker, name=f"telegram-outbox-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        with self._buckets_lock:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                # Запас в одно сообщение: не больше одного сообщения в чат за интервал
+                bucket = TokenBucket(self.chat_per_minute / 60, 1)
+                self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    # === Постановка в очередь ===
+
+    def submit(self, post: OutgoingPost) -> Future:
+        """Ставит пост в очередь; Future завершится True/False по результату отправки"""
+        future = Future()
+        self._queue.put(([post], [future]))
+        return future
+
+    def submit_group(self, posts: List[OutgoingPost]) -> List[Future]:
+        """
+        Ставит в очередь связанные посты: идущие подряд посты с изображениями в один чат
+        объединяются в альбомы до MEDIA_GROUP_MAX, остальные уходят по одному.
+        Future возвращаются в порядке постов.
+        """
+        futures = [Future() for _ in posts]
+        run = []
+
+        def flush():
+            if run:
+                self._queue.put(([post for post, _ in run], [future for _, future in run]))
+                run.clear()
+
+        # Порядок сохраняется: альбом собирается из идущих подряд постов с изображениями
+        for post, future in zip(posts, futures):
+            if not post.has_image:
+                flush()
+                self._queue.put(([post], [future]))
+                continue
+            if run and (run[0][0].chat_id != post.chat_id or len(run) == MEDIA_GROUP_MAX):
+                flush()
+            run.append((post, future))
+        flush()
+        return futures
+
+    def publish(self, post: OutgoingPost) -> bool:
+        """Синхронная отправка через очередь"""
+        return self.submit(post).result()
+
+    def publish_group(self, posts: List[OutgoingPost]) -> List[bool]:
+        return [future.result() for future in self.submit_group(posts)]
+
+    # === Отправка ===
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+
+            posts, futures = item
+            try:
+                if len(posts) > 1:
+                    self._send_media_group(posts)
+                else:
+                    self._send_post(posts[0])
+                ok = True
+            except Exception as e:
+                logger.error(f"Ошибка при публикации: {e}")
+                ok = False
+
+            for future in futures:
+                future.set_result(ok)
+            self._queue.task_done()
+
+    def _call(self, method: str, chat_id: str, data: dict, files: dict = None, messages: int = 1) -> dict:
+        """
+        Вызывает метод Bot API с учётом лимитов.
+        429 — ждём parameters.retry_after, 5xx и ошибки соединения — экспоненциальная пауза.
+        Методы отправки не идемпотентны: если запрос ушёл, а ответ не дождались
+        (таймаут чтения, обрыв после отправки), повтор продублирует пост — такие
+        сбои не повторяем.
+
+        :raises TelegramError: запрос отклонён или попытки исчерпаны
+        """
+        url = f"{self.api_base}/{method}"
+        chat_bucket = self._chat_bucket(chat_id)
+
+        for attempt in range(1, self.max_retries + 2):
+            # Альбом считается Telegram как несколько сообщений
+            for _ in range(messages):
+                chat_bucket.acquire()
+                self._global_bucket.acquire()
+
+            try:
+                with metrics.PROVIDER_SECONDS.time(provider="telegram"):
+                    response = http_client.post(url, data=data, files=files, timeout=TIMEOUT)
+            except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+                # Соединение не установлено — запрос до Telegram не дошёл, повтор безопасен
+                error = f"ошибка соединения: {e}"
+                reason = "network"
+                delay = backoff_delay(attempt)
+            except requests.exceptions.RequestException as e:
+                # Запрос мог быть доставлен (например, ReadTimeout) — не рискуем дублем
+                raise TelegramError(f"{method}: результат неизвестен, повтор не выполняется: {e}")
+            else:
+                try:
+                    payload = response.json()
+                except ValueError:
+                    payload = {}
+
+                if response.status_code == 200 and payload.get("ok", True):
+                    return payload
+
+                error = f"{response.status_code} — {response.text}"
+                reason = "rate_limit" if response.status_code == 429 else f"http_{response.status_code}"
+                if response.status_code == 429:
+                    delay = (payload.get("parameters") or {}).get("retry_after")
+                    if delay is None:
+                        delay = parse_retry_after(response.headers.get("Retry-After"))
+                    delay = float(delay if delay is not None else backoff_delay(attempt))
+                    # Флуд-лимит Telegram считается на бота: притормаживаем отправки во все чаты,
+                    # иначе потоки других чатов продолжат получать 429
+                    self._global_bucket.pause(delay)
+                    chat_bucket.pause(delay)
+                    delay = 0
+                elif response.status_code >= 500:
+                    delay = backoff_delay(attempt)
+                else:
+                    raise TelegramError(error, response.status_code, payload.get("description"))
+
+            if attempt > self.max_retries:
+                break
+            metrics.RETRIES.inc(service="telegram", reason=reason)
+            logger.warning(f"Telegram {method}: {error}; повтор {attempt}/{self.max_retries}")
+            if delay:
+                time.sleep(delay)
+
+        raise TelegramError(f"{method}: попытки исчерпаны, последняя ошибка: {error}")
+
+    def _cached_file_id(self, image: bytes):
+        """(хэш содержимого, file_id или None); без кэша — (None, None)"""
+        if not self.file_ids:
+            return None, None
+        digest = content_hash(image)
+        return digest, self.file_ids.get(digest)
+
+    def _remember(self, digest: Optional[str], message: dict):
+        file_id = _photo_file_id(message)
+        if digest and file_id:
+            self.file_ids.put(digest, file_id)
+
+    def _send_post(self, post: OutgoingPost):
+        image = _read_image(post)
+        if image:
+            data = {"chat_id": post.chat_id, "caption": post.text, "parse_mode": "HTML"}
+            digest, file_id = self._cached_file_id(image)
+            if file_id:
+                try:
+                    self._call("sendPhoto", post.chat_id, {**data, "photo": file_id})
+                    logger.info("Пост успешно опубликован в Telegram (изображение по file_id).")
+                    return
+                except TelegramError as e:
+                    # Ошибки подписи и разметки file_id не касаются — кэш не трогаем
+                    if not e.bad_file:
+                        raise
+                    # file_id отозван или от другого бота — загружаем файл заново
+                    self.file_ids.invalidate(digest)
+
+            payload = self._call("sendPhoto", post.chat_id, data, files={"photo": (photo_filename(), image)})
+            self._remember(digest, payload.get("result"))
+        elif post.image_url:
+            data = {"chat_id": post.chat_id, "photo": post.image_url, "caption": post.text, "parse_mode": "HTML"}
+            self._call("sendPhoto", post.chat_id, data)
+        else:
+            data = {
+                "chat_id": post.chat_id,
+                "text": post.text,
+                "parse_mode": "HTML",
+                "disable_web_page_preview": "false"
+            }
+            self._call("sendMessage", post.chat_id, data)
+        logger.info("Пост успешно опубликован в Telegram.")
+
+    def _send_media_group(self, posts: List[OutgoingPost]):
+        """Один альбом: у каждого изображения своя подпись"""
+        images = [_read_image(post) for post in posts]
+        cached = [self._cached_file_id(image) if image else (None, None) for image in images]
+
+        chat_id = posts[0].chat_id
+        try:
+            payload = self._call_media_group(chat_id, posts, images, cached)
+        except TelegramError as e:
+            used = [digest for digest, file_id in cached if file_id]
+            if not e.bad_file or not used:
+                raise
+            # Какой именно file_id отвергнут, Telegram не сообщает — сбрасываем все и загружаем заново
+            for digest in used:
+                self.file_ids.invalidate(digest)
+            cached = [(digest, None) for digest, _ in cached]
+            payload = self._call_media_group(chat_id, posts, images, cached)
+
+        for (digest, file_id), message in zip(cached, payload.get("result") or []):
+            if not file_id:
+                self._remember(digest, message)
+        logger.info(f"Альбом из {len(posts)} постов опубликован в Telegram.")
+
+    def _call_media_group(self, chat_id: str, posts: List[OutgoingPost], images: list, cached: list) -> dict:
+        media, files = [], {}
+        for index, (post, image, (_, file_id)) in enumerate(zip(posts, images, cached)):
+            if file_id:
+                source = file_id
+            elif image:
+                name = f"photo{index}"
+                files[name] = (photo_filename().replace("photo", name), image)
+                source = f"attach://{name}"
+            else:
+                source = post.image_url
+            media.append({"type": "photo", "media": source, "caption": post.text, "parse_mode": "HTML"})
+
+        data = {"chat_id": chat_id, "media": json.dumps(media, ensure_ascii=False)}
+        return self._call("sendMediaGroup", chat_id, data, files=files or None, messages=len(posts))
+
+    def close(self, wait: bool = True):
+        """Дожидается отправки поставленных сообщений и останавливает потоки"""
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+_default_outbox = None
+_default_lock = threading.Lock()
+
+
+def get_default_outbox() -> TelegramOutbox:
+    """Общая для процесса очередь: лимиты Telegram действуют на бота целиком"""
+    global _default_outbox
+    with _default_lock:
+        if _default_outbox is None:
+            _default_outbox = TelegramOutbox()
+    return _default_outbox
+
+
+def shutdown():
+    global _default_outbox
+    with _default_lock:
+        outbox, _default_outbox = _default_outbox, None
+    if outbox is not None:
+        outbox.close()
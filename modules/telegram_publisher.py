@@ -1,71 +1,60 @@
 """
 Модуль: Публикация поста в Telegram канал
 """
+import io
 import os
-import requests
 import logging
-from config import TELEGRAM_API_URL, TELEGRAM_CHANNEL_ID, TELEGRAM_BOT_TOKEN, TIMEOUT
+from typing import List, Tuple, Union
+from config import TELEGRAM_CHANNEL_ID
+from modules.telegram_outbox import OutgoingPost, get_default_outbox
 
 logger = logging.getLogger(__name__)
 
 
-def publish_to_telegram(title: str, body: str, image_path: str = None, image_url: str = None) -> bool:
+def _make_post(title: str, body: str, image_path: str = None, image_url: str = None,
+               image_bytes: Union[bytes, io.BytesIO] = None) -> OutgoingPost:
+    message = f"{title}\n\n{body}"
+    if isinstance(image_bytes, io.BytesIO):
+        image_bytes = image_bytes.getvalue()
+    if image_path and not os.path.exists(image_path):
+        image_path = None
+    return OutgoingPost(TELEGRAM_CHANNEL_ID, message, image_bytes=image_bytes or None,
+                        image_url=image_url, image_path=image_path)
+
+
+def publish_to_telegram(title: str, body: str, image_path: str = None, image_url: str = None,
+                        image_bytes: Union[bytes, io.BytesIO] = None) -> bool:
     """
-    Публикует пост в Telegram.
+    Публикует пост в Telegram через общую очередь отправки
+    (лимиты Bot API и повторы после 429 — в modules/telegram_outbox.py).
 
     :param title: заголовок
     :param body: текст поста
     :param image_path: путь к локальному файлу изображения
     :param image_url: URL изображения (опционально)
+    :param image_bytes: изображение в памяти (bytes или BytesIO) — без записи на диск
     :return: True при успехе
     """
     try:
-        message = f"{title}\n\n{body}"
-
-        # Если есть локальное изображение
-        if image_path and os.path.exists(image_path):
-            url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto"
-
-            with open(image_path, 'rb') as photo:
-                files = {'photo': photo}
-                data = {
-                    "chat_id": TELEGRAM_CHANNEL_ID,
-                    "caption": message,
-                    "parse_mode": "HTML"
-                }
-                response = requests.post(url, data=data, files=files, timeout=TIMEOUT)
-
-        # Если есть URL изображения
-        elif image_url:
-            url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendPhoto"
-            data = {
-                "chat_id": TELEGRAM_CHANNEL_ID,
-                "photo": image_url,
-                "caption": message,
-                "parse_mode": "HTML"
-            }
-            response = requests.post(url, data=data, timeout=TIMEOUT)
+        post = _make_post(title, body, image_path, image_url, image_bytes)
+        return get_default_outbox().publish(post)
+    except Exception as e:
+        logger.error(f"Ошибка при публикации: {e}")
+        return False
 
-        # Только текст
-        else:
-            data = {
-                "chat_id": TELEGRAM_CHANNEL_ID,
-                "text": message,
-                "parse_mode": "HTML",
-                "disable_web_page_preview": "false"
-            }
-            response = requests.post(TELEGRAM_API_URL, data=data, timeout=TIMEOUT)
 
-        if response.status_code == 200:
-            logger.info("Пост успешно опубликован в Telegram.")
-            return True
-        else:
-            logger.error(f"Ошибка публикации: {response.status_code} — {response.text}")
-            return False
+def publish_group_to_telegram(posts: List[Tuple[str, str, bytes]]) -> List[bool]:
+    """
+    Публикует связанные посты (заголовок, текст, изображение) одним или несколькими альбомами.
 
+    :return: результат для каждого поста в исходном порядке
+    """
+    try:
+        outgoing = [_make_post(title, body, image_bytes=image_bytes) for title, body, image_bytes in posts]
+        return get_default_outbox().publish_group(outgoing)
     except Exception as e:
-        logger.error(f"Ошибка при публикации: {e}")
-        return False
+        logger.error(f"Ошибка при публикации альбома: {e}")
+        return [False] * len(posts)
 
 
 # === Самотестирование ===
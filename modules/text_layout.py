@@ -0,0 +1,151 @@
+"""
+Модуль: Реестр шрифтов и раскладка текста для наложения на изображения
+
+Каждый шрифт каждого размера загружается один раз на процесс,
+ширины слов и готовые раскладки кэшируются — при пакетной отрисовке
+одинаковые заголовки и слова не измеряются повторно.
+"""
+import logging
+from functools import lru_cache
+from typing import NamedTuple, Tuple
+
+from config import (
+    OVERLAY_FONT_PATH,
+    OVERLAY_FONT_MAX_SIZE,
+    OVERLAY_FONT_MIN_SIZE,
+    OVERLAY_MAX_LINES,
+)
+
+logger = logging.getLogger(__name__)
+
+# Шрифты с кириллицей в порядке предпочтения (Windows, Linux, macOS)
+FONT_CANDIDATES = (
+    "arial.ttf",
+    "DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    "/Library/Fonts/Arial.ttf",
+    "/System/Library/Fonts/Supplemental/Arial.ttf",
+)
+
+ELLIPSIS = "…"
+
+
+class TextLayout(NamedTuple):
+    size: int
+    lines: Tuple[str, ...]
+    line_height: int
+    width: int
+
+    @property
+    def height(self) -> int:
+        return self.line_height * len(self.lines)
+
+
+@lru_cache(maxsize=None)
+def _font_path() -> str:
+    """Первый доступный шрифт из списка кандидатов ("" — встроенный шрифт PIL)"""
+    from PIL import ImageFont
+
+    candidates = (OVERLAY_FONT_PATH,) + FONT_CANDIDATES if OVERLAY_FONT_PATH else FONT_CANDIDATES
+    for path in candidates:
+        try:
+            ImageFont.truetype(path, 12)
+            logger.info(f"Шрифт для наложения текста: {path}")
+            return path
+        except OSError:
+            continue
+
+    logger.warning("Не найден TTF-шрифт с кириллицей — используется встроенный шрифт PIL (задайте OVERLAY_FONT_PATH)")
+    return ""
+
+
+@lru_cache(maxsize=64)
+def get_font(size: int):
+    """Шрифт заданного размера; загружается один раз на процесс (load_default(size) — Pillow 10.1+)"""
+    from PIL import ImageFont
+
+    path = _font_path()
+    if path:
+        return ImageFont.truetype(path, size)
+    return ImageFont.load_default(size=size)
+
+
+@lru_cache(maxsize=64)
+def _line_height(size: int) -> int:
+    ascent, descent = get_font(size).getmetrics()
+    return int((ascent + descent) * 1.15)
+
+
+@lru_cache(maxsize=8192)
+def text_width(text: str, size: int) -> float:
+    """Ширина строки в пикселях; слова заголовков часто повторяются, поэтому кэшируем"""
+    return get_font(size).getlength(text)
+
+
+def _wrap(words: Tuple[str, ...], size: int, max_width: int) -> list:
+    """Жадный перенос по словам; слишком длинное слово режется по символам"""
+    space = text_width(" ", size)
+    lines, current, current_width = [], [], 0.0
+
+    for word in words:
+        width = text_width(word, size)
+        if width > max_width:
+            # Длинное слово: дописываем по символам
+            if current:
+                lines.append(" ".join(current))
+                current, current_width = [], 0.0
+            chunk = ""
+            for char in word:
+                if text_width(chunk + char, size) > max_width and chunk:
+                    lines.append(chunk)
+                    chunk = ""
+                chunk += char
+            current, current_width = [chunk], text_width(chunk, size)
+            continue
+
+        needed = width if not current else current_width + space + width
+        if needed <= max_width:
+            current.append(word)
+            current_width = needed
+        else:
+            lines.append(" ".join(current))
+            current, current_width = [word], width
+
+    if current:
+        lines.append(" ".join(current))
+    return lines
+
+
+def _truncate(line: str, size: int, max_width: int) -> str:
+    """Обрезает строку с многоточием, чтобы она влезла по ширине"""
+    while line and text_width(line + ELLIPSIS, size) > max_width:
+        line = line[:-1].rstrip()
+    return line + ELLIPSIS
+
+
+@lru_cache(maxsize=1024)
+def layout_text(text: str, max_width: int, max_lines: int = OVERLAY_MAX_LINES,
+                max_size: int = OVERLAY_FONT_MAX_SIZE, min_size: int = OVERLAY_FONT_MIN_SIZE) -> TextLayout:
+    """
+    Подбирает наибольший размер шрифта, при котором текст помещается
+    в max_lines строк шириной max_width. Если не помещается и при min_size —
+    лишнее обрезается многоточием.
+    """
+    words = tuple(text.split())
+    if not words:
+        return TextLayout(min_size, (), _line_height(min_size), 0)
+
+    size = max_size
+    while True:
+        lines = _wrap(words, size, max_width)
+        if len(lines) <= max_lines or size <= min_size:
+            break
+        size = max(min_size, size - 2)
+
+    if len(lines) > max_lines:
+        lines = lines[:max_lines - 1] + [_truncate(lines[max_lines - 1], size, max_width)]
+
+    width = int(max(text_width(line, size) for line in lines))
+    return TextLayout(size, tuple(lines), _line_height(size), width)
@@ -0,0 +1,57 @@
+"""
+Модуль: Водяные знаки инкрементальной загрузки новостей
+
+Для каждой темы (источник + язык + ключевые слова) хранится время
+публикации самой свежей уже загруженной новости. Следующий запрос
+начинается с этого момента и не скачивает заново то, что уже видели.
+"""
+import threading
+import time
+from typing import Optional
+
+from config import WATERMARK_PATH
+from modules.storage import open_sqlite
+
+
+def topic_key(source: str, keywords: str, language: str) -> str:
+    return f"{source}|{language}|{' '.join(keywords.lower().split())}"
+
+
+class WatermarkStore:
+    def __init__(self, path: str = WATERMARK_PATH):
+        self._lock = threading.Lock()
+        self._conn = open_sqlite(path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS watermarks (
+                       topic TEXT PRIMARY KEY,
+                       published_at TEXT NOT NULL,
+                       updated_at REAL NOT NULL
+                   )"""
+            )
+
+    def get(self, topic: str) -> Optional[str]:
+        """Время последней загруженной новости в ISO 8601 (UTC) или None"""
+        with self._lock:
+            row = self._conn.execute("SELECT published_at FROM watermarks WHERE topic = ?", (topic,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, topic: str, published_at: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO watermarks (topic, published_at, updated_at) VALUES (?, ?, ?)",
+                (topic, published_at, time.time())
+            )
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+
+def get_default_store() -> WatermarkStore:
+    """Общий для процесса экземпляр хранилища"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            _default_store = WatermarkStore()
+    return _default_store
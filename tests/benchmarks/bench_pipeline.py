@@ -0,0 +1,91 @@
+"""
+Драйвер бенчмарка: прогоняет циклы main.run_cycle и печатает замеры в JSON.
+
+Запускается в отдельном процессе (config.py читает окружение при импорте),
+все внешние API должны указывать на заглушки — см. stub_servers.StubServer.env().
+
+    python tests/benchmarks/bench_pipeline.py <число циклов>
+
+Последняя строка вывода — JSON: задержки стадий, длительность цикла,
+число опубликованных постов и пропускная способность.
+"""
+import json
+import logging
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, PROJECT_ROOT)
+
+import main  # noqa: E402
+from modules import news_fetcher, telegram_outbox  # noqa: E402
+
+# Стадии конвейера: (модуль, имя функции, имя в отчёте)
+STAGES = (
+    (news_fetcher, "fetch_latest_news", "fetch"),
+    (main, "_generate_text", "text"),
+    (main, "_generate_text_stream", "text"),
+    (main, "_generate_text_batch", "text_batch"),
+    (main, "_generate_image", "image"),
+    (main, "_publish", "publish"),
+    (main, "_publish_group", "publish_group"),
+)
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def summarize(values: list) -> dict:
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+    }
+
+
+def _timed(func, samples: list):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - started)
+    return wrapper
+
+
+def run(cycles: int) -> dict:
+    timings = {}
+    for module, name, label in STAGES:
+        samples = timings.setdefault(label, [])
+        setattr(module, name, _timed(getattr(module, name), samples))
+
+    # Генераторы создаются один раз, как в режиме демона
+    content_generator = main.ContentGenerator()
+    image_generator = main._create_image_generator()
+
+    cycle_times, published = [], 0
+    started = time.perf_counter()
+    for _ in range(cycles):
+        cycle_started = time.perf_counter()
+        published += main.run_cycle(content_generator=content_generator, image_generator=image_generator)
+        cycle_times.append(time.perf_counter() - cycle_started)
+    elapsed = time.perf_counter() - started
+    telegram_outbox.shutdown()
+
+    return {
+        "stages": {label: summarize(samples) for label, samples in timings.items() if samples},
+        "cycle": summarize(cycle_times),
+        "published": published,
+        "elapsed": elapsed,
+        "throughput": published / elapsed if elapsed else 0.0,
+    }
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.WARNING)
+    result = run(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
+    print(json.dumps(result))
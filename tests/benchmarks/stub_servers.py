@@ -0,0 +1,331 @@
+"""
+Локальные заглушки внешних API для офлайн-бенчмарков.
+
+Один HTTP-сервер в отдельном потоке изображает все сервисы, с которыми работает бот:
+NewsAPI, Currents, DeepSeek/OpenAI (chat/completions), YandexGPT, Stability.ai и Telegram Bot API.
+Сервис определяется первым сегментом пути (/newsapi/..., /stability/... и т.д.),
+а env() возвращает переменные окружения, направляющие config.py на заглушку.
+
+Для каждого сервиса можно задать задержку ответа и внедрение ошибок:
+каждый N-й запрос получает заданный HTTP-статус (429 — с указанием паузы).
+"""
+import base64
+import io
+import itertools
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, NamedTuple, Optional
+
+SERVICES = ("newsapi", "currents", "deepseek", "openai", "yandex", "stability", "telegram")
+
+# Слова для заголовков: случайные наборы почти не пересекаются, поэтому
+# кластеризация не склеивает разные заглушечные новости в одну
+_WORDS = (
+    "parliament summit border treaty harbor drought election pipeline satellite vaccine "
+    "refinery tariff embargo ceasefire protest monsoon currency reactor airline glacier "
+    "startup merger lawsuit stadium festival museum railway bridge wildfire earthquake "
+    "senate budget pension subsidy export import drone frigate outbreak harvest "
+    "copper lithium bond auction census verdict strike rally orbit telescope"
+).split()
+
+
+class Fault(NamedTuple):
+    status: int
+    every: int  # каждый every-й запрос к сервису завершается ошибкой
+
+
+class StubServer:
+    def __init__(self, latency: Dict[str, float] = None, faults: Dict[str, Fault] = None,
+                 news_per_page: int = 20, seed: int = 0):
+        """
+        Args:
+            latency: задержка ответа в секундах по сервисам ("*" — для всех остальных)
+            faults: внедряемые ошибки по сервисам
+            news_per_page: сколько новостей отдаёт каждый запрос к новостным API
+            seed: зерно генератора заголовков (воспроизводимые прогоны)
+        """
+        self.latency = latency or {}
+        self.faults = faults or {}
+        self.news_per_page = news_per_page
+        self.requests = {service: 0 for service in SERVICES}
+        self._rng = random.Random(seed)
+        self._story_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._png_cache = {}
+        self._server = None
+        self._thread = None
+
+    # === Жизненный цикл ===
+
+    def start(self) -> "StubServer":
+        stub = self
+
+        class Handler(_StubHandler):
+            server_stub = stub
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Переменные окружения, направляющие все клиенты проекта на заглушку"""
+        return {
+            "NEWSAPI_BASE_URL": f"{self.url}/newsapi/v2/everything",
+            "CURRENTS_BASE_URL": f"{self.url}/currents/v1/search",
+            "DEEPSEEK_BASE_URL": f"{self.url}/deepseek/v1",
+            "OPENAI_BASE_URL": f"{self.url}/openai/v1",
+            "YANDEX_GPT_URL": f"{self.url}/yandex/foundationModels/v1/completion",
+            "STABILITY_BASE_URL": f"{self.url}/stability/v1",
+            "TELEGRAM_API_ROOT": f"{self.url}/telegram",
+            "NEWSAPI_API_KEY": "stub",
+            "CURRENTS_API_KEY": "stub",
+            "DEEPSEEK_API_KEY": "stub",
+            "OPENAI_API_KEY": "stub",
+            "YANDEX_GPT_API_KEY": "stub",
+            "YANDEX_FOLDER_ID": "stub",
+            "STABILITY_API_KEY": "stub",
+            "TELEGRAM_BOT_TOKEN": "stub",
+            "TELEGRAM_CHANNEL_ID": "@stub",
+        }
+
+    # === Поведение сервисов ===
+
+    def _admit(self, service: str) -> Optional[Fault]:
+        """Учитывает запрос, выдерживает задержку и решает, не ответить ли ошибкой"""
+        with self._lock:
+            self.requests[service] += 1
+            count = self.requests[service]
+
+        delay = self.latency.get(service, self.latency.get("*", 0.0))
+        if delay:
+            time.sleep(delay)
+
+        fault = self.faults.get(service)
+        if fault and fault.every and count % fault.every == 0:
+            return fault
+        return None
+
+    def make_story(self) -> dict:
+        with self._lock:
+            story_id = next(self._story_ids)
+            words = self._rng.sample(_WORDS, 7)
+        return {
+            "id": story_id,
+            "title": f"{' '.join(words).capitalize()} {story_id}",
+            "description": f"Stub description for story {story_id}: {' '.join(reversed(words))}.",
+            "url": f"https://stub.example/news/{story_id}",
+        }
+
+    def png(self, width: int, height: int) -> bytes:
+        with self._lock:
+            data = self._png_cache.get((width, height))
+        if data is None:
+            from PIL import Image
+
+            buffer = io.BytesIO()
+            Image.new("RGB", (width, height), (40, 70, 110)).save(buffer, "PNG")
+            data = buffer.getvalue()
+            with self._lock:
+                self._png_cache[(width, height)] = data
+        return data
+
+    def file_id(self) -> str:
+        with self._lock:
+            return f"stub-file-{next(self._file_ids)}"
+
+
+def _llm_answer(system_prompt: str, user_prompt: str) -> str:
+    """Ответ модели по формату, который просит промпт: объект или массив с id"""
+    if "id: " in user_prompt:
+        ids = [line.split(":", 1)[1].strip() for line in user_prompt.splitlines() if line.startswith("id: ")]
+        return json.dumps([
+            {"id": int(i), "title": f"Заголовок {i}", "description": f"Описание новости {i}.",
+             "image_prompt": f"news illustration {i}"}
+            for i in ids
+        ], ensure_ascii=False)
+
+    title = user_prompt.splitlines()[0].split(":", 1)[-1].strip()[:60]
+    return json.dumps({
+        "title": f"Заголовок: {title}",
+        "image_prompt": "news illustration",
+        "description": "Краткое описание новости для бенчмарка.",
+    }, ensure_ascii=False)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server_stub: StubServer = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    # === Ответы ===
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, payload, status: int = 200, headers: dict = None):
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                   "application/json; charset=utf-8", headers)
+
+    def _fault(self, service: str, fault: Fault):
+        if fault.status == 429:
+            # Пауза 0 секунд: проверяется логика повтора, а не время ожидания
+            if service == "telegram":
+                self._json({"ok": False, "error_code": 429, "description": "Too Many Requests",
+                            "parameters": {"retry_after": 0}}, 429)
+            else:
+                self._json({"error": "rate limited"}, 429, {"Retry-After": "0"})
+        else:
+            self._json({"ok": False, "error": "injected fault"}, fault.status)
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    # === Маршрутизация ===
+
+    def do_GET(self):
+        self._dispatch(b"")
+
+    def do_POST(self):
+        self._dispatch(self._body())
+
+    def _dispatch(self, body: bytes):
+        stub = self.server_stub
+        path = self.path.split("?", 1)[0]
+        service = path.strip("/").split("/", 1)[0]
+        if service not in SERVICES:
+            self._json({"error": "unknown service"}, 404)
+            return
+
+        fault = stub._admit(service)
+        if fault:
+            self._fault(service, fault)
+            return
+
+        getattr(self, f"_handle_{service}")(path, body)
+
+    def _handle_newsapi(self, path: str, body: bytes):
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        articles = []
+        for _ in range(self.server_stub.news_per_page):
+            story = self.server_stub.make_story()
+            articles.append({
+                "title": story["title"], "description": story["description"], "url": story["url"],
+                "publishedAt": now, "source": {"name": "Stub"}, "author": "stub",
+            })
+        # totalResults равен размеру страницы — инкрементальная загрузка не листает дальше
+        self._json({"status": "ok", "totalResults": len(articles), "articles": articles})
+
+    def _handle_currents(self, path: str, body: bytes):
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S +0000")
+        news = []
+        for _ in range(self.server_stub.news_per_page):
+            story = self.server_stub.make_story()
+            news.append({
+                "title": story["title"], "description": story["description"], "url": story["url"],
+                "published": now, "source": "Stub", "author": "stub",
+            })
+        self._json({"status": "ok", "news": news})
+
+    def _chat_completion(self, body: bytes):
+        request = json.loads(body or b"{}")
+        messages = {m.get("role"): m.get("content") or m.get("text") or "" for m in request.get("messages", [])}
+        answer = _llm_answer(messages.get("system", ""), messages.get("user", ""))
+        return request, answer
+
+    def _handle_deepseek(self, path: str, body: bytes):
+        request, answer = self._chat_completion(body)
+        if not request.get("stream"):
+            self._json({"choices": [{"index": 0, "message": {"role": "assistant", "content": answer},
+                                     "finish_reason": "stop"}]})
+            return
+
+        # Server-sent events: ответ кусками по 16 символов
+        events = []
+        for start in range(0, len(answer), 16):
+            chunk = {"choices": [{"index": 0, "delta": {"content": answer[start:start + 16]}}]}
+            events.append(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+        events.append("data: [DONE]\n\n")
+        self._send(200, "".join(events).encode("utf-8"), "text/event-stream")
+
+    def _handle_openai(self, path: str, body: bytes):
+        request, answer = self._chat_completion(body)
+        self._json({
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer},
+                         "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        })
+
+    def _handle_yandex(self, path: str, body: bytes):
+        request, answer = self._chat_completion(body)
+
+        def line(text):
+            return json.dumps({"result": {"alternatives": [{"message": {"role": "assistant", "text": text},
+                                                            "status": "ALTERNATIVE_STATUS_FINAL"}]}},
+                              ensure_ascii=False)
+
+        if not request.get("completionOptions", {}).get("stream"):
+            self._send(200, line(answer).encode("utf-8"), "application/json; charset=utf-8")
+            return
+
+        # Каждая строка потока содержит весь текст на текущий момент
+        lines = [line(answer[:end]) for end in range(32, len(answer), 32)] + [line(answer)]
+        self._send(200, "\n".join(lines).encode("utf-8"), "application/json; charset=utf-8")
+
+    def _handle_stability(self, path: str, body: bytes):
+        request = json.loads(body or b"{}")
+        png = self.server_stub.png(int(request.get("width", 512)), int(request.get("height", 512)))
+        if "image/png" in (self.headers.get("Accept") or ""):
+            self._send(200, png, "image/png")
+        else:
+            self._json({"artifacts": [{"base64": base64.b64encode(png).decode("ascii"),
+                                       "finishReason": "SUCCESS", "seed": 0}]})
+
+    def _handle_telegram(self, path: str, body: bytes):
+        method = path.rsplit("/", 1)[-1]
+
+        def photo_message():
+            file_id = self.server_stub.file_id()
+            return {"message_id": 1, "photo": [{"file_id": f"{file_id}-s"}, {"file_id": file_id}]}
+
+        if method == "sendPhoto":
+            self._json({"ok": True, "result": photo_message()})
+        elif method == "sendMediaGroup":
+            count = max(1, body.count(b'"type": "photo"'))
+            self._json({"ok": True, "result": [photo_message() for _ in range(count)]})
+        else:
+            self._json({"ok": True, "result": {"message_id": 1}})
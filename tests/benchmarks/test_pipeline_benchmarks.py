@@ -0,0 +1,147 @@
+"""
+Офлайн-бенчмарки конвейера: все внешние API заменены локальными заглушками
+с заданной задержкой и внедрёнными ошибками. Замеры сравниваются с baselines.json.
+
+В обычном прогоне pytest бенчмарки пропускаются.
+Запуск: python -m pytest tests/benchmarks -m benchmark -q -s
+Переменные окружения:
+    BENCH_RUN               1 — запускать бенчмарки без -m benchmark
+    BENCH_TOLERANCE         допустимое ухудшение относительно базовой линии (0.5 = +50%)
+    BENCH_UPDATE_BASELINES  1 — перезаписать baselines.json текущими замерами
+                            (без него файл не меняется никогда)
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+from stub_servers import Fault, StubServer
+
+pytestmark = pytest.mark.benchmark
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(os.path.dirname(BENCH_DIR))
+BASELINES_PATH = os.path.join(BENCH_DIR, "baselines.json")
+BENCH_TOLERANCE = float(os.getenv("BENCH_TOLERANCE", 0.5))
+BENCH_UPDATE_BASELINES = os.getenv("BENCH_UPDATE_BASELINES") == "1"
+# Абсолютный запас на шум планировщика для коротких стадий (секунды)
+ABSOLUTE_SLACK = 0.05
+
+# Задержки заглушек — порядок величин реальных API, уменьшенный в ~10 раз
+LATENCY = {"newsapi": 0.05, "currents": 0.05, "deepseek": 0.15, "yandex": 0.15,
+           "stability": 0.2, "telegram": 0.03}
+
+# Окружение, общее для всех сценариев: только заглушки, без кэшей результатов
+# (иначе повторные прогоны мерили бы кэш) и без лимита Telegram на чат
+BASE_ENV = {
+    "AI_PROVIDER": "deepseek",
+    "NEWS_SOURCE": "newsapi",
+    "LLM_CACHE_ENABLED": "false",
+    "IMAGE_CACHE_ENABLED": "false",
+    "TELEGRAM_FILE_ID_CACHE_ENABLED": "false",
+    "TELEGRAM_CHAT_PER_MINUTE": "60000",
+    "LLM_HEDGE_ENABLED": "false",
+    "SAVE_GENERATED_IMAGES": "false",
+}
+
+SCENARIOS = {
+    "sequential": {
+        "env": {"PIPELINE_MODE": "sequential"},
+        "cycles": 3, "posts_per_cycle": 1,
+    },
+    "async": {
+        "env": {"PIPELINE_MODE": "async", "PIPELINE_MAX_NEWS": "4", "NEWS_SOURCE": "all"},
+        "cycles": 2, "posts_per_cycle": 4,
+    },
+    "async_streaming": {
+        "env": {"PIPELINE_MODE": "async", "PIPELINE_MAX_NEWS": "4", "LLM_STREAMING": "true"},
+        "cycles": 2, "posts_per_cycle": 4,
+    },
+    "async_batch_album": {
+        "env": {"PIPELINE_MODE": "async", "PIPELINE_MAX_NEWS": "4", "LLM_BATCH_SIZE": "4",
+                "TELEGRAM_MEDIA_GROUP": "true"},
+        "cycles": 2, "posts_per_cycle": 4,
+    },
+    "yandex": {
+        "env": {"PIPELINE_MODE": "async", "PIPELINE_MAX_NEWS": "4", "AI_PROVIDER": "yandex"},
+        "cycles": 2, "posts_per_cycle": 4,
+    },
+    # Ошибки: 429 от NewsAPI и Telegram повторяются, 500 от Stability — пост уходит без картинки
+    # (без повторов Stability: пауза с джиттером сделала бы замер случайным)
+    "faults": {
+        "env": {"PIPELINE_MODE": "async", "PIPELINE_MAX_NEWS": "4", "STABILITY_MAX_RETRIES": "1"},
+        "faults": {"newsapi": Fault(429, 2), "telegram": Fault(429, 3), "stability": Fault(500, 4)},
+        "cycles": 2, "posts_per_cycle": 4,
+    },
+}
+
+
+def _load_baselines() -> dict:
+    if not os.path.exists(BASELINES_PATH):
+        return {}
+    with open(BASELINES_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_baseline(name: str, result: dict):
+    baselines = _load_baselines()
+    baselines[name] = {
+        "cycle_p50": round(result["cycle"]["p50"], 4),
+        "throughput": round(result["throughput"], 4),
+        "stages": {label: round(stats["p50"], 4) for label, stats in sorted(result["stages"].items())},
+    }
+    with open(BASELINES_PATH, "w", encoding="utf-8") as f:
+        json.dump(baselines, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def _run_scenario(scenario: dict, stub: StubServer) -> dict:
+    with tempfile.TemporaryDirectory() as cache_dir:
+        env = {**os.environ, **BASE_ENV, **stub.env(), **scenario["env"], "CACHE_DIR": cache_dir}
+        result = subprocess.run(
+            [sys.executable, os.path.join(BENCH_DIR, "bench_pipeline.py"), str(scenario["cycles"])],
+            cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, timeout=300,
+        )
+    assert result.returncode == 0, result.stderr[-2000:]
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _report(name: str, result: dict):
+    print(f"\n[{name}] циклов: {result['cycle']['count']}, опубликовано: {result['published']}, "
+          f"цикл p50 {result['cycle']['p50'] * 1000:.0f} мс, {result['throughput']:.2f} постов/с")
+    for label, stats in sorted(result["stages"].items()):
+        print(f"    {label:<14} n={stats['count']:<3} p50 {stats['p50'] * 1000:7.1f} мс  "
+              f"p95 {stats['p95'] * 1000:7.1f} мс")
+
+
+@pytest.mark.parametrize("name", list(SCENARIOS))
+def test_pipeline_benchmark(name):
+    scenario = SCENARIOS[name]
+    with StubServer(latency=LATENCY, faults=scenario.get("faults")) as stub:
+        result = _run_scenario(scenario, stub)
+    _report(name, result)
+
+    # Корректность: заглушки отвечают всегда, поэтому опубликовано должно быть всё
+    assert result["published"] == scenario["cycles"] * scenario["posts_per_cycle"]
+    assert stub.requests["telegram"] >= 1
+
+    if BENCH_UPDATE_BASELINES:
+        _save_baseline(name, result)
+        return
+    baseline = _load_baselines().get(name)
+    if baseline is None:
+        pytest.skip(f"Нет базовой линии для '{name}': запишите её с BENCH_UPDATE_BASELINES=1")
+
+    factor = 1 + BENCH_TOLERANCE
+    assert result["cycle"]["p50"] <= baseline["cycle_p50"] * factor + ABSOLUTE_SLACK, \
+        f"Цикл медленнее базовой линии: {result['cycle']['p50']:.3f} > {baseline['cycle_p50']:.3f} с"
+    assert result["throughput"] * factor >= baseline["throughput"], \
+        f"Пропускная способность ниже базовой: {result['throughput']:.2f} < {baseline['throughput']:.2f} постов/с"
+    for label, p50 in baseline["stages"].items():
+        if label in result["stages"]:
+            measured = result["stages"][label]["p50"]
+            assert measured <= p50 * factor + ABSOLUTE_SLACK, \
+                f"Стадия '{label}' медленнее базовой линии: {measured:.3f} > {p50:.3f} с"
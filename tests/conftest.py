@@ -0,0 +1,23 @@
+"""Общие настройки тестов: модули проекта импортируются из корня репозитория"""
+import os
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: замеры скорости конвейера (запуск: -m benchmark или BENCH_RUN=1)")
+
+
+def pytest_collection_modifyitems(config, items):
+    # Бенчмарки долгие и зависят от нагрузки машины — в обычном прогоне не запускаются
+    if os.getenv("BENCH_RUN") == "1" or "benchmark" in (config.getoption("markexpr") or ""):
+        return
+    skip = pytest.mark.skip(reason="бенчмарк: запуск с -m benchmark или BENCH_RUN=1")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
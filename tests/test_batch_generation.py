@@ -0,0 +1,89 @@
+"""
+Пакетная генерация: несколько новостей уходят одним запросом, элементы сопоставляются
+по id, а неразобранные новости догенерируются по одной.
+"""
+import json
+
+from modules.content_generator import ContentGenerator
+
+NEWS = [{"title": f"Новость {index}", "description": f"Описание {index}"} for index in range(3)]
+
+
+def _item(index: int) -> dict:
+    return {"id": index, "title": f"T{index}", "description": f"D{index}", "image_prompt": f"P{index}"}
+
+
+class _Cache:
+    def __init__(self, stored=None):
+        self.stored = dict(stored or {})
+
+    def get(self, key):
+        return self.stored.get(key)
+
+    def put(self, key, value):
+        self.stored[key] = value
+
+
+def _generator(monkeypatch, answer: str):
+    generator = ContentGenerator(use_cache=False, ai_provider="deepseek", hedge=False)
+    requests = []
+
+    def complete(system_prompt, user_prompt, max_tokens=1000):
+        requests.append(user_prompt)
+        return answer
+
+    singles = []
+
+    def generate_post_content(news_data, max_title_length=None, max_description_length=None,
+                              bypass_cache=False):
+        singles.append(news_data)
+        return "single", news_data["title"], ""
+
+    monkeypatch.setattr(generator, "_complete", complete)
+    monkeypatch.setattr(generator, "generate_post_content", generate_post_content)
+    return generator, requests, singles
+
+
+def test_batch_items_are_matched_by_id(monkeypatch):
+    # Модель вернула элементы не по порядку
+    answer = json.dumps({"items": [_item(2), _item(0), _item(1)]})
+    generator, requests, singles = _generator(monkeypatch, answer)
+
+    assert generator.generate_posts_batch(NEWS, batch_size=3) == [
+        ("T0", "D0", "P0"), ("T1", "D1", "P1"), ("T2", "D2", "P2"),
+    ]
+    assert len(requests) == 1
+    assert singles == []
+
+
+def test_unparsed_items_fall_back_to_single_requests(monkeypatch):
+    broken = {"id": 1, "title": "", "description": ""}
+    answer = json.dumps({"items": [_item(0), broken, {"id": 7, "title": "чужой"}]})
+    generator, _, singles = _generator(monkeypatch, answer)
+    monkeypatch.setattr(generator, "_complete_missing_fields", lambda news, fields, *limits: fields)
+
+    results = generator.generate_posts_batch(NEWS, batch_size=3)
+
+    assert results[0] == ("T0", "D0", "P0")
+    assert singles == [NEWS[1], NEWS[2]]
+    assert results[1] == ("single", NEWS[1]["title"], "")
+
+
+def test_bare_array_answer_is_accepted(monkeypatch):
+    generator, _, singles = _generator(monkeypatch, json.dumps([_item(0), _item(1)]))
+
+    assert generator.generate_posts_batch(NEWS[:2], batch_size=2) == [("T0", "D0", "P0"), ("T1", "D1", "P1")]
+    assert singles == []
+
+
+def test_cached_news_are_not_sent(monkeypatch):
+    generator, requests, singles = _generator(monkeypatch, json.dumps({"items": [_item(0), _item(1)]}))
+    generator.cache = _Cache()
+    generator.cache.put(generator._cache_key(NEWS[0], 100, 500), ("cached", "c", "p"))
+
+    results = generator.generate_posts_batch(NEWS, batch_size=3, max_title_length=100, max_description_length=500)
+
+    assert results[0] == ("cached", "c", "p")
+    assert results[1:] == [("T0", "D0", "P0"), ("T1", "D1", "P1")]
+    assert len(requests) == 1 and NEWS[0]["title"] not in requests[0]
+    assert singles == []
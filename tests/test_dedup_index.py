@@ -0,0 +1,23 @@
+"""
+Индекс опубликованных: prune() забывает устаревшие новости и в базе, и в памяти.
+"""
+from modules import dedup_index
+from modules.dedup_index import PublishedIndex
+
+OLD = {"title": "Старая новость", "url": "https://example.com/old"}
+FRESH = {"title": "Свежая новость", "url": "https://example.com/fresh"}
+
+
+def test_prune_forgets_expired_news(tmp_path, monkeypatch):
+    index = PublishedIndex(str(tmp_path / "published.sqlite3"), retention_days=1)
+    now = dedup_index.time.time()
+
+    monkeypatch.setattr(dedup_index.time, "time", lambda: now - 2 * 86400)
+    index.mark(OLD)
+    monkeypatch.setattr(dedup_index.time, "time", lambda: now)
+    index.mark(FRESH)
+
+    assert index.prune() == 1
+    assert not index.is_known(OLD)
+    assert index.is_known(FRESH)
+    assert index.filter_new([OLD, FRESH]) == [OLD]
@@ -0,0 +1,73 @@
+"""
+Хеджирование LLM: основной запрос, проигравший хедж, тоже попадает в выборку
+задержек, иначе перцентиль сползает вниз и хеджируется почти каждый запрос.
+"""
+import threading
+
+from modules import content_generator
+from modules.content_generator import ContentGenerator
+
+
+def _generator(provider: str) -> ContentGenerator:
+    return ContentGenerator(use_cache=False, ai_provider=provider, hedge=False)
+
+
+def test_cancelled_primary_latency_is_recorded(monkeypatch):
+    primary = _generator("deepseek")
+    primary.hedge_generator = _generator("yandex")
+    monkeypatch.setattr(primary, "_hedge_delay", lambda: 0.05)
+
+    released = threading.Event()
+
+    def slow_primary(system_prompt, user_prompt, cancel_event=None):
+        cancel_event.wait(5)
+        released.set()
+        return None
+
+    monkeypatch.setattr(primary, "_request_post_json", slow_primary)
+    monkeypatch.setattr(primary.hedge_generator, "_request_post_json",
+                        lambda system_prompt, user_prompt, cancel_event=None: {"title": "t"})
+
+    assert primary._request_post_json_hedged("system", "user") == ({"title": "t"}, "yandex")
+    assert released.wait(5)
+    assert len(primary._latencies) == 1
+    assert primary._latencies[0] >= 0.05
+
+
+class _Cache:
+    def __init__(self):
+        self.stored = {}
+
+    def get(self, key):
+        return None
+
+    def put(self, key, value):
+        self.stored[key] = value
+
+
+def test_backup_provider_answer_is_not_cached(monkeypatch):
+    primary = _generator("deepseek")
+    primary.hedge_generator = _generator("yandex")
+    primary.cache = _Cache()
+    answer = {"title": "t", "description": "d", "image_prompt": "p"}
+    monkeypatch.setattr(primary, "_request_post_json_hedged", lambda system, user: (answer, "yandex"))
+
+    assert primary.generate_post_content({"title": "news", "description": "text"}) == ("t", "d", "p")
+    assert primary.cache.stored == {}
+
+    monkeypatch.setattr(primary, "_request_post_json_hedged", lambda system, user: (answer, "deepseek"))
+    primary.generate_post_content({"title": "news", "description": "text"})
+    assert len(primary.cache.stored) == 1
+
+
+def test_hedged_stream_uses_short_timeout(monkeypatch):
+    generator = _generator("deepseek")
+    timeouts = []
+
+    def stream(system_prompt, user_prompt, max_tokens=1000, timeout=60):
+        timeouts.append(timeout)
+        return iter(['{"title": "t"}'])
+
+    monkeypatch.setattr(generator, "_stream", stream)
+    assert generator._request_post_json("system", "user", threading.Event()) == {"title": "t"}
+    assert timeouts == [content_generator.LLM_HEDGE_TIMEOUT]
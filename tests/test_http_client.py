@@ -0,0 +1,50 @@
+"""
+Пулы соединений: httpx-клиент OpenAI берёт размер пула из тех же настроек,
+что и сессии requests, а недоступный HTTP/2 не остаётся незамеченным.
+"""
+import logging
+
+import pytest
+
+from modules import http_client
+
+httpx = pytest.importorskip("httpx")
+
+
+@pytest.fixture(autouse=True)
+def fresh_clients(monkeypatch):
+    monkeypatch.setattr(http_client, "_httpx_client", None)
+    monkeypatch.setattr(http_client, "_sessions", {})
+    monkeypatch.setattr(http_client, "_pool_limits", http_client._parse_pool_limits("api.example.com=3"))
+    yield
+    http_client.close_all()
+
+
+def _pool_size(client) -> int:
+    return client._transport._pool._max_connections
+
+
+def test_httpx_pool_uses_host_limit():
+    assert _pool_size(http_client.get_httpx_client("https://api.example.com/v1")) == 3
+
+
+def test_requests_pool_uses_host_limit():
+    adapter = http_client.get_session("https://api.example.com/v1").get_adapter("https://api.example.com/v1")
+    assert adapter._pool_maxsize == 3
+
+
+def test_missing_h2_is_reported(monkeypatch, caplog):
+    import builtins
+
+    real_import = builtins.__import__
+
+    def fake_import(name, *args, **kwargs):
+        if name == "h2":
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(http_client, "HTTP2_ENABLED", True)
+    monkeypatch.setattr(builtins, "__import__", fake_import)
+    with caplog.at_level(logging.WARNING, logger=http_client.__name__):
+        http_client.get_httpx_client("https://api.example.com/v1")
+    assert "h2" in caplog.text
@@ -0,0 +1,83 @@
+"""
+Кэш изображений: при превышении лимита вытесняются файлы,
+к которым дольше всего не обращались; запись по частям атомарна.
+"""
+import os
+
+import pytest
+
+from modules.image_cache import ImageCache
+
+KB = 1024
+
+
+def _age(path: str, seconds_ago: float):
+    """Сдвигает время последнего доступа к файлу в прошлое"""
+    stamp = os.stat(path).st_mtime - seconds_ago
+    os.utime(path, (stamp, stamp))
+
+
+def test_miss_then_hit(tmp_path):
+    cache = ImageCache(str(tmp_path), max_bytes=0)
+
+    assert cache.get("ab" * 32) is None
+    path = cache.put_bytes("ab" * 32, b"png")
+    assert cache.get("ab" * 32) == path
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_least_recently_used_file_is_evicted(tmp_path):
+    cache = ImageCache(str(tmp_path), max_bytes=2 * KB)
+    old = cache.put_bytes("aa" * 32, b"x" * KB)
+    used = cache.put_bytes("bb" * 32, b"x" * KB)
+    _age(old, 20)
+    _age(used, 10)
+
+    # Чтение освежает "bb" — при переполнении удаляется "aa"
+    cache.get("bb" * 32)
+    cache.put_bytes("cc" * 32, b"x" * KB)
+
+    assert cache.get("aa" * 32) is None
+    assert cache.get("bb" * 32) == used
+    assert cache.get("cc" * 32) is not None
+
+
+def test_unlimited_cache_keeps_everything(tmp_path):
+    cache = ImageCache(str(tmp_path), max_bytes=0)
+    for key in ("aa", "bb", "cc"):
+        cache.put_bytes(key * 32, b"x" * KB)
+
+    assert all(cache.get(key * 32) for key in ("aa", "bb", "cc"))
+
+
+def test_stream_is_written_atomically(tmp_path):
+    cache = ImageCache(str(tmp_path), max_bytes=0)
+    key = "dd" * 32
+    seen = []
+
+    def chunks():
+        for part in (b"\x89PNG", b"body", b"end"):
+            # Пока ответ не дочитан, файла по ключу ещё нет
+            seen.append(cache.get(key))
+            yield part
+
+    path = cache.put_stream(key, chunks())
+
+    assert seen == [None, None, None]
+    with open(path, "rb") as f:
+        assert f.read() == b"\x89PNGbodyend"
+
+
+def test_broken_stream_leaves_no_files(tmp_path):
+    cache = ImageCache(str(tmp_path), max_bytes=0)
+    key = "ee" * 32
+
+    def chunks():
+        yield b"\x89PNG"
+        raise ConnectionError("обрыв соединения")
+
+    with pytest.raises(ConnectionError):
+        cache.put_stream(key, chunks())
+
+    assert cache.get(key) is None
+    assert [name for _, _, files in os.walk(tmp_path) for name in files] == []
@@ -0,0 +1,76 @@
+"""
+Пост-обработка изображений: кодирование укладывается в лимит размера —
+сначала за счёт качества, затем разрешения; пул процессов по умолчанию
+включается только в долгоживущих режимах.
+"""
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from modules import image_postprocess
+
+
+@pytest.fixture
+def auto_workers(monkeypatch):
+    monkeypatch.setattr(image_postprocess, "IMAGE_POSTPROCESS_WORKERS", -1)
+    monkeypatch.setattr(image_postprocess, "IMAGE_POSTPROCESS_AUTO_WORKERS", 4)
+    monkeypatch.setattr(image_postprocess, "_pool_enabled", False)
+
+
+def test_single_run_processes_in_place(auto_workers):
+    assert image_postprocess._workers() == 0
+    assert image_postprocess.get_pool() is None
+
+
+def test_pool_enabled_for_long_running_modes(auto_workers):
+    image_postprocess.enable_pool()
+    assert image_postprocess._workers() == 4
+
+
+def test_explicit_setting_wins(auto_workers, monkeypatch):
+    monkeypatch.setattr(image_postprocess, "IMAGE_POSTPROCESS_WORKERS", 0)
+    image_postprocess.enable_pool()
+    assert image_postprocess._workers() == 0
+
+
+def _noise(size: int = 512, mode: str = "RGB") -> Image.Image:
+    """Шум плохо сжимается — JPEG такого изображения заметно зависит от качества"""
+    rng = random.Random(0)
+    return Image.frombytes(mode, (size, size), rng.randbytes(size * size * len(mode)))
+
+
+def _decoded(data: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(data))
+
+
+def test_fitting_image_keeps_quality_and_size():
+    image = _noise()
+    data = image_postprocess.encode_image(image, "JPEG", 85, max_bytes=10 * 1024 * 1024)
+
+    reference = io.BytesIO()
+    image.save(reference, format="JPEG", quality=85, optimize=True)
+    assert data == reference.getvalue()
+
+
+def test_quality_is_lowered_before_resolution():
+    # Лимит между размерами при качестве 85 и 55: хватает снижения качества
+    data = image_postprocess.encode_image(_noise(), "JPEG", 85, max_bytes=140 * 1024)
+
+    assert len(data) <= 140 * 1024
+    assert _decoded(data).size == (512, 512)
+
+
+def test_resolution_is_reduced_when_quality_is_not_enough():
+    data = image_postprocess.encode_image(_noise(), "JPEG", 85, max_bytes=60 * 1024)
+
+    assert len(data) <= 60 * 1024
+    assert _decoded(data).format == "JPEG"
+    assert _decoded(data).width < 512
+
+
+def test_alpha_channel_is_dropped_for_jpeg():
+    data = image_postprocess.encode_image(_noise(64, "RGBA"), "JPEG", 85, max_bytes=1024 * 1024)
+
+    assert _decoded(data).mode == "RGB"
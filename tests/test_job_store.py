@@ -0,0 +1,74 @@
+"""
+Журнал задач: попытка засчитывается при захвате, поэтому задача, на которой
+процесс падает, не повторяется бесконечно.
+"""
+import pytest
+
+from modules import job_store
+from modules.job_store import JobStore
+
+NEWS = {"title": "Новость", "url": "https://example.com/news"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite3"), lease_seconds=0, max_attempts=2)
+
+
+def test_claim_counts_attempt(store):
+    store.enqueue([NEWS])
+
+    claimed = store.claim(worker_id="w")
+    assert [news["job"].attempts for news in claimed] == [1]
+    # Захваченная задача другому процессу не выдаётся, пока не истекла аренда
+    store.lease_seconds = 60
+    assert store.claim(worker_id="other") == []
+
+
+def test_crashing_job_fails_after_max_attempts(store):
+    store.enqueue([NEWS])
+
+    # Процесс падает после каждого захвата: release() не вызывается, аренда истекает
+    assert len(store.claim(worker_id="w")) == 1
+    assert len(store.claim(worker_id="w")) == 1
+    assert store.claim(worker_id="w") == []
+    assert store.counts() == {job_store.FAILED: 1}
+
+
+def test_release_after_last_attempt_fails_job(store):
+    store.enqueue([NEWS])
+
+    first = store.claim(worker_id="w")[0]["job"]
+    store.release(first.id)
+    assert store.counts() == {job_store.NEW: 1}
+
+    second = store.claim(worker_id="w")[0]["job"]
+    store.release(second.id)
+    assert store.counts() == {job_store.FAILED: 1}
+
+
+def test_image_checkpoint_lives_in_job_until_published(store):
+    store.enqueue([NEWS])
+    job = store.claim(worker_id="w")[0]["job"]
+
+    store.save_image(job.id, b"\xff\xd8jpeg")
+    store.release(job.id)
+    resumed = store.claim(worker_id="w")[0]["job"]
+    assert store.load_image(resumed) == b"\xff\xd8jpeg"
+
+    store.mark_published(resumed.id)
+    assert store.load_image(resumed) is None
+
+
+def test_state_only_moves_forward(store):
+    store.enqueue([NEWS])
+    job = store.claim(worker_id="w")[0]["job"]
+
+    # Потоковый режим: изображение готово раньше текста
+    store.save_image(job.id, b"image")
+    store.save_text(job.id, "Заголовок", "Описание", "prompt")
+    assert store.counts() == {job_store.IMAGE_READY: 1}
+
+    store.mark_published(job.id)
+    store.save_text(job.id, "Другой", "Текст", "prompt")
+    assert store.counts() == {job_store.PUBLISHED: 1}
@@ -0,0 +1,52 @@
+"""
+Терпимый разбор JSON: мелкие дефекты чинятся, оборванный ответ обрезается
+до целых полей, а полный, но испорченный ответ не теряет поля.
+"""
+import json
+
+import pytest
+
+from modules.json_repair import parse_json
+
+
+def test_valid_json_in_code_fence():
+    assert parse_json('Вот ответ:\n```json\n{"title": "A"}\n```') == {"title": "A"}
+
+
+def test_trailing_text_after_object():
+    content = '{"title":"A","description":"B"} trailing {junk}'
+    assert parse_json(content) == {"title": "A", "description": "B"}
+
+
+def test_second_object_is_ignored():
+    assert parse_json('{"title": "A"}\n{"title": "B"}') == {"title": "A"}
+
+
+def test_unescaped_quotes_inside_string():
+    content = '{"title": "say "hi", ok", "description": "d"}'
+    assert parse_json(content) == {"title": 'say "hi", ok', "description": "d"}
+
+
+def test_unescaped_quotes_with_trailing_text():
+    content = '{"title": "Он сказал "да"", "description": "d"} Готово!'
+    assert parse_json(content) == {"title": 'Он сказал "да"', "description": "d"}
+
+
+def test_trailing_comma_and_raw_newline():
+    content = '{"title": "A",\n "description": "строка\nвторая",\n}'
+    assert parse_json(content) == {"title": "A", "description": "строка\nвторая"}
+
+
+def test_truncated_inside_string_drops_unfinished_field():
+    content = '{"title": "A", "image_prompt": "city", "description": "недописан'
+    assert parse_json(content) == {"title": "A", "image_prompt": "city"}
+
+
+def test_truncated_after_value_closes_brackets():
+    content = '{"items": [{"id": 0, "title": "A"}, {"id": 1, "title": "B"'
+    assert parse_json(content) == {"items": [{"id": 0, "title": "A"}, {"id": 1, "title": "B"}]}
+
+
+def test_hopeless_content_raises():
+    with pytest.raises(json.JSONDecodeError):
+        parse_json("модель отказалась отвечать")
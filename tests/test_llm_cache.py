@@ -0,0 +1,92 @@
+"""
+Кэш LLM: ключ строится и для провайдера без явной модели, записи живут не дольше TTL,
+сверх max_entries вытесняются давно не читавшиеся, счётчики попаданий видны в stats().
+"""
+import pytest
+
+from modules import llm_cache
+from modules.llm_cache import LLMCache
+from modules.storage import open_sqlite
+
+VALUE = ("Заголовок", "Описание", "prompt")
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(llm_cache.time, "time", clock)
+    return clock
+
+
+def _cache(tmp_path, **kwargs) -> LLMCache:
+    return LLMCache(str(tmp_path / "llm.sqlite3"), **kwargs)
+
+
+def test_make_key_accepts_missing_model():
+    key = LLMCache.make_key("openai", None, 3, "Заголовок", "Описание", 100, 500)
+
+    assert len(key) == 64
+    assert key != LLMCache.make_key("openai", "gpt-4o-mini", 3, "Заголовок", "Описание", 100, 500)
+
+
+def test_entry_expires_after_ttl(tmp_path, clock):
+    cache = _cache(tmp_path, ttl=60, max_entries=0)
+    cache.put("key", VALUE)
+
+    clock.now += 60
+    assert cache.get("key") == VALUE
+
+    clock.now += 1
+    assert cache.get("key") is None
+    # Просроченная запись удаляется, а не только скрывается
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_read_entry_is_evicted(tmp_path, clock):
+    cache = _cache(tmp_path, ttl=0, max_entries=2)
+    cache.put("a", VALUE)
+    clock.now += 1
+    cache.put("b", VALUE)
+    clock.now += 1
+    # Чтение освежает "a" — вытеснена должна быть "b", хотя она записана позже
+    assert cache.get("a") == VALUE
+    clock.now += 1
+    cache.put("c", VALUE)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == VALUE
+    assert cache.get("c") == VALUE
+    assert cache.stats()["size"] == 2
+
+
+def test_stats_count_hits_and_misses(tmp_path, clock):
+    cache = _cache(tmp_path, ttl=0, max_entries=0)
+    assert cache.stats() == {"hits": 0, "misses": 0, "hit_rate": 0.0, "size": 0}
+
+    cache.get("key")
+    cache.put("key", VALUE)
+    cache.get("key")
+    cache.get("key")
+
+    assert cache.stats() == {"hits": 2, "misses": 1, "hit_rate": 2 / 3, "size": 1}
+
+
+def test_cache_survives_reopen(tmp_path, clock):
+    _cache(tmp_path, ttl=0, max_entries=0).put("key", VALUE)
+
+    assert _cache(tmp_path, ttl=0, max_entries=0).get("key") == VALUE
+
+
+def test_open_sqlite_enables_wal_and_creates_directory(tmp_path):
+    conn = open_sqlite(str(tmp_path / "nested" / "db.sqlite3"))
+
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert (tmp_path / "nested" / "db.sqlite3").exists()
@@ -0,0 +1,40 @@
+"""
+Статус спана: стадии ловят свои ошибки и возвращают None/False,
+поэтому неудачей считается и ложный результат, а не только исключение.
+"""
+import pytest
+
+from modules import metrics
+
+
+def _count(stage: str, status: str) -> int:
+    return metrics.STAGE_SECONDS.count(stage=stage, status=status)
+
+
+def test_falsy_result_marks_span_as_error():
+    stage = metrics.traced("test_falsy")(lambda value: value)
+
+    stage(None)
+    stage(("title", "description", "prompt"))
+
+    assert _count("test_falsy", "error") == 1
+    assert _count("test_falsy", "ok") == 1
+
+
+def test_custom_success_predicate():
+    stage = metrics.traced("test_group", succeeded=any)(lambda results: results)
+
+    stage([False, True])
+    stage([False, False])
+
+    assert _count("test_group", "ok") == 1
+    assert _count("test_group", "error") == 1
+
+
+def test_exception_marks_span_as_error():
+    def broken():
+        raise RuntimeError("сбой")
+
+    with pytest.raises(RuntimeError):
+        metrics.traced("test_raise")(broken)()
+    assert _count("test_raise", "error") == 1
@@ -0,0 +1,53 @@
+"""
+Кластеризация: перепечатки одной новости с мелкими правками попадают в один кластер,
+разные события — в разные; представитель — новость с самым подробным описанием.
+"""
+from modules.news_clustering import MinHasher, _shingles, cluster_news, pick_representative
+
+WIRE = {
+    "title": "Central bank raises interest rate to 5% amid inflation fears",
+    "description": "The central bank raised its key interest rate by half a point on Thursday, "
+                   "citing persistent inflation and a tight labour market.",
+}
+REPRINT = {
+    "title": "Central Bank raises interest rate to 5% amid inflation fears!",
+    "description": "The central bank raised its key interest rate by half a point on Thursday, "
+                   "citing persistent inflation and a tight labour market. Markets fell.",
+}
+OTHER = {
+    "title": "Heavy storms close mountain roads across the region",
+    "description": "Authorities closed several mountain passes after heavy snowfall and strong winds.",
+}
+
+
+def test_reprints_share_cluster():
+    clusters = cluster_news([WIRE, OTHER, REPRINT], threshold=0.5, num_perm=64, bands=16)
+
+    assert clusters == [[WIRE, REPRINT], [OTHER]]
+
+
+def test_distinct_stories_stay_apart():
+    clusters = cluster_news([WIRE, OTHER], threshold=0.5, num_perm=64, bands=16)
+
+    assert clusters == [[WIRE], [OTHER]]
+
+
+def test_empty_input():
+    assert cluster_news([]) == []
+
+
+def test_signature_is_reproducible():
+    shingles = _shingles(WIRE)
+
+    assert MinHasher(num_perm=32).signature(shingles) == MinHasher(num_perm=32).signature(shingles)
+
+
+def test_representative_has_longest_description():
+    assert pick_representative([WIRE, REPRINT]) is REPRINT
+
+
+def test_representative_tie_keeps_earlier_item():
+    first = {"title": "a", "description": "same"}
+    second = {"title": "b", "description": "same"}
+
+    assert pick_representative([first, second]) is first
@@ -0,0 +1,45 @@
+"""
+Кворум источников: упавший или пустой источник не засчитывается,
+и опрос продолжает ждать остальные до дедлайна.
+"""
+import time
+
+from modules import news_fetcher
+
+
+def _news(name: str) -> dict:
+    return {"title": name, "url": f"https://example.com/{name}", "published": "2026-01-01T10:00:00Z"}
+
+
+def _fetcher(name, result, delay=0.0):
+    def fetch(keywords, language, max_retries):
+        time.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return fetch
+
+
+def test_failed_and_empty_sources_do_not_count(monkeypatch):
+    sources = {
+        "broken": _fetcher("broken", RuntimeError("сбой")),
+        "empty": _fetcher("empty", []),
+        "slow": _fetcher("slow", [_news("slow")], delay=0.1),
+    }
+    monkeypatch.setattr(news_fetcher, "_source_fetcher", lambda name: sources[name])
+
+    merged = news_fetcher.fetch_latest_news_multi("topic", sources=list(sources), quorum=1, deadline=5)
+
+    assert [news["title"] for news in merged] == ["slow"]
+
+
+def test_deadline_stops_waiting(monkeypatch):
+    sources = {
+        "empty": _fetcher("empty", []),
+        "late": _fetcher("late", [_news("late")], delay=1),
+    }
+    monkeypatch.setattr(news_fetcher, "_source_fetcher", lambda name: sources[name])
+
+    started = time.monotonic()
+    assert news_fetcher.fetch_latest_news_multi("topic", sources=list(sources), quorum=1, deadline=0.2) == []
+    assert time.monotonic() - started < 0.9
@@ -0,0 +1,83 @@
+"""
+Асинхронный конвейер: каждая стадия не превышает свой лимит параллелизма,
+а стадии разных новостей перекрываются.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+import main
+
+
+class _Stage:
+    """Заглушка блокирующей стадии: считает одновременно выполняющиеся вызовы"""
+
+    def __init__(self, result, delay=0.05):
+        self.result = result
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *args):
+        with self._lock:
+            self.active += 1
+            self.calls += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return self.result
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    stages = {
+        "llm": _Stage(("Заголовок", "Описание", "prompt")),
+        "image": _Stage(b"image"),
+        "publish": _Stage(True),
+    }
+    monkeypatch.setattr(main, "_generate_text", stages["llm"])
+    monkeypatch.setattr(main, "_generate_image", stages["image"])
+    monkeypatch.setattr(main, "_publish", stages["publish"])
+    monkeypatch.setattr(main, "_mark_published", lambda news: None)
+    monkeypatch.setattr(main, "LLM_BATCH_SIZE", 1)
+    monkeypatch.setattr(main, "LLM_STREAMING", False)
+    monkeypatch.setattr(main, "PIPELINE_LLM_CONCURRENCY", 2)
+    monkeypatch.setattr(main, "PIPELINE_IMAGE_CONCURRENCY", 1)
+    monkeypatch.setattr(main, "PIPELINE_PUBLISH_CONCURRENCY", 1)
+    return stages
+
+
+def _news(count: int) -> list:
+    return [{"title": f"Новость {index}", "url": f"https://example.com/{index}"} for index in range(count)]
+
+
+def test_stages_respect_their_limits(stages):
+    published = asyncio.run(main.run_pipeline(_news(6), object(), object()))
+
+    assert published == 6
+    assert stages["llm"].peak == 2
+    assert stages["image"].peak == 1
+    assert stages["publish"].peak == 1
+
+
+def test_stages_of_different_news_overlap(stages):
+    started = time.monotonic()
+    asyncio.run(main.run_pipeline(_news(4), object(), object()))
+    elapsed = time.monotonic() - started
+
+    # Последовательно: 4 новости × 3 стадии × 50 мс = 0.6 с.
+    # В конвейере узкое место — одиночная стадия изображений (4 × 50 мс) плюс разгон и хвост
+    assert elapsed < 0.45
+
+
+def test_failed_text_skips_later_stages(stages):
+    stages["llm"].result = None
+
+    assert asyncio.run(main.run_pipeline(_news(3), object(), object())) == 0
+    assert stages["image"].calls == 0
+    assert stages["publish"].calls == 0
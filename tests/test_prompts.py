@@ -0,0 +1,64 @@
+"""
+Компилятор промптов: описание новости обрезается до бюджета токенов по концу
+предложения или слову, а системные промпты всех режимов начинаются с общего префикса.
+"""
+from modules import prompts
+from modules.prompts import estimate_tokens, get_compiler, trim_to_budget
+
+
+def test_estimate_tokens_counts_utf8_bytes():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    # Кириллица — 2 байта на букву
+    assert estimate_tokens("абвг") == 2
+
+
+def test_text_within_budget_is_only_normalized():
+    assert trim_to_budget("  Короткая   новость.\n [+1234 chars]", 100) == "Короткая новость."
+
+
+def test_trim_prefers_sentence_end():
+    text = "First sentence is here. Second sentence is long enough. " + "tail words " * 20
+    trimmed = trim_to_budget(text, 16)
+
+    assert trimmed == "First sentence is here. Second sentence is long enough."
+    assert estimate_tokens(trimmed) <= 16
+
+
+def test_trim_falls_back_to_word_boundary():
+    text = "word " * 100
+    trimmed = trim_to_budget(text, 10)
+
+    assert trimmed.endswith("word…")
+    assert estimate_tokens(trimmed) <= 10
+
+
+def test_trim_never_splits_multibyte_characters():
+    trimmed = trim_to_budget("ж" * 100, 10)
+
+    assert set(trimmed) <= {"ж", "…"}
+    assert estimate_tokens(trimmed) <= 10
+
+
+def test_zero_budget_disables_trimming():
+    text = "word " * 100
+    assert trim_to_budget(text, 0) == text.strip()
+
+
+def test_system_prompts_share_stable_prefix():
+    compiler = get_compiler(100, 500, 50)
+    modes = [compiler.system_prompt(mode) for mode in ("single", "stream", "batch", "fields")]
+
+    assert all(prompt.startswith(prompts._INSTRUCTIONS) for prompt in modes)
+    assert all("100" in prompt and "500" in prompt for prompt in modes)
+    # Одна конфигурация — один и тот же собранный объект
+    assert get_compiler(100, 500, 50) is compiler
+
+
+def test_user_prompt_trims_description_to_budget():
+    compiler = get_compiler(100, 500, 10)
+    prompt = compiler.user_prompt({"title": " Заголовок ", "description": "word " * 100})
+
+    description = prompt.split("Оригинальное описание: ", 1)[1]
+    assert prompt.startswith("Оригинальный заголовок: Заголовок\n")
+    assert estimate_tokens(description) <= 10
@@ -0,0 +1,119 @@
+"""
+Выключатель: пробный запрос в HALF_OPEN всегда получает исход,
+а зависший пробный запрос не блокирует источник навсегда.
+send_with_retries повторяет только то, что сервер точно не выполнил.
+"""
+import time
+
+import pytest
+import requests
+
+from modules import news_fetcher, rate_limiter
+from modules.rate_limiter import CircuitBreaker, RateLimiter
+
+
+class _Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = ""
+
+    def json(self):
+        return {"status": "ok"}
+
+    def close(self):
+        pass
+
+
+def _open_limiter() -> RateLimiter:
+    limiter = RateLimiter("test", rate=1000, burst=10, failure_threshold=1, reset_timeout=0.05)
+    limiter.record_failure()
+    assert limiter.breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.06)
+    return limiter
+
+
+def test_rate_limited_trial_closes_breaker(monkeypatch):
+    limiter = _open_limiter()
+    monkeypatch.setattr(news_fetcher.http_client, "get",
+                        lambda *args, **kwargs: _Response(429, {"Retry-After": "0"}))
+
+    assert news_fetcher._get_json("Test", "http://stub", {}, limiter, max_retries=1) is None
+    assert limiter.breaker.state == CircuitBreaker.CLOSED
+    assert limiter.breaker.allow()
+
+
+def test_unexpected_error_settles_trial(monkeypatch):
+    limiter = _open_limiter()
+
+    def broken(*args, **kwargs):
+        raise ValueError("сломанный ответ")
+
+    monkeypatch.setattr(news_fetcher.http_client, "get", broken)
+
+    with pytest.raises(ValueError):
+        news_fetcher._get_json("Test", "http://stub", {}, limiter, max_retries=1)
+    assert limiter.breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_trial_times_out():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+    # Исход пробного запроса так и не записан — через reset_timeout пропускаем новый
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def _sequence(outcomes):
+    calls = []
+
+    def send():
+        outcome = outcomes[len(calls)]
+        calls.append(outcome)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return send, calls
+
+
+def test_send_with_retries_honours_retry_after(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda seconds: None)
+    limiter = RateLimiter("test", rate=1000, burst=10)
+    send, calls = _sequence([_Response(429, {"Retry-After": "0"}), _Response(200)])
+
+    assert rate_limiter.send_with_retries(limiter, "test", send, max_retries=3).status_code == 200
+    assert len(calls) == 2
+
+
+def test_send_with_retries_retries_server_and_connection_errors(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda seconds: None)
+    limiter = RateLimiter("test", rate=1000, burst=10)
+    send, calls = _sequence([_Response(503), requests.exceptions.ConnectionError("refused"), _Response(200)])
+
+    assert rate_limiter.send_with_retries(limiter, "test", send, max_retries=3).status_code == 200
+    assert len(calls) == 3
+
+
+def test_send_with_retries_does_not_repeat_read_timeout():
+    limiter = RateLimiter("test", rate=1000, burst=10)
+    send, calls = _sequence([requests.exceptions.ReadTimeout("no answer"), _Response(200)])
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        rate_limiter.send_with_retries(limiter, "test", send, max_retries=3)
+    assert len(calls) == 1
+
+
+def test_send_with_retries_fails_fast_when_breaker_open():
+    limiter = RateLimiter("test", rate=1000, burst=10, failure_threshold=1, reset_timeout=60)
+    limiter.record_failure()
+    send, calls = _sequence([_Response(200)])
+
+    assert rate_limiter.send_with_retries(limiter, "test", send) is None
+    assert calls == []
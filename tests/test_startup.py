@@ -0,0 +1,52 @@
+"""
+Контроль времени запуска: тяжёлые библиотеки не должны импортироваться раньше, чем нужны.
+
+Запуск: python -m pytest tests/test_startup.py -q
+Бюджет времени импорта можно переопределить переменной STARTUP_BUDGET_SECONDS.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", 1.0))
+
+# Провайдер-специфичные SDK и библиотека изображений
+HEAVY_MODULES = ("openai", "PIL", "httpx")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def _probe_import(module: str, **env) -> dict:
+    """Импортирует модуль в чистом интерпретаторе и возвращает время и список загруженных тяжёлых модулей"""
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=PROJECT_ROOT,
+        env={**os.environ, **env},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", ["main", "daemon", "modules.content_generator", "modules.image_generator"])
+def test_heavy_modules_not_imported_eagerly(module):
+    probe = _probe_import(module, AI_PROVIDER="deepseek")
+    assert probe["loaded"] == []
+
+
+def test_startup_time_within_budget():
+    # Лучшее из нескольких запусков — чтобы не зависеть от холодного дискового кэша
+    best = min(_probe_import("main", AI_PROVIDER="deepseek")["elapsed"] for _ in range(3))
+    print(f"import main: {best * 1000:.0f} мс (бюджет {STARTUP_BUDGET_SECONDS * 1000:.0f} мс)")
+    assert best < STARTUP_BUDGET_SECONDS
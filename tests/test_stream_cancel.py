@@ -0,0 +1,46 @@
+"""
+Потоковый режим: если текст поста не получен, изображение не генерируется
+и не сохраняется в журнал задач — иначе оно всплыло бы рядом с новым текстом.
+"""
+import threading
+
+import main
+from modules.job_store import Job
+
+
+class _ImageGenerator:
+    def __init__(self, on_generate=None):
+        self.calls = 0
+        self.on_generate = on_generate
+
+    def generate_encoded(self, image_prompt, overlay_text, output_path=None):
+        self.calls += 1
+        if self.on_generate:
+            self.on_generate()
+        return b"image"
+
+
+def test_cancelled_before_request_skips_generation():
+    cancelled = threading.Event()
+    cancelled.set()
+    generator = _ImageGenerator()
+
+    assert main._generate_image(generator, "prompt", "title", cancelled=cancelled) is None
+    assert generator.calls == 0
+
+
+def test_cancelled_during_generation_is_not_saved(monkeypatch):
+    saved = []
+    monkeypatch.setattr(main, "_save_image", lambda news, image_bytes: saved.append(image_bytes))
+    monkeypatch.setattr(main, "SAVE_GENERATED_IMAGES", False)
+    cancelled = threading.Event()
+    generator = _ImageGenerator(on_generate=cancelled.set)
+    news = {"title": "n", "job": Job("id", "new", 1)}
+
+    assert main._generate_image(generator, "prompt", "title", news, cancelled) is None
+    assert saved == []
+
+
+def test_saved_image_requires_saved_text():
+    job = Job("id", "image_ready", 2, image_hash="abc")
+    assert main._saved_image({"job": job}) is None
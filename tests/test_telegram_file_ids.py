@@ -0,0 +1,84 @@
+"""
+Кэш file_id: повторная отправка того же изображения идёт по file_id без загрузки,
+а отвергнутый Telegram file_id сбрасывается и файл загружается заново.
+"""
+import pytest
+
+from modules import telegram_file_ids, telegram_outbox
+from modules.telegram_file_ids import FileIdCache, content_hash
+from modules.telegram_outbox import OutgoingPost, TelegramError, TelegramOutbox
+
+IMAGE = b"\xff\xd8jpeg"
+POST = OutgoingPost(chat_id="chat", text="Пост", image_bytes=IMAGE)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return FileIdCache(str(tmp_path / "file_ids.sqlite3"), ttl_days=1)
+
+
+@pytest.fixture
+def outbox(cache, monkeypatch):
+    monkeypatch.setattr(telegram_outbox, "backoff_delay", lambda attempt: 0)
+    outbox = TelegramOutbox(api_base="http://stub", global_rps=1000, chat_per_minute=60000,
+                            max_retries=0, workers=1, use_file_ids=False)
+    outbox.file_ids = cache
+    return outbox
+
+
+def _calls(outbox, monkeypatch, errors=()):
+    """Подменяет вызов Bot API: записывает запросы, по очереди выбрасывает ошибки из errors"""
+    calls = []
+    errors = list(errors)
+
+    def call(method, chat_id, data, files=None, messages=1):
+        calls.append({"photo": data.get("photo"), "upload": bool(files)})
+        if errors:
+            raise errors.pop(0)
+        return {"ok": True, "result": {"photo": [{"file_id": "small"}, {"file_id": "uploaded"}]}}
+
+    monkeypatch.setattr(outbox, "_call", call)
+    return calls
+
+
+def test_expired_file_id_is_ignored(cache, monkeypatch):
+    digest = content_hash(IMAGE)
+    cache.put(digest, "file")
+    assert cache.get(digest) == "file"
+
+    now = telegram_file_ids.time.time()
+    monkeypatch.setattr(telegram_file_ids.time, "time", lambda: now + 2 * 86400)
+    assert cache.get(digest) is None
+
+
+def test_second_send_reuses_file_id(outbox, monkeypatch):
+    calls = _calls(outbox, monkeypatch)
+
+    outbox._send_post(POST)
+    outbox._send_post(POST)
+
+    # Сохраняется самый большой вариант фото
+    assert calls == [{"photo": None, "upload": True}, {"photo": "uploaded", "upload": False}]
+
+
+def test_rejected_file_id_is_replaced(outbox, cache, monkeypatch):
+    cache.put(content_hash(IMAGE), "revoked")
+    error = TelegramError("400", 400, "Bad Request: wrong file identifier/HTTP URL specified")
+    calls = _calls(outbox, monkeypatch, errors=[error])
+
+    outbox._send_post(POST)
+
+    assert calls == [{"photo": "revoked", "upload": False}, {"photo": None, "upload": True}]
+    assert cache.get(content_hash(IMAGE)) == "uploaded"
+
+
+def test_caption_error_keeps_file_id(outbox, cache, monkeypatch):
+    cache.put(content_hash(IMAGE), "file")
+    error = TelegramError("400", 400, "Bad Request: message caption is too long")
+    calls = _calls(outbox, monkeypatch, errors=[error])
+
+    with pytest.raises(TelegramError):
+        outbox._send_post(POST)
+
+    assert len(calls) == 1
+    assert cache.get(content_hash(IMAGE)) == "file"
@@ -0,0 +1,81 @@
+"""
+Очередь Telegram повторяет только запросы, которые точно не дошли до сервера:
+повтор после таймаута чтения продублировал бы пост.
+"""
+import pytest
+import requests
+
+from modules import telegram_outbox
+from modules.telegram_outbox import TelegramError, TelegramOutbox
+
+
+class _Response:
+    status_code = 200
+    text = ""
+    headers = {}
+
+    def json(self):
+        return {"ok": True, "result": {"message_id": 1}}
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    monkeypatch.setattr(telegram_outbox, "backoff_delay", lambda attempt: 0)
+    return TelegramOutbox(api_base="http://stub", global_rps=1000, chat_per_minute=60000,
+                          max_retries=2, workers=1, use_file_ids=False)
+
+
+def _post_sequence(monkeypatch, outcomes):
+    calls = []
+
+    def post(*args, **kwargs):
+        calls.append(args)
+        outcome = outcomes[len(calls) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(telegram_outbox.http_client, "post", post)
+    return calls
+
+
+def test_connection_error_is_retried(outbox, monkeypatch):
+    calls = _post_sequence(monkeypatch, [requests.exceptions.ConnectionError("refused"), _Response()])
+
+    assert outbox._call("sendMessage", "chat", {"text": "t"})["ok"]
+    assert len(calls) == 2
+
+
+def test_read_timeout_is_not_retried(outbox, monkeypatch):
+    calls = _post_sequence(monkeypatch, [requests.exceptions.ReadTimeout("no answer"), _Response()])
+
+    with pytest.raises(TelegramError):
+        outbox._call("sendMessage", "chat", {"text": "t"})
+    assert len(calls) == 1
+
+
+class _RateLimited(_Response):
+    status_code = 429
+    headers = {}
+
+    def json(self):
+        return {"ok": False, "parameters": {"retry_after": 7}}
+
+
+def test_flood_limit_pauses_whole_bot(outbox, monkeypatch):
+    paused = []
+    monkeypatch.setattr(outbox._global_bucket, "pause", lambda seconds: paused.append(("bot", seconds)))
+    monkeypatch.setattr(outbox._chat_bucket("chat"), "pause", lambda seconds: paused.append(("chat", seconds)))
+    _post_sequence(monkeypatch, [_RateLimited(), _Response()])
+
+    outbox._call("sendMessage", "chat", {"text": "t"})
+    assert sorted(paused) == [("bot", 7.0), ("chat", 7.0)]
+
+
+@pytest.mark.parametrize("description, bad_file", [
+    ("Bad Request: wrong file identifier/HTTP URL specified", True),
+    ("Bad Request: can't parse entities: unsupported start tag", False),
+    ("Bad Request: message caption is too long", False),
+])
+def test_only_file_errors_invalidate_file_id(description, bad_file):
+    assert TelegramError("400", 400, description).bad_file is bad_file
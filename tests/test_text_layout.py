@@ -0,0 +1,54 @@
+"""
+Раскладка текста: короткий заголовок остаётся крупным, длинный переносится
+и уменьшается до min_size, а не поместившееся обрезается многоточием.
+"""
+from modules.text_layout import ELLIPSIS, layout_text, text_width
+
+LONG = " ".join(["заголовок"] * 40)
+
+
+def _fits(layout, max_width: int) -> bool:
+    return all(text_width(line, layout.size) <= max_width for line in layout.lines)
+
+
+def test_short_text_keeps_max_size():
+    layout = layout_text("Короткий заголовок", 800, max_lines=3, max_size=36, min_size=18)
+
+    assert layout.size == 36
+    assert layout.lines == ("Короткий заголовок",)
+    assert layout.height == layout.line_height
+
+
+def test_wrapped_text_shrinks_to_fit_lines():
+    text = " ".join(["слово"] * 12)
+    layout = layout_text(text, 400, max_lines=3, max_size=36, min_size=12)
+
+    assert 12 <= layout.size < 36
+    assert len(layout.lines) <= 3
+    assert _fits(layout, 400)
+    assert " ".join(layout.lines) == text
+
+
+def test_overflow_is_truncated_with_ellipsis():
+    layout = layout_text(LONG, 300, max_lines=2, max_size=36, min_size=18)
+
+    assert layout.size == 18
+    assert len(layout.lines) == 2
+    assert layout.lines[-1].endswith(ELLIPSIS)
+    assert _fits(layout, 300)
+
+
+def test_long_word_is_split_by_characters():
+    word = "а" * 60
+    layout = layout_text(word, 200, max_lines=10, max_size=18, min_size=18)
+
+    assert len(layout.lines) > 1
+    assert "".join(layout.lines) == word
+    assert _fits(layout, 200)
+
+
+def test_empty_text():
+    layout = layout_text("   ", 400, max_lines=3, max_size=36, min_size=18)
+
+    assert layout.lines == ()
+    assert layout.width == 0
@@ -0,0 +1,120 @@
+"""
+Водяные знаки инкрементальной загрузки: знак сдвигается только по полной выборке
+и не перешагивает новости, которые не взяты в работу.
+"""
+import pytest
+
+from modules import news_fetcher
+from modules.watermarks import WatermarkStore
+
+TOPIC = "newsapi|en|topic"
+
+
+def _news(minute: int) -> dict:
+    return {"title": f"n{minute}", "url": f"https://example.com/{minute}",
+            "published": f"2026-01-01T10:{minute:02d}:00Z"}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = WatermarkStore(str(tmp_path / "watermarks.sqlite3"))
+    monkeypatch.setattr(news_fetcher, "get_watermark_store", lambda: store)
+    return store
+
+
+def _source(items, fail_after=None):
+    def iterate(keywords, language, since=None, max_retries=3):
+        for index, news in enumerate(items):
+            if index == fail_after:
+                raise news_fetcher.PageFetchError("страница не получена")
+            yield news
+    return iterate
+
+
+def test_fetch_does_not_move_watermark(store, monkeypatch):
+    monkeypatch.setitem(news_fetcher.INCREMENTAL_SOURCES, "newsapi", _source([_news(30), _news(20)]))
+    fetched = news_fetcher.fetch_new_news("newsapi", "topic")
+
+    assert len(fetched) == 2
+    assert store.get(TOPIC) is None
+
+    news_fetcher.commit_watermarks(fetched)
+    assert store.get(TOPIC) == "2026-01-01T10:30:00Z"
+
+
+def test_partial_pagination_is_not_committed(store, monkeypatch):
+    monkeypatch.setitem(news_fetcher.INCREMENTAL_SOURCES, "newsapi",
+                        _source([_news(30), _news(20), _news(10)], fail_after=2))
+    fetched = news_fetcher.fetch_new_news("newsapi", "topic")
+
+    assert [news["title"] for news in fetched] == ["n30", "n20"]
+    news_fetcher.commit_watermarks(fetched)
+    assert store.get(TOPIC) is None
+
+
+def test_watermark_stays_before_pending_news(store, monkeypatch):
+    monkeypatch.setitem(news_fetcher.INCREMENTAL_SOURCES, "newsapi",
+                        _source([_news(30), _news(20), _news(10)]))
+    fetched = news_fetcher.fetch_new_news("newsapi", "topic")
+
+    # Взята в работу только самая свежая — остальные должны попасть в следующую выборку
+    news_fetcher.commit_watermarks(fetched, pending=fetched[1:])
+    assert store.get(TOPIC) == "2026-01-01T10:09:59Z"
+
+    news_fetcher.commit_watermarks(fetched)
+    assert store.get(TOPIC) == "2026-01-01T10:30:00Z"
+
+
+def test_watermark_never_moves_back(store):
+    store.set(TOPIC, "2026-01-01T11:00:00Z")
+    news = {**_news(30), "watermark_topic": TOPIC}
+    news_fetcher.commit_watermarks([news])
+    assert store.get(TOPIC) == "2026-01-01T11:00:00Z"
+
+
+def _article(minute: int, published: str = None) -> dict:
+    return {"title": f"n{minute}", "description": "", "url": f"https://example.com/{minute}",
+            "publishedAt": published or f"2026-01-01T10:{minute:02d}:00Z", "source": {"name": "s"}}
+
+
+def _pages(monkeypatch, pages):
+    requested = []
+
+    def get_json(label, url, params, limiter, max_retries):
+        requested.append(params["page"])
+        return {"articles": pages[params["page"] - 1], "totalResults": 100}
+
+    monkeypatch.setattr(news_fetcher, "_get_json", get_json)
+    return requested
+
+
+def test_page_limit_is_reported_as_incomplete(monkeypatch):
+    _pages(monkeypatch, [[_article(50), _article(40)], [_article(30), _article(20)], [_article(10)]])
+    since = news_fetcher.datetime(2026, 1, 1, 10, 0)
+    iterator = news_fetcher.iter_news_from_newsapi("topic", since=since, page_size=2, max_pages=2)
+
+    titles = []
+    with pytest.raises(news_fetcher.PageFetchError):
+        for news in iterator:
+            titles.append(news["title"])
+    assert titles == ["n50", "n40", "n30", "n20"]
+
+
+def test_page_limit_leaves_fetch_untagged(store, monkeypatch):
+    _pages(monkeypatch, [[_article(50), _article(40)], [_article(30), _article(20)], [_article(10)]])
+    store.set(TOPIC, "2026-01-01T10:00:00Z")
+    monkeypatch.setitem(news_fetcher.INCREMENTAL_SOURCES, "newsapi",
+                        lambda *args, **kwargs: news_fetcher.iter_news_from_newsapi(
+                            *args, page_size=2, max_pages=2, **kwargs))
+    fetched = news_fetcher.fetch_new_news("newsapi", "topic")
+
+    assert len(fetched) == 4
+    assert not any("watermark_topic" in news for news in fetched)
+
+
+def test_undated_news_does_not_stop_paging(monkeypatch):
+    _pages(monkeypatch, [[_article(50), _article(45, published="вчера"), _article(40)]])
+    since = news_fetcher.datetime(2026, 1, 1, 10, 0)
+    iterator = news_fetcher.iter_news_from_newsapi("topic", since=since, page_size=5, max_pages=2)
+
+    assert [news["title"] for news in iterator] == ["n50", "n40"]